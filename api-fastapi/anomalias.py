@@ -0,0 +1,402 @@
+"""
+Detecção de anomalias e falhas de sensores durante a ingestão
+Sistema de Monitoramento do Telhado Verde - UFSM
+
+O único sinal de saúde era o `status` informado pelo próprio dispositivo.
+Este módulo mantém, em memória e por (device_id, campo), estatísticas
+incrementais que marcam cada leitura recebida:
+
+- outlier:    valor longe da mediana móvel (escala robusta da janela)
+- desvio:     z-score alto em relação à média/variância EWMA
+- travado:    mesmo valor repetido por muitas leituras (ex.: DHT11 travado)
+- saturado:   HL-69 com raw_value em 0 ou 4095 (limite do ADC)
+- sem_eco:    HC-SR04 sem eco (distância <= 0 ou status de erro)
+
+O custo por leitura não cresce com o histórico e nenhuma leitura extra é
+feita no Firestore: o estado vive no processo. A janela tem tamanho fixo
+e a mediana/quartis saem de uma lista ordenada mantida por bisseção; a
+busca é O(log janela), mas inserir e remover da lista desloca O(janela)
+posições (memmove). Para as janelas usadas (dezenas de leituras) esse
+deslocamento é desprezível diante do restante da avaliação; o efeito do
+tamanho da janela aparece em scripts/benchmark_anomalias.py --janelas.
+Quando uma anomalia começa ou termina, um evento é gerado para a coleção
+`sensor_alerts`.
+
+Na ingestão, as leituras são avaliadas antes da gravação (os rótulos vão
+no documento), mas o detector só as incorpora com `confirmar`, depois que
+a gravação deu certo: reenvios de uma leitura que falhou ao gravar não
+contam duas vezes, e um alerta aberto em uma tentativa que falhou não fica
+ativo sem registro. `preparar` só avalia cada valor contra o estado
+atual; quando o mesmo lote traz outra leitura do dispositivo, o valor é
+aplicado ao próprio estado e anotado em um registro de desfazer (valor
+acrescentado e removido da janela), restaurado antes de soltar o lock,
+sem copiar as janelas. `confirmar` incorpora os valores ao estado atual.
+
+Autor: Equipe Projeto Integrador 4 - UFSM
+Data: 2025
+"""
+
+import bisect
+import math
+import threading
+from collections import deque
+from datetime import datetime
+
+from armazenamento import TAMANHO_MAXIMO_BATCH
+from campos_sensores import extrair_valores
+from deduplicacao import gerar_id_leitura
+
+COLECAO_ALERTAS = "sensor_alerts"
+
+# Escala mínima por campo (resolução do sensor): evita que uma janela
+# constante transforme qualquer variação pequena em outlier
+ESCALA_MINIMA = {
+    "ds18b20_temperature": 0.25,
+    "dht11_temperature": 1.0,
+    "dht11_humidity": 2.0,
+    "hcsr04_distance": 0.5,
+    "hl69_soil_moisture": 1.0,
+    "hl69_raw_value": 20.0,
+}
+
+# Limites do ADC de 12 bits do ESP32 (HL-69)
+RAW_MINIMO, RAW_MAXIMO = 0, 4095
+
+# Fator que converte o intervalo interquartil em desvio padrão (dados normais)
+_IQR_PARA_SIGMA = 1.349
+
+
+class EstadoCampo:
+    """Estatísticas incrementais de um campo de um dispositivo"""
+
+    __slots__ = ("janela", "ordenada", "media", "variancia", "n", "ultimo", "repeticoes")
+
+    def __init__(self, tamanho_janela: int):
+        self.janela = deque(maxlen=tamanho_janela)  # Ordem de chegada
+        self.ordenada = []  # Mesmos valores, ordenados (mediana/quartis em O(1))
+        self.media = 0.0
+        self.variancia = 0.0
+        self.n = 0
+        self.ultimo = None
+        self.repeticoes = 0
+
+    def desfazer(self, anterior: tuple, removido):
+        """Desfaz o último `_incorporar` (valor mais novo da janela e escalares)"""
+        valor = self.janela.pop()
+        del self.ordenada[bisect.bisect_left(self.ordenada, valor)]
+        if removido is not None:
+            self.janela.appendleft(removido)
+            bisect.insort(self.ordenada, removido)
+        self.media, self.variancia, self.n, self.ultimo, self.repeticoes = anterior
+
+
+class AvaliacaoPendente:
+    """
+    Resultado de `DetectorAnomalias.preparar`, ainda não incorporado
+
+    Guarda, por dispositivo, os passos avaliados: os valores que entraram
+    nas estatísticas e as anomalias de cada leitura, aplicados ao estado
+    atual por `confirmar`.
+    """
+
+    __slots__ = ("passos", "leituras", "anomalias")
+
+    def __init__(self):
+        self.passos = {}    # device_id -> [(valores avaliados, timestamp, anomalias)]
+        self.leituras = 0
+        self.anomalias = 0
+
+
+class DetectorAnomalias:
+    """
+    Detector de anomalias por dispositivo e campo
+
+    Args:
+        tamanho_janela (int): Leituras na janela da mediana móvel
+        limite_robusto (float): Distância máxima da mediana, em escalas robustas
+        alfa_ewma (float): Peso da leitura nova na média/variância EWMA
+        limite_z (float): Z-score EWMA máximo
+        repeticoes_travado (int): Leituras idênticas seguidas para marcar "travado"
+        aquecimento (int): Leituras antes de avaliar outlier/desvio
+    """
+
+    def __init__(self, tamanho_janela: int = 60, limite_robusto: float = 6.0,
+                 alfa_ewma: float = 0.1, limite_z: float = 5.0,
+                 repeticoes_travado: int = 120, aquecimento: int = 10):
+        self.tamanho_janela = tamanho_janela
+        self.limite_robusto = limite_robusto
+        self.alfa_ewma = alfa_ewma
+        self.limite_z = limite_z
+        self.repeticoes_travado = repeticoes_travado
+        self.aquecimento = aquecimento
+
+        self._estados = {}  # (device_id, campo) -> EstadoCampo
+        self._ativos = {}   # device_id -> {(campo, tipo): timestamp de início}
+        self._lock = threading.Lock()
+
+        self.leituras_avaliadas = 0
+        self.anomalias_detectadas = 0
+
+    def avaliar(self, leitura: dict) -> dict:
+        """
+        Atualiza o estado com uma leitura e retorna as anomalias encontradas
+
+        Equivale a `preparar([leitura])` seguido de `confirmar`.
+
+        Args:
+            leitura (dict): {"device_id", "timestamp", "sensors", ...}
+
+        Returns:
+            dict: {
+                "anomalias": [{"campo", "tipo", "valor"}],
+                "alertas_abertos": [evento], "alertas_encerrados": [evento]
+            }
+        """
+        resultados, pendente = self.preparar([leitura])
+        self.confirmar(pendente)
+        return resultados[0]
+
+    def preparar(self, leituras: list):
+        """
+        Avalia leituras, na ordem, sem alterar o detector
+
+        Cada leitura vê as anteriores do mesmo lote: as que têm outra
+        leitura do dispositivo depois delas são aplicadas ao estado e
+        desfeitas pelo registro de desfazer antes de soltar o lock. O
+        detector só muda com `confirmar(pendente)`; sem a confirmação
+        (ex.: a gravação falhou), a avaliação é descartada.
+
+        Returns:
+            tuple: (resultados como em `avaliar`, um por leitura, AvaliacaoPendente)
+        """
+        pendente = AvaliacaoPendente()
+        resultados = []
+        ativos = {}    # device_id -> cópia dos alertas ativos (poucas chaves)
+        desfazer = []  # [(estado, escalares anteriores, valor removido da janela)]
+        criados = []   # Chaves de estados criados nesta avaliação
+        ultima = {leitura["device_id"]: indice for indice, leitura in enumerate(leituras)}
+        with self._lock:
+            try:
+                for indice, leitura in enumerate(leituras):
+                    aplicar = ultima[leitura["device_id"]] != indice
+                    resultados.append(self._avaliar(leitura, pendente, ativos, desfazer if aplicar else None, criados))
+            finally:
+                for estado, anterior, removido in reversed(desfazer):
+                    estado.desfazer(anterior, removido)
+                for chave in criados:
+                    del self._estados[chave]
+        return resultados, pendente
+
+    def confirmar(self, pendente: AvaliacaoPendente):
+        """
+        Incorpora ao detector as leituras avaliadas em `preparar`
+
+        Os valores avaliados são aplicados ao estado atual. Se outra
+        confirmação alterou o mesmo dispositivo depois de `preparar`
+        (leituras do mesmo dispositivo gravadas ao mesmo tempo), os eventos
+        de alerta já devolvidos podem diferir dos alertas ativos; o
+        encerramento grava o documento completo do alerta.
+        """
+        with self._lock:
+            for device_id, passos in pendente.passos.items():
+                self._aplicar(device_id, passos)
+            self.leituras_avaliadas += pendente.leituras
+            self.anomalias_detectadas += pendente.anomalias
+
+    def _avaliar(self, leitura: dict, pendente: AvaliacaoPendente, ativos: dict,
+                 desfazer, criados: list) -> dict:
+        """
+        Avalia uma leitura (com o lock)
+
+        Args:
+            desfazer (list, optional): Se informado, a leitura também é
+                aplicada ao estado e o registro para desfazê-la é anotado aqui
+        """
+        device_id = leitura["device_id"]
+        sensors = leitura["sensors"]
+        valores = extrair_valores(sensors)
+        anomalias = []
+
+        if device_id not in ativos:
+            ativos[device_id] = dict(self._ativos.get(device_id, {}))
+            pendente.passos[device_id] = []
+        avaliados = {}
+
+        for nome, valor in valores.items():
+            sensor = nome.split("_", 1)[0]
+            if (sensors.get(sensor) or {}).get("status", "ok") != "ok":
+                continue  # Valor de erro (ex.: 0.0) não entra nas estatísticas
+            avaliados[nome] = valor
+            estado = self._estados.get((device_id, nome))
+            if estado is None:
+                estado = EstadoCampo(self.tamanho_janela)
+                if desfazer is not None:
+                    self._estados[(device_id, nome)] = estado
+                    criados.append((device_id, nome))
+            for tipo in self._verificar(estado, nome, valor):
+                anomalias.append({"campo": nome, "tipo": tipo, "valor": valor})
+            if desfazer is not None:
+                self._incorporar(estado, valor, desfazer)
+
+        hcsr04 = sensors.get("hcsr04") or {}
+        if hcsr04.get("status") == "error" or hcsr04.get("distance", 1) <= 0:
+            anomalias.append({"campo": "hcsr04_distance", "tipo": "sem_eco",
+                              "valor": hcsr04.get("distance")})
+
+        raw = (sensors.get("hl69") or {}).get("raw_value")
+        if raw is not None and (raw <= RAW_MINIMO or raw >= RAW_MAXIMO):
+            anomalias.append({"campo": "hl69_raw_value", "tipo": "saturado", "valor": raw})
+
+        abertos, encerrados = _transicoes(ativos[device_id], device_id, leitura["timestamp"], anomalias)
+        pendente.passos[device_id].append((avaliados, leitura["timestamp"], anomalias))
+        pendente.leituras += 1
+        pendente.anomalias += len(anomalias)
+
+        return {"anomalias": anomalias, "alertas_abertos": abertos, "alertas_encerrados": encerrados}
+
+    def _aplicar(self, device_id: str, passos: list):
+        """Aplica ao estado atual os passos avaliados em `preparar` (com o lock)"""
+        ativos = self._ativos.setdefault(device_id, {})
+        for avaliados, timestamp, anomalias in passos:
+            for nome, valor in avaliados.items():
+                estado = self._estados.get((device_id, nome))
+                if estado is None:
+                    estado = self._estados[(device_id, nome)] = EstadoCampo(self.tamanho_janela)
+                self._incorporar(estado, valor)
+            # Os eventos já foram devolvidos; aqui só os alertas ativos são acertados
+            _transicoes(ativos, device_id, timestamp, anomalias)
+
+    def _verificar(self, estado: EstadoCampo, nome: str, valor: float) -> list:
+        """Anomalias do valor em relação ao estado atual (não altera o estado)"""
+        tipos = []
+        escala_minima = ESCALA_MINIMA.get(nome, 1e-6)
+
+        if estado.n >= self.aquecimento:
+            # Mediana e escala robusta (IQR) direto da janela ordenada
+            ordenada = estado.ordenada
+            k = len(ordenada)
+            mediana = ordenada[k // 2] if k % 2 else (ordenada[k // 2 - 1] + ordenada[k // 2]) / 2
+            escala = max((ordenada[(3 * k) // 4] - ordenada[k // 4]) / _IQR_PARA_SIGMA, escala_minima)
+            if abs(valor - mediana) > self.limite_robusto * escala:
+                tipos.append("outlier")
+
+            desvio = max(math.sqrt(estado.variancia), escala_minima)
+            if abs(valor - estado.media) / desvio > self.limite_z:
+                tipos.append("desvio")
+
+        # Valores repetidos seguidos (sensor travado), contando com este
+        repeticoes = estado.repeticoes + 1 if estado.ultimo is not None and valor == estado.ultimo else 0
+        if repeticoes >= self.repeticoes_travado:
+            tipos.append("travado")
+
+        return tipos
+
+    def _incorporar(self, estado: EstadoCampo, valor: float, desfazer: list = None):
+        """
+        Acrescenta o valor ao estado (janela, repetições e EWMA)
+
+        Args:
+            desfazer (list, optional): Recebe o necessário para `EstadoCampo.desfazer`
+        """
+        if desfazer is not None:
+            desfazer.append((estado, (estado.media, estado.variancia, estado.n, estado.ultimo, estado.repeticoes),
+                             estado.janela[0] if len(estado.janela) == estado.janela.maxlen else None))
+
+        # Contador de valores repetidos (sensor travado)
+        if estado.ultimo is not None and valor == estado.ultimo:
+            estado.repeticoes += 1
+        else:
+            estado.repeticoes = 0
+        estado.ultimo = valor
+
+        # Janela móvel: remove o mais antigo da lista ordenada e insere o novo
+        if len(estado.janela) == estado.janela.maxlen:
+            antigo = estado.janela[0]
+            del estado.ordenada[bisect.bisect_left(estado.ordenada, antigo)]
+        estado.janela.append(valor)
+        bisect.insort(estado.ordenada, valor)
+
+        # Média e variância EWMA
+        if estado.n == 0:
+            estado.media = valor
+        else:
+            diferenca = valor - estado.media
+            incremento = self.alfa_ewma * diferenca
+            estado.media += incremento
+            estado.variancia = (1 - self.alfa_ewma) * (estado.variancia + diferenca * incremento)
+        estado.n += 1
+
+    def estatisticas(self) -> dict:
+        """Contadores do detector (para monitoramento)"""
+        return {
+            "leituras_avaliadas": self.leituras_avaliadas,
+            "anomalias_detectadas": self.anomalias_detectadas,
+            "series_monitoradas": len(self._estados),
+            "alertas_ativos": sum(len(a) for a in self._ativos.values()),
+        }
+
+
+def _transicoes(ativos: dict, device_id: str, timestamp: str, anomalias: list):
+    """Compara as anomalias atuais com as ativas (`ativos`, alterado aqui) e gera eventos de alerta"""
+    atuais = {(a["campo"], a["tipo"]): a["valor"] for a in anomalias}
+
+    abertos = []
+    for (campo, tipo), valor in atuais.items():
+        if (campo, tipo) not in ativos:
+            ativos[(campo, tipo)] = timestamp
+            abertos.append(_evento(device_id, campo, tipo, timestamp, valor))
+
+    encerrados = []
+    for chave in [c for c in ativos if c not in atuais]:
+        inicio = ativos.pop(chave)
+        evento = _evento(device_id, chave[0], chave[1], inicio, None)
+        evento["fim"] = timestamp
+        encerrados.append(evento)
+
+    return abertos, encerrados
+
+
+def _evento(device_id: str, campo: str, tipo: str, inicio: str, valor) -> dict:
+    return {
+        "id": gerar_id_leitura(device_id, f"{campo}|{tipo}|{inicio}"),
+        "device_id": device_id,
+        "campo": campo,
+        "tipo": tipo,
+        "inicio": inicio,
+        "valor": valor,
+    }
+
+
+def marcar_leitura(resultado: dict) -> list:
+    """Rótulos gravados no documento da leitura, ex.: ["dht11_humidity:travado"]"""
+    return [f"{a['campo']}:{a['tipo']}" for a in resultado["anomalias"]]
+
+
+def registrar_alertas(db, resultados: list):
+    """
+    Grava na coleção `sensor_alerts` os alertas abertos e encerrados
+
+    Executado em segundo plano após a resposta. Usa apenas escritas (IDs
+    determinísticos), sem nenhuma leitura no Firestore.
+    """
+    colecao = db.collection(COLECAO_ALERTAS)
+    agora = datetime.now().isoformat()
+
+    operacoes = []
+    for resultado in resultados:
+        for evento in resultado["alertas_abertos"]:
+            dados = {k: v for k, v in evento.items() if k != "id"}
+            operacoes.append((evento["id"], {**dados, "ativo": True, "detectado_em": agora}))
+        for evento in resultado["alertas_encerrados"]:
+            # Documento completo: fica correto mesmo se a abertura não tiver sido gravada
+            dados = {k: v for k, v in evento.items() if k not in ("id", "valor")}
+            operacoes.append((evento["id"], {**dados, "ativo": False, "encerrado_em": agora}))
+
+    try:
+        for inicio in range(0, len(operacoes), TAMANHO_MAXIMO_BATCH):
+            batch = db.batch()
+            for doc_id, dados in operacoes[inicio:inicio + TAMANHO_MAXIMO_BATCH]:
+                batch.set(colecao.document(doc_id), dados, merge=True)
+            batch.commit()
+    except Exception as e:
+        print(f"❌ Erro ao registrar alertas: {str(e)}")
@@ -9,14 +9,42 @@ Autor: Equipe Projeto Integrador 4 - UFSM
 Data: 2025
 """
 
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import List
+import asyncio
+import math
+from contextlib import asynccontextmanager
+from fastapi import BackgroundTasks, Depends, FastAPI, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+from pydantic import ValidationError
+from typing import List, Optional, Tuple
 from datetime import datetime
 import os
 from dotenv import load_dotenv
-import firebase_admin
-from firebase_admin import credentials, firestore
+from firebase_client import GerenciadorFirebase
+from deduplicacao import CacheLeiturasRecentes
+from modelos import LEITURA, DadosSensor, leitura_de_modelo, validar_lista_json
+from armazenamento import COLECAO_LEITURAS, agora_utc, gravar_lote_async, id_da_leitura, montar_documento, para_datetime
+from anomalias import DetectorAnomalias, marcar_leitura, registrar_alertas
+from regras_alerta import MotorAlertas, compilar_regras, criar_destino
+from estatisticas import resumir_leituras
+from consultas import Plano, PlanejadorConsultas, carregar_indices
+from particionamento import COLECAO_DISPOSITIVOS, LayoutParticionado
+from arquivo_frio import ArquivadorFrio, ArquivoFrio, ArquivoIndisponivel
+from retencao import MotorRetencao, interpretar_duracao, interpretar_niveis
+from concorrencia import LimitadorConcorrencia, LimiteExcedido
+from coalescencia import CoalescedorConsultas
+from perfil import CapturaEmAndamento, Perfilador, span
+from limite_taxa import LimitadorTaxa, device_id_do_corpo
+from metricas_derivadas import CalculadoraIncremental, calcular_janela, interpretar_reservatorios
+from piramide import PiramideHistorico, reduzir_min_max
+from snapshot_dashboard import DiretorioDispositivos, etag_confere, montar_snapshot, serializar
+from reamostragem import reamostrar_documentos
+from gateway_mqtt import ClientePaho, GatewayMQTT, TOPICO_LEITURAS
+from intervalo_adaptativo import ControladorIntervalo, TOLERANCIAS_PADRAO, interpretar_tolerancias
+from formato_compacto import (
+    TIPOS_COMPACTOS, FormatoNaoSuportado, decodificar_corpo, decodificar_leitura_compacta,
+    leitura_de_mapa_compacto
+)
 
 # ========================================
 # CONFIGURAÇÃO INICIAL
@@ -25,147 +53,438 @@ from firebase_admin import credentials, firestore
 # Carrega variáveis de ambiente do arquivo .env
 load_dotenv()
 
-# Cria a aplicação FastAPI com título personalizado
-app = FastAPI(
-    title="API Telhado Verde",
-    description="Sistema de monitoramento IoT para telhado verde com ESP32 e Firebase",
-    version="1.0.0"
+# Planejador de consultas: índices compostos declarados em firestore.indexes.json
+planejador = PlanejadorConsultas(
+    carregar_indices(),
+    fator_varredura=int(os.getenv("CONSULTA_FATOR_VARREDURA", "20")),
+    max_varredura=int(os.getenv("CONSULTA_MAX_VARREDURA", "5000")),
 )
+VERIFICAR_INDICES = os.getenv("FIRESTORE_VERIFICAR_INDICES", "1") in ["1", "true", "True", "TRUE"]
 
-# Variável global para conexão com Firebase (inicializada no startup)
-db = None
+# Gerenciador da conexão com Firebase (conecta em segundo plano no startup)
+firebase = GerenciadorFirebase(
+    cred_path=os.getenv("FIREBASE_CREDENTIALS_PATH", "config/firebase-credentials.json"),
+    backoff_inicial=float(os.getenv("FIREBASE_BACKOFF_INICIAL", "1")),
+    backoff_maximo=float(os.getenv("FIREBASE_BACKOFF_MAXIMO", "60")),
+    falhas_para_reconectar=int(os.getenv("FIREBASE_FALHAS_PARA_RECONECTAR", "3")),
+    ao_conectar=planejador.verificar if VERIFICAR_INDICES else None,
+)
 
-# ========================================
-# MODELOS DE DADOS (Pydantic)
-# ========================================
-# Define a estrutura esperada dos dados JSON recebidos do ESP32
+# Operações simultâneas no AsyncClient do Firestore (excedentes esperam na fila
+# até FIRESTORE_ESPERA_MAXIMA segundos e recebem 503)
+limitador = LimitadorConcorrencia(
+    maximo=int(os.getenv("FIRESTORE_MAX_CONCORRENCIA", "200")),
+    espera_maxima=float(os.getenv("FIRESTORE_ESPERA_MAXIMA", "5")),
+)
 
-class SensorDS18B20(BaseModel):
-    """
-    Modelo para sensor de temperatura do solo DS18B20
-    - Sensor digital de temperatura
-    - Precisão: ±0.5°C
-    """
-    temperature: float  # Temperatura em graus Celsius
-    unit: str = "celsius"  # Unidade de medida
-    status: str = "ok"  # Status do sensor (ok, warning, error)
+# Consultas idênticas de GET /sensor-data compartilham a execução e, por
+# CONSULTA_COALESCER_TTL segundos, o resultado (rajadas de atualização do dashboard)
+coalescedor = CoalescedorConsultas(ttl=float(os.getenv("CONSULTA_COALESCER_TTL", "1")))
 
+# IDs das leituras aceitas recentemente (rejeita reenvios sem ler o Firestore)
+leituras_recentes = CacheLeiturasRecentes(
+    capacidade=int(os.getenv("DEDUP_CACHE_TAMANHO", "10000"))
+)
 
-class SensorDHT11(BaseModel):
-    """
-    Modelo para sensor de temperatura e umidade DHT11
-    - Sensor digital para ambiente
-    - Temperatura: -40°C a 80°C
-    - Umidade: 0% a 100%
-    """
-    temperature: float  # Temperatura do ar em Celsius
-    humidity: float  # Umidade relativa do ar em %
-    unit_temp: str = "celsius"
-    unit_humidity: str = "percent"
-    status: str = "ok"
+# Detector de anomalias por dispositivo/campo (estado em memória, sem leituras no Firestore)
+detector = DetectorAnomalias(
+    tamanho_janela=int(os.getenv("ANOMALIA_JANELA", "60")),
+    limite_robusto=float(os.getenv("ANOMALIA_LIMITE_ROBUSTO", "6")),
+    alfa_ewma=float(os.getenv("ANOMALIA_ALFA_EWMA", "0.1")),
+    limite_z=float(os.getenv("ANOMALIA_LIMITE_Z", "5")),
+    repeticoes_travado=int(os.getenv("ANOMALIA_REPETICOES_TRAVADO", "120")),
+)
 
-class SensorHCSR04(BaseModel):
+# Regras de alerta (ex.: "hl69.soil_moisture < 30 for 15m; hcsr04.distance > 28")
+motor_alertas = MotorAlertas(
+    compilar_regras(os.getenv("ALERTA_REGRAS", "").split(";")),
+    criar_destino(os.getenv("ALERTA_DESTINO", "console")),
+    intervalo_minimo=interpretar_duracao(os.getenv("ALERTA_INTERVALO_MINIMO", "10m")).total_seconds(),
+)
+
+# Métricas derivadas (volume do reservatório, taxa de umidade do solo,
+# amortecimento térmico), calculadas na ingestão e em GET /sensor-data/derivadas
+calculadora = CalculadoraIncremental(
+    interpretar_reservatorios(os.getenv("RESERVATORIOS", "*=cilindro:altura=30,diametro=40")),
+    tamanho_janela=int(os.getenv("DERIVADAS_JANELA", "500")),
+)
+
+# Perfil de desempenho: 1 a cada PERFIL_AMOSTRAGEM requisições é cronometrada
+# por etapa (GET /debug/profile); desativado, não há middleware nem custo
+perfilador = Perfilador(
+    ativo=os.getenv("PERFIL_ATIVO", "0") in ["1", "true", "True", "TRUE"],
+    amostragem=int(os.getenv("PERFIL_AMOSTRAGEM", "100")),
+    capacidade=int(os.getenv("PERFIL_CAPACIDADE", "1000")),
+)
+PERFIL_MAX_SEGUNDOS = float(os.getenv("PERFIL_MAX_SEGUNDOS", "30"))
+
+# GET /dashboard/snapshot: pontos da série do gráfico e dispositivos conhecidos
+# (vistos na ingestão e nas consultas; varredura completa a cada DISPOSITIVOS_TTL s)
+SNAPSHOT_PONTOS = int(os.getenv("SNAPSHOT_PONTOS", "200"))
+SNAPSHOT_MAX_JANELA = int(os.getenv("SNAPSHOT_MAX_JANELA", "5000"))
+DISPOSITIVOS_VARREDURA = int(os.getenv("DISPOSITIVOS_VARREDURA", "500"))
+diretorio = DiretorioDispositivos(ttl=float(os.getenv("DISPOSITIVOS_TTL", "300")))
+
+# Grade regular (GET /sensor-data/grade e snapshot): passo padrão, lacunas
+# interpoladas (0 = nenhuma; padrão = INTERVALO_MAXIMO) e máximo de células por dispositivo
+GRADE_PASSO = interpretar_duracao(os.getenv("GRADE_PASSO", "60s")).total_seconds()
+GRADE_INTERPOLAR = interpretar_duracao(os.getenv("GRADE_INTERPOLAR", "5m")).total_seconds()
+GRADE_MAX_CELULAS = int(os.getenv("GRADE_MAX_CELULAS", "20000"))
+
+# Controle de admissão da ingestão: fichas por segundo e rajada por device_id
+# e por IP do cliente (0 = sem limite); excesso recebe 429 antes da validação
+limite_dispositivo = LimitadorTaxa(
+    taxa=float(os.getenv("LIMITE_DISPOSITIVO_TAXA", "0.2")),
+    rajada=float(os.getenv("LIMITE_DISPOSITIVO_RAJADA", "10")),
+)
+limite_ip = LimitadorTaxa(
+    taxa=float(os.getenv("LIMITE_IP_TAXA", "10")),
+    rajada=float(os.getenv("LIMITE_IP_RAJADA", "50")),
+)
+
+# Quantidade máxima de leituras aceitas em POST /sensor-data/batch
+LOTE_MAXIMO_LEITURAS = int(os.getenv("LOTE_MAXIMO_LEITURAS", "500"))
+
+# Ingestão MQTT (alternativa ao POST): assina telhado/+/readings no broker e
+# grava pelo mesmo caminho do lote HTTP; só conecta com MQTT_ATIVO=1
+MQTT_ATIVO = os.getenv("MQTT_ATIVO", "0") in ["1", "true", "True", "TRUE"]
+
+# Amostragem adaptativa: a resposta da ingestão recomenda o próximo intervalo
+# de leitura de cada dispositivo (variabilidade recente + orçamento global)
+intervalos = ControladorIntervalo(
+    minimo=interpretar_duracao(os.getenv("INTERVALO_MINIMO", "15s")).total_seconds(),
+    maximo=interpretar_duracao(os.getenv("INTERVALO_MAXIMO", "5m")).total_seconds(),
+    padrao=interpretar_duracao(os.getenv("INTERVALO_PADRAO", "30s")).total_seconds(),
+    orcamento_diario=float(os.getenv("INTERVALO_ORCAMENTO_DIARIO", "17000")),
+    tolerancias=interpretar_tolerancias(os.getenv("INTERVALO_TOLERANCIAS", TOLERANCIAS_PADRAO)),
+) if os.getenv("INTERVALO_ADAPTATIVO", "1") in ["1", "true", "True", "TRUE"] else None
+
+
+# Níveis de retenção (bruto → agregados); a limpeza só roda com RETENCAO_ATIVA=1
+NIVEIS_RETENCAO = interpretar_niveis(os.getenv("RETENCAO_NIVEIS", "raw=30d,5m=365d,1h=inf"))
+RETENCAO_ATIVA = os.getenv("RETENCAO_ATIVA", "0") in ["1", "true", "True", "TRUE"]
+
+# Coleção consultada em GET /sensor-data para cada resolução (raw, 5min, 1h, ...)
+COLECOES_POR_RESOLUCAO = {
+    "raw" if nivel.resolucao is None else nivel.colecao[len(NIVEIS_RETENCAO[0].colecao) + 1:]: nivel.colecao
+    for nivel in NIVEIS_RETENCAO
+}
+
+# GET /sensor-data/historico: nível de retenção escolhido pela largura do
+# gráfico (pontos) e reduzido a min/max/média por faixa
+piramide = PiramideHistorico(
+    NIVEIS_RETENCAO,
+    intervalo_bruto=interpretar_duracao(os.getenv("HISTORICO_INTERVALO_BRUTO", "30s")),
+    max_documentos=int(os.getenv("HISTORICO_MAX_DOCUMENTOS", "5000")),
+)
+HISTORICO_MAX_PONTOS = int(os.getenv("HISTORICO_MAX_PONTOS", "2000"))
+
+# Layout particionado devices/{id}/readings/{aaaa-mm} para as leituras brutas
+# (None = coleção única sensor_readings); migração: scripts/migrar_particoes.py
+layout = LayoutParticionado() if os.getenv("LAYOUT_PARTICIONADO", "0") in ["1", "true", "True", "TRUE"] else None
+if layout is not None:
+    NIVEIS_RETENCAO[0].fontes = layout.colecoes
+
+# Arquivo frio: meses fechados das leituras brutas em Parquet no disco local.
+# A consulta ao arquivo em GET /sensor-data vale sempre que houver dados nele;
+# o arquivamento periódico só roda com ARQUIVO_ATIVO=1
+arquivo = ArquivoFrio(
+    os.getenv("ARQUIVO_DIRETORIO", "arquivo"),
+    nivel_zstd=int(os.getenv("ARQUIVO_NIVEL_ZSTD", "9")),
+)
+ARQUIVO_ATIVO = os.getenv("ARQUIVO_ATIVO", "0") in ["1", "true", "True", "TRUE"]
+
+
+async def executar_retencao_periodicamente():
     """
-    Modelo para sensor ultrassônico HC-SR04
-    - Medição de distância por ultrassom
-    - Usado para medir nível de água no reservatório
-    - Alcance: 2cm a 400cm
+    Tarefa de segundo plano que aplica os níveis de retenção
+
+    Roda o MotorRetencao em uma thread (o cliente Firestore é síncrono)
+    a cada RETENCAO_INTERVALO; enquanto o Firebase não conecta, aguarda.
     """
-    distance: float  # Distância em centímetros
-    unit: str = "cm"
-    status: str = "ok"
+    intervalo = interpretar_duracao(os.getenv("RETENCAO_INTERVALO", "6h")).total_seconds()
+    while True:
+        db = firebase.db
+        if not db:
+            await asyncio.sleep(60)
+            continue
+        try:
+            motor = MotorRetencao(
+                db,
+                NIVEIS_RETENCAO,
+                tamanho_lote=int(os.getenv("RETENCAO_TAMANHO_LOTE", "400")),
+                pausa_entre_lotes=float(os.getenv("RETENCAO_PAUSA_ENTRE_LOTES", "1")),
+                max_exclusoes=int(os.getenv("RETENCAO_MAX_EXCLUSOES", "20000")),
+            )
+            resultado = await asyncio.to_thread(motor.executar)
+            print(f"🧹 Retenção concluída: {resultado}")
+        except Exception as e:
+            print(f"❌ Erro na retenção de dados: {str(e)}")
+        await asyncio.sleep(intervalo)
 
 
-class SensorHL69(BaseModel):
+async def executar_arquivamento_periodicamente():
     """
-    Modelo para sensor de umidade do solo HL-69
-    - Sensor analógico resistivo
-    - Mede umidade do solo
+    Tarefa de segundo plano que move meses fechados para o arquivo frio
+
+    Com a retenção ativa, só arquiva o que o primeiro nível agregado já
+    incorporou (a agregação lê as leituras brutas do Firestore).
     """
-    soil_moisture: float  # Umidade do solo em %
-    raw_value: int  # Valor bruto analógico (0-4095)
-    unit: str = "percent"
-    status: str = "ok"
+    intervalo = interpretar_duracao(os.getenv("ARQUIVO_INTERVALO", "24h")).total_seconds()
+    while True:
+        db = firebase.db
+        if not db:
+            await asyncio.sleep(60)
+            continue
+        try:
+            limite_seguro = None
+            if RETENCAO_ATIVA and len(NIVEIS_RETENCAO) > 1:
+                retencao = MotorRetencao(db, NIVEIS_RETENCAO)
+                limite_seguro = lambda: retencao.agregado_ate(NIVEIS_RETENCAO[1])  # noqa: E731
+            arquivador = ArquivadorFrio(
+                db,
+                arquivo,
+                NIVEIS_RETENCAO[0],
+                atraso=interpretar_duracao(os.getenv("ARQUIVO_ATRASO", "1d")),
+                limite_seguro=limite_seguro,
+                pausa_entre_lotes=float(os.getenv("RETENCAO_PAUSA_ENTRE_LOTES", "1")),
+            )
+            resultado = await asyncio.to_thread(arquivador.executar)
+            print(f"🧊 Arquivamento concluído: {resultado}")
+        except Exception as e:
+            print(f"❌ Erro no arquivamento: {str(e)}")
+        await asyncio.sleep(intervalo)
 
 
-class Sensors(BaseModel):
+@asynccontextmanager
+async def lifespan(app: FastAPI):
     """
-    Conjunto completo de todos os sensores do sistema
-    Agrupa todas as leituras em uma única estrutura
+    Ciclo de vida da API
+
+    A conexão com o Firebase é iniciada em segundo plano: a API começa a
+    responder imediatamente e os endpoints de dados retornam 503 até que
+    o Firestore esteja pronto (ver /health/ready).
     """
-    ds18b20: SensorDS18B20
-    dht11: SensorDHT11
-    hcsr04: SensorHCSR04
-    hl69: SensorHL69
+    firebase.iniciar()
+    tarefas = []
+    cliente_mqtt = None
+    if MQTT_ATIVO:
+        cliente_mqtt = ClientePaho(
+            gateway,
+            host=os.getenv("MQTT_HOST", "localhost"),
+            porta=int(os.getenv("MQTT_PORTA", "1883")),
+            client_id=os.getenv("MQTT_CLIENT_ID", "telhado-api"),
+            topico=os.getenv("MQTT_TOPICO", TOPICO_LEITURAS),
+            usuario=os.getenv("MQTT_USUARIO") or None,
+            senha=os.getenv("MQTT_SENHA") or None,
+        )
+        cliente_mqtt.iniciar(asyncio.get_running_loop())
+    if RETENCAO_ATIVA:
+        tarefas.append(asyncio.create_task(executar_retencao_periodicamente()))
+    if ARQUIVO_ATIVO:
+        tarefas.append(asyncio.create_task(executar_arquivamento_periodicamente()))
+    yield
+    if cliente_mqtt is not None:
+        await gateway.descarregar()  # Grava e confirma o que já chegou
+        cliente_mqtt.parar()
+    for tarefa in tarefas:
+        tarefa.cancel()
+    firebase.parar()
+
+
+# Cria a aplicação FastAPI com título personalizado
+app = FastAPI(
+    title="API Telhado Verde",
+    description="Sistema de monitoramento IoT para telhado verde com ESP32 e Firebase",
+    version="1.0.0",
+    lifespan=lifespan
+)
+perfilador.instalar(app)
 
+# ========================================
+# CONTROLE DE ADMISSÃO
+# ========================================
 
-class DadosSensor(BaseModel):
+async def admitir(request: Request):
     """
-    Modelo principal de dados enviados pelo ESP32
-    
-    Estrutura do JSON esperado:
-    {
-        "device_id": "ESP32_TELHADO_VERDE",
-        "timestamp": "2025-11-12T14:30:00",
-        "sensors": { ... }
-    }
+    Token bucket por IP e por device_id, antes de validar ou gravar
+
+    O IP vem da conexão (atrás do nginx, o uvicorn já o substitui pelo
+    X-Forwarded-For enviado pelo proxy local). Um lote consome uma ficha,
+    no balde do dispositivo da primeira leitura.
+
+    Raises:
+        HTTPException 429: Balde vazio, com Retry-After em segundos
     """
-    device_id: str  # Identificador único do dispositivo ESP32
-    timestamp: str  # Timestamp da coleta (ISO 8601)
-    sensors: Sensors  # Dados de todos os sensores
+    ip = request.client.host if request.client else "desconhecido"
+    espera = limite_ip.consumir(ip)
+    if espera:
+        raise requisicao_limitada(f"IP {ip}", espera)
+
+    if limite_dispositivo.ativo:
+        content_type = request.headers.get("content-type", "application/json").split(";")[0].strip().lower()
+        device_id = device_id_do_corpo(await request.body(), content_type)  # Corpo fica em cache na Request
+        if device_id:
+            espera = limite_dispositivo.consumir(device_id)
+            if espera:
+                raise requisicao_limitada(f"Dispositivo {device_id}", espera)
+
+
+def requisicao_limitada(origem: str, espera: float) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=f"{origem} excedeu o limite de envios; tente novamente em {espera:.1f}s",
+        headers={"Retry-After": str(max(1, math.ceil(espera)))},
+    )
 
 
 # ========================================
-# INICIALIZAÇÃO DO FIREBASE
+# LEITURA DO CORPO (JSON OU FORMATO COMPACTO)
 # ========================================
 
-@app.on_event("startup")
-async def startup_event():
+async def ler_leitura(request: Request) -> dict:
     """
-    Evento executado na inicialização da API
-    
-    Responsável por:
-    1. Carregar credenciais do Firebase
-    2. Inicializar conexão com Firestore
-    3. Configurar cliente do banco de dados
-    
+    Lê o corpo de POST /sensor-data conforme o Content-Type
+
+    - application/json (padrão): validação estrita com DadosSensor (faixas
+      dos sensores, status e timestamp; ver modelos.py), direto dos bytes
+    - application/msgpack, application/cbor: formato compacto plano,
+      decodificado sem os modelos aninhados (ver formato_compacto.py)
+
     Raises:
-        Exception: Se houver erro na conexão (API continua funcionando)
+        HTTPException 415: Formato compacto sem biblioteca instalada
+        HTTPException 422: Corpo inválido
     """
-    global db
-    
+    content_type = request.headers.get("content-type", "application/json").split(";")[0].strip().lower()
+    corpo = await request.body()
+
+    if content_type in TIPOS_COMPACTOS:
+        try:
+            with span("validacao"):
+                return decodificar_leitura_compacta(corpo, content_type)
+        except FormatoNaoSuportado as e:
+            raise HTTPException(status_code=415, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=f"Leitura compacta inválida: {str(e)}")
+
     try:
-        # Obtém o caminho das credenciais do arquivo .env
-        cred_path = os.getenv("FIREBASE_CREDENTIALS_PATH", "config/firebase-credentials.json")
-        
-        # Verifica se o arquivo de credenciais existe
-        if not os.path.exists(cred_path):
-            print(f"AVISO: Arquivo de credenciais não encontrado: {cred_path}")
-            print(f"A API funcionará, mas sem salvar no Firebase!")
-            print(f"Siga o guia docs/GUIA_RAPIDO.md para configurar")
-            return
-        
-        # Inicializa o Firebase Admin SDK
-        cred = credentials.Certificate(cred_path)
-        firebase_admin.initialize_app(cred)
-        
-        # Cria cliente do Firestore
-        db = firestore.client()
-        
-        print("=" * 60)
-        print("🔥 Firebase Firestore conectado com sucesso!")
-        print("=" * 60)
-        
-    except Exception as e:
-        print(f"❌ Erro ao conectar Firebase: {str(e)}")
-        print(f"A API funcionará sem Firebase")
+        with span("validacao"):
+            dados = LEITURA.validate_json(corpo)
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**erro, "loc": ("body", *erro["loc"])} for erro in e.errors(include_url=False)],
+            body=corpo
+        )
+    with span("serializacao"):
+        return leitura_de_modelo(dados)
+
+
+async def ler_lote(request: Request) -> dict:
+    """
+    Lê o corpo de POST /sensor-data/batch conforme o Content-Type
+
+    O corpo é uma lista de leituras (JSON no formato DadosSensor ou mapas
+    compactos em msgpack/CBOR). Itens inválidos são devolvidos em
+    "rejeitadas" sem impedir o restante do lote, para que o firmware não
+    fique preso reenviando uma leitura corrompida. Uma lista JSON é
+    decodificada uma vez e validada item a item (ver modelos.validar_lista_json).
+
+    Returns:
+        dict: {"validas": [(indice, leitura)], "rejeitadas": [{"indice", "erro"}]}
+
+    Raises:
+        HTTPException 413: Lote maior que LOTE_MAXIMO_LEITURAS
+        HTTPException 415: Formato compacto sem biblioteca instalada
+        HTTPException 422: Corpo que não é uma lista
+    """
+    content_type = request.headers.get("content-type", "application/json").split(";")[0].strip().lower()
+    corpo = await request.body()
+
+    if content_type not in TIPOS_COMPACTOS:
+        try:
+            with span("validacao"):
+                validas, rejeitadas = validar_lista_json(corpo)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=f"Lote inválido: {str(e)}")
+        verificar_tamanho_lote(len(validas) + len(rejeitadas))
+        return {"validas": validas, "rejeitadas": rejeitadas}
+
+    try:
+        with span("validacao"):
+            itens = decodificar_corpo(corpo, content_type)
+    except FormatoNaoSuportado as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Lote inválido: {str(e)}")
+
+    if not isinstance(itens, list):
+        raise HTTPException(status_code=422, detail="O lote deve ser uma lista de leituras")
+    verificar_tamanho_lote(len(itens))
+
+    validas, rejeitadas = [], []
+    with span("validacao"):
+        for indice, item in enumerate(itens):
+            try:
+                if not isinstance(item, dict):
+                    raise ValueError("A leitura compacta deve ser um mapa")
+                validas.append((indice, leitura_de_mapa_compacto(item)))
+            except ValueError as e:
+                rejeitadas.append({"indice": indice, "erro": str(e)})
+    return {"validas": validas, "rejeitadas": rejeitadas}
+
+
+def verificar_tamanho_lote(quantidade: int):
+    """413 para lotes maiores que LOTE_MAXIMO_LEITURAS"""
+    if quantidade > LOTE_MAXIMO_LEITURAS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Lote com {quantidade} leituras excede o máximo de {LOTE_MAXIMO_LEITURAS}"
+        )
+
+
+# Documenta no Swagger os dois formatos aceitos por POST /sensor-data
+CORPO_SENSOR_DATA_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {"schema": {"$ref": "#/components/schemas/DadosSensor"}},
+            "application/msgpack": {"schema": {"type": "string", "format": "binary"}},
+            "application/cbor": {"schema": {"type": "string", "format": "binary"}},
+        },
+    }
+}
+
+
+def _openapi_com_modelos():
+    """Gera o schema OpenAPI incluindo DadosSensor (corpo lido manualmente)"""
+    if app.openapi_schema:
+        return app.openapi_schema
+    from fastapi.openapi.utils import get_openapi
+    schema = get_openapi(title=app.title, version=app.version,
+                         description=app.description, routes=app.routes)
+    componentes = schema.setdefault("components", {}).setdefault("schemas", {})
+    componentes.update(DadosSensor.model_json_schema(ref_template="#/components/schemas/{model}").pop("$defs", {}))
+    componentes["DadosSensor"] = DadosSensor.model_json_schema(ref_template="#/components/schemas/{model}")
+    componentes["DadosSensor"].pop("$defs", None)
+    app.openapi_schema = schema
+    return schema
+
+
+app.openapi = _openapi_com_modelos
+
+
+@app.exception_handler(LimiteExcedido)
+async def limite_excedido(request: Request, erro: LimiteExcedido):
+    """Fila do limitador cheia: 503 com Retry-After para o cliente tentar de novo"""
+    return JSONResponse(status_code=503, content={"detail": str(erro)}, headers={"Retry-After": "1"})
+
 
 # ========================================
 # ENDPOINTS DA API
 # ========================================
 
 @app.get("/", tags=["Status"])
-def health_check():
+async def health_check():
     """
     Endpoint raiz - Health check e informações da API
     
@@ -175,40 +494,92 @@ def health_check():
     Example:
         GET http://localhost:8000/
     """
-    firebase_status = "✅ Conectado" if db else "⚠️ Não configurado"
+    firebase_status = "✅ Conectado" if firebase.pronto else "⚠️ Não configurado"
     
     return {
         "mensagem": "API Telhado Verde funcionando! 🌱",
         "firebase": firebase_status,
+        **({"mqtt": gateway.estatisticas()} if MQTT_ATIVO else {}),
+        **({"intervalos": intervalos.estatisticas()} if intervalos is not None else {}),
         "timestamp": datetime.now().isoformat(),
         "endpoints": {
             "enviar_dados": "POST /sensor-data",
             "consultar_dados": "GET /sensor-data",
+            "metricas_derivadas": "GET /sensor-data/derivadas",
+            "liveness": "GET /health/live",
+            "readiness": "GET /health/ready",
             "documentacao_swagger": "/docs",
             "documentacao_redoc": "/redoc"
         }
     }
 
 
-@app.post("/sensor-data", tags=["Sensores"])
-def receber_dados(dados: DadosSensor):
+@app.get("/health/live", tags=["Status"])
+async def liveness():
+    """
+    Liveness probe - indica apenas que o processo está respondendo
+
+    Não depende do Firebase: uma falha de credencial não deve fazer o
+    systemd/orquestrador reiniciar a API, pois a reconexão é automática.
+    """
+    return {"status": "vivo", "timestamp": datetime.now().isoformat()}
+
+
+@app.get("/health/ready", tags=["Status"])
+async def readiness():
+    """
+    Readiness probe - indica se a API consegue salvar/consultar dados
+
+    Returns:
+        200 com o estado da conexão quando o Firestore está pronto,
+        503 com o mesmo corpo enquanto conecta ou reconecta
+    """
+    corpo = {
+        "status": "pronto" if firebase.pronto else "indisponivel",
+        **firebase.status(),
+        "indices": planejador.status(),
+        "concorrencia": limitador.status(),
+        "coalescencia": coalescedor.status(),
+        "limite_taxa": {"dispositivo": limite_dispositivo.status(), "ip": limite_ip.status()},
+    }
+    return JSONResponse(status_code=200 if firebase.pronto else 503, content=corpo)
+
+
+@app.post("/sensor-data", tags=["Sensores"], openapi_extra=CORPO_SENSOR_DATA_OPENAPI)
+@perfilador.endpoint
+async def receber_dados(background_tasks: BackgroundTasks, _admitida: None = Depends(admitir),
+                        leitura: dict = Depends(ler_leitura)):
     """
     Recebe dados dos sensores enviados pelo ESP32
     
     Este endpoint:
-    1. Recebe o JSON com dados dos sensores
-    2. Valida a estrutura usando Pydantic
-    3. Adiciona timestamp de recebimento
-    4. Salva no Firebase Firestore
+    0. Aplica o limite de envios por IP e por dispositivo (429 + Retry-After)
+    1. Recebe o JSON (ou msgpack/CBOR compacto) com dados dos sensores
+    2. Valida a estrutura (Pydantic para JSON, validador enxuto para o compacto)
+    3. Descarta reenvios da mesma leitura (ID determinístico + cache LRU)
+    4. Marca anomalias (outlier, sensor travado, saturação, sem eco)
+    5. Adiciona timestamp de recebimento
+    6. Salva no Firebase Firestore (alertas em sensor_alerts, em segundo plano)
+    7. Avalia as regras de alerta (ALERTA_REGRAS) em segundo plano
+    8. Atualiza as métricas derivadas do dispositivo (janela em memória)
+    9. Recomenda o próximo intervalo de leitura (`intervalo_recomendado_ms`)
+    
+    A ingestão é idempotente: o ID do documento é derivado de
+    (device_id, timestamp) e do seq, quando enviado. Uma leitura repetida
+    retorna 200 com status "duplicate" e o mesmo firestore_id.
+    
+    A gravação usa o AsyncClient e uma vaga do limitador de concorrência
+    (FIRESTORE_MAX_CONCORRENCIA); a espera não ocupa threads.
     
     Args:
-        dados (DadosSensor): Dados dos sensores no formato JSON
+        leitura (dict): Leitura já validada por `ler_leitura`
         
     Returns:
         dict: Confirmação do salvamento e IDs gerados
         
     Raises:
-        HTTPException 503: Se Firebase não estiver configurado
+        HTTPException 503: Se Firebase não estiver configurado ou a fila
+            do limitador de concorrência não andar a tempo
         HTTPException 500: Se houver erro ao salvar
         
     Example:
@@ -216,7 +587,15 @@ def receber_dados(dados: DadosSensor):
         Body: { "device_id": "ESP32_001", ... }
     """
     
+    device_id = leitura["device_id"]
+    doc_id = id_da_leitura(leitura)
+    
+    # Reenvio recente: responde sem tocar no Firestore
+    if leituras_recentes.contem(doc_id):
+        return resposta_duplicada(device_id, doc_id)
+    
     # Verifica se o Firebase está configurado
+    db = firebase.db_async
     if not db:
         raise HTTPException(
             status_code=503,
@@ -224,31 +603,60 @@ def receber_dados(dados: DadosSensor):
         )
     
     try:
-        # Prepara os dados para salvar no Firestore
-        dados_para_salvar = {
-            "device_id": dados.device_id,
-            "timestamp": dados.timestamp,  # Timestamp do ESP32
-            "timestamp_recebido": datetime.now().isoformat(),  # Timestamp do servidor
-            "sensors": dados.sensors.model_dump()  # Converte Pydantic para dict
-        }
+        # Prepara os dados para salvar no Firestore; o detector só incorpora
+        # a leitura depois da gravação (uma tentativa que falha não conta)
+        resultados_anomalias, avaliacao = detector.preparar([leitura])
+        anomalias = resultados_anomalias[0]
+        leitura["anomalias"] = marcar_leitura(anomalias)
+        with span("serializacao"):
+            dados_para_salvar = montar_documento(leitura)
         
-        # Salva no Firestore (coleção: sensor_readings)
-        doc_ref = db.collection('sensor_readings').add(dados_para_salvar)
+        # Salva no Firestore (sensor_readings ou partição do dispositivo);
+        # create() falha se o ID já existir
+        with span("armazenamento"):
+            async with limitador.vaga():
+                if layout is not None:
+                    await layout.criar_async(db, leitura, doc_id, dados_para_salvar)
+                else:
+                    await db.collection(COLECAO_LEITURAS).document(doc_id).create(dados_para_salvar)
+        firebase.registrar_sucesso()
+        detector.confirmar(avaliacao)
+        leituras_recentes.registrar(doc_id)
+        calculadora.atualizar(leitura)
+        diretorio.registrar([leitura["device_id"]])
+        if intervalos is not None:
+            intervalos.observar(leitura)
+        if anomalias["alertas_abertos"] or anomalias["alertas_encerrados"]:
+            background_tasks.add_task(registrar_alertas, firebase.db, [anomalias])
+        if motor_alertas.regras:
+            background_tasks.add_task(motor_alertas.avaliar_lote, [leitura])
         
         # Log no console
-        print(f"Dados salvos no Firebase!")
-        print(f"Document ID: {doc_ref[1].id}")
-        print(f"Device: {dados.device_id}")
+        with span("log"):
+            print(f"Dados salvos no Firebase!")
+            print(f"Document ID: {doc_id}")
+            print(f"Device: {device_id}")
         
         return {
             "mensagem": "Dados recebidos e salvos no Firebase!",
-            "device_id": dados.device_id,
-            "firestore_id": doc_ref[1].id,
+            "device_id": device_id,
+            "firestore_id": doc_id,
             "timestamp_recebido": dados_para_salvar["timestamp_recebido"],
+            "anomalias": dados_para_salvar.get("anomalias", []),
+            **intervalo_recomendado([device_id]),
             "status": "success"
         }
         
+    except LimiteExcedido:
+        raise
     except Exception as e:
+        from google.api_core.exceptions import AlreadyExists  # SDK já carregado pelo cliente
+        if isinstance(e, AlreadyExists):
+            # Leitura já salva anteriormente (ex.: após reinício da API)
+            firebase.registrar_sucesso()
+            leituras_recentes.registrar(doc_id)
+            return resposta_duplicada(device_id, doc_id)
+        firebase.registrar_falha(e)
         print(f"❌ Erro ao salvar no Firebase: {str(e)}")
         raise HTTPException(
             status_code=500,
@@ -256,8 +664,190 @@ def receber_dados(dados: DadosSensor):
         )
 
 
+def resposta_duplicada(device_id: str, doc_id: str) -> dict:
+    """Resposta de sucesso para uma leitura que já estava salva"""
+    print(f"Leitura duplicada ignorada: {doc_id} (device: {device_id})")
+    return {
+        "mensagem": "Leitura já recebida anteriormente, nada foi salvo.",
+        "device_id": device_id,
+        "firestore_id": doc_id,
+        **intervalo_recomendado([device_id]),
+        "status": "duplicate"
+    }
+
+
+def intervalo_recomendado(device_ids: List[str]) -> dict:
+    """
+    Campo `intervalo_recomendado_ms` da resposta de ingestão
+
+    Só é incluído com a amostragem adaptativa ativa e quando o envio é de um
+    único dispositivo (o firmware envia apenas as próprias leituras).
+    """
+    if intervalos is None or len(set(device_ids)) != 1:
+        return {}
+    return {"intervalo_recomendado_ms": intervalos.recomendar(device_ids[0])}
+
+
+CORPO_LOTE_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {
+                "schema": {"type": "array", "items": {"$ref": "#/components/schemas/DadosSensor"}}
+            },
+            "application/msgpack": {"schema": {"type": "string", "format": "binary"}},
+            "application/cbor": {"schema": {"type": "string", "format": "binary"}},
+        },
+    }
+}
+
+
+@app.post("/sensor-data/batch", tags=["Sensores"], openapi_extra=CORPO_LOTE_OPENAPI)
+@perfilador.endpoint
+async def receber_lote(background_tasks: BackgroundTasks, _admitida: None = Depends(admitir),
+                       lote: dict = Depends(ler_lote)):
+    """
+    Recebe um lote de leituras acumuladas pelo ESP32
+    
+    O firmware guarda as leituras em um buffer circular enquanto o Wi-Fi
+    está fora e as envia em lotes, mantendo o timestamp original de cada
+    coleta. Reenvios do mesmo lote não duplicam nem sobrescrevem documentos
+    (IDs determinísticos gravados com create()), e leituras já vistas
+    recentemente nem chegam ao Firestore.
+    Cada leitura passa pelo detector de anomalias, na ordem do lote. Com um
+    único dispositivo no lote, a resposta traz `intervalo_recomendado_ms`.
+    
+    Args:
+        lote (dict): Itens válidos e rejeitados, lidos por `ler_lote`
+        
+    Returns:
+        dict: Contagem de leituras salvas, duplicadas e rejeitadas
+        
+    Raises:
+        HTTPException 503: Se Firebase não estiver configurado
+        HTTPException 500: Se houver erro ao salvar
+        
+    Example:
+        POST http://localhost:8000/sensor-data/batch
+        Body: [{ "device_id": "ESP32_001", ... }, { ... }]
+    """
+
+    ids_novos, duplicadas = await ingerir_lote([leitura for _, leitura in lote["validas"]], background_tasks)
+    
+    with span("log"):
+        print(f"Lote recebido: {len(ids_novos)} salvas, {len(duplicadas)} duplicadas, "
+              f"{len(lote['rejeitadas'])} rejeitadas")
+    
+    return {
+        "mensagem": "Lote processado",
+        "recebidas": len(lote["validas"]) + len(lote["rejeitadas"]),
+        "salvas": len(ids_novos),
+        "duplicadas": len(duplicadas),
+        "rejeitadas": lote["rejeitadas"],
+        "firestore_ids": ids_novos,
+        **intervalo_recomendado([leitura["device_id"] for _, leitura in lote["validas"]]),
+        "status": "success"
+    }
+
+
+async def ingerir_lote(leituras: List[dict], tarefas: BackgroundTasks) -> Tuple[List[str], List[str]]:
+    """
+    Caminho comum de gravação de leituras validadas (HTTP em lote e MQTT)
+
+    Separa reenvios recentes, avalia anomalias na ordem das leituras, grava
+    com batches do Firestore (create(): as já salvas contam como duplicadas)
+    e agenda em `tarefas` o registro de alertas e as regras de alerta.
+
+    Returns:
+        tuple: (IDs gravados, IDs duplicados)
+
+    Raises:
+        HTTPException 503: Se Firebase não estiver configurado
+        HTTPException 500: Se houver erro ao salvar
+    """
+    # Separa reenvios recentes (respondidos sem tocar no Firestore)
+    novas, ids_novos, duplicadas, vistos = [], [], [], set()
+    for leitura in leituras:
+        doc_id = id_da_leitura(leitura)
+        if doc_id in vistos or leituras_recentes.contem(doc_id):
+            duplicadas.append(doc_id)
+        else:
+            vistos.add(doc_id)
+            novas.append(leitura)
+    
+    if novas:
+        db = firebase.db_async
+        if not db:
+            raise HTTPException(
+                status_code=503,
+                detail="Firebase não configurado. Configure as credenciais primeiro. Veja docs/GUIA_RAPIDO.md"
+            )
+        # Anomalias avaliadas na ordem das leituras (timestamps originais), sobre
+        # uma cópia do estado do detector, confirmada só depois da gravação
+        resultados, avaliacao = detector.preparar(novas)
+        resultados_anomalias = []
+        for leitura, resultado in zip(novas, resultados):
+            leitura["anomalias"] = marcar_leitura(resultado)
+            if resultado["alertas_abertos"] or resultado["alertas_encerrados"]:
+                resultados_anomalias.append(resultado)
+        try:
+            with span("armazenamento"):
+                async with limitador.vaga():
+                    # create(): leituras já salvas (ex.: após reinício da API) voltam como existentes
+                    if layout is not None:
+                        ids_novos, existentes = await layout.gravar_lote_async(db, novas)
+                    else:
+                        ids_novos, existentes = await gravar_lote_async(db, novas)
+            firebase.registrar_sucesso()
+            # As já existentes também entram: após um reinício, o detector não as viu
+            detector.confirmar(avaliacao)
+            duplicadas.extend(existentes)
+            if existentes:
+                ja_salvas = set(existentes)
+                novas = [leitura for leitura in novas if id_da_leitura(leitura) not in ja_salvas]
+            if resultados_anomalias:
+                tarefas.add_task(registrar_alertas, firebase.db, resultados_anomalias)
+            if motor_alertas.regras:
+                tarefas.add_task(motor_alertas.avaliar_lote, novas)
+        except LimiteExcedido:
+            raise
+        except Exception as e:
+            firebase.registrar_falha(e)
+            print(f"❌ Erro ao salvar lote no Firebase: {str(e)}")
+            raise HTTPException(
+                status_code=500,
+                detail=f"Erro ao salvar lote: {str(e)}"
+            )
+        for doc_id in ids_novos + existentes:
+            leituras_recentes.registrar(doc_id)
+        for leitura in novas:
+            calculadora.atualizar(leitura)
+            if intervalos is not None:
+                intervalos.observar(leitura)
+        diretorio.registrar(leitura["device_id"] for leitura in novas)
+    
+    return ids_novos, duplicadas
+
+
+async def ingerir_mqtt(leituras: List[dict]):
+    """Grava um lote montado pelo gateway MQTT (pelo mesmo caminho do lote HTTP)"""
+    tarefas = BackgroundTasks()
+    ids_novos, duplicadas = await ingerir_lote(leituras, tarefas)
+    await tarefas()
+    print(f"📡 Lote MQTT: {len(ids_novos)} salvas, {len(duplicadas)} duplicadas")
+
+
+gateway = GatewayMQTT(
+    ingerir_mqtt,
+    max_lote=int(os.getenv("MQTT_LOTE_MAXIMO", "100")),
+    intervalo=float(os.getenv("MQTT_INTERVALO_LOTE", "0.5")),
+)
+
+
 @app.get("/sensor-data", tags=["Sensores"])
-def ver_dados(limit: int = 10, device_id: str = None):
+@perfilador.endpoint
+async def ver_dados(limit: int = 10, device_id: str = None, resolucao: str = "raw", resumo: bool = False,
+                    desde: Optional[datetime] = None, ate: Optional[datetime] = None):
     """
     Consulta dados armazenados no Firebase
     
@@ -267,7 +857,20 @@ def ver_dados(limit: int = 10, device_id: str = None):
     Args:
         limit (int): Número máximo de registros a retornar (padrão: 10)
         device_id (str, optional): Filtrar por ID do dispositivo
-        
+        resolucao (str): Nível de retenção consultado: "raw" (padrão) ou
+            um nível agregado configurado, ex.: "5min", "1h"
+        resumo (bool): Inclui "resumo" com min/max/mean/std/count de cada
+            campo numérico das leituras retornadas (padrão: False)
+        desde (datetime, optional): Apenas leituras recebidas a partir deste instante
+        ate (datetime, optional): Apenas leituras recebidas antes deste instante
+            (sem fuso, ambos são interpretados no horário local do servidor).
+            Com desde/ate, leituras brutas já movidas para o arquivo frio
+            (Parquet) completam o resultado, marcadas com "arquivado": true
+
+    Consultas idênticas feitas ao mesmo tempo (ex.: vários dashboards
+    atualizando juntos) compartilham uma única leitura do Firestore, e o
+    resultado é reaproveitado por CONSULTA_COALESCER_TTL segundos (padrão 1).
+
     Returns:
         dict: Lista de leituras e total de registros
         
@@ -278,52 +881,463 @@ def ver_dados(limit: int = 10, device_id: str = None):
     Example:
         GET http://localhost:8000/sensor-data?limit=5
         GET http://localhost:8000/sensor-data?device_id=ESP32_001
+        GET http://localhost:8000/sensor-data?resolucao=1h&limit=168
+        GET http://localhost:8000/sensor-data?limit=500&resumo=true
+        GET http://localhost:8000/sensor-data?device_id=ESP32_001&desde=2025-06-01T00:00:00
     """
     
+    with span("armazenamento"):
+        consulta = await obter_consulta(limit, device_id, resolucao, desde, ate)
+
+    resultados = consulta["resultados"]
+    resposta = {
+        "total": len(resultados),
+        "limit": limit,
+        "device_id_filter": device_id if device_id else "todos",
+        "resolucao": resolucao,
+        "plano": consulta["plano"].descricao(),
+        "dados": resultados,
+        "status": "success"
+    }
+    if consulta["arquivo_frio"] is not None:
+        resposta["arquivo_frio"] = consulta["arquivo_frio"]
+    if resumo:
+        # Calculado uma vez por resultado compartilhado
+        if "resumo" not in consulta:
+            with span("serializacao"):
+                consulta["resumo"] = resumir_leituras(resultados)
+        resposta["resumo"] = consulta["resumo"]
+    return resposta
+
+
+async def obter_consulta(limit: int, device_id: Optional[str], resolucao: str,
+                         desde: Optional[datetime], ate: Optional[datetime]) -> dict:
+    """
+    Valida os filtros e obtém o resultado (compartilhado) de buscar_leituras
+
+    Raises:
+        HTTPException 400: Resolução inválida
+        HTTPException 503: Se Firebase não estiver configurado
+        HTTPException 500: Se houver erro na consulta
+    """
+    if resolucao not in COLECOES_POR_RESOLUCAO:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Resolução inválida: {resolucao}. Opções: {', '.join(COLECOES_POR_RESOLUCAO)}"
+        )
+    
     # Verifica se o Firebase está configurado
+    db = firebase.db_async
     if not db:
         raise HTTPException(
             status_code=503,
             detail="Firebase não configurado"
         )
     
+    desde = para_datetime(desde) if desde else None
+    ate = para_datetime(ate) if ate else None
+
     try:
-        # Inicia query na coleção
-        query = db.collection('sensor_readings')
-        
-        # Aplica filtro por device_id se fornecido
-        if device_id:
-            query = query.where('device_id', '==', device_id)
-        
-        # Ordena por timestamp (mais recente primeiro) e limita resultados
-        docs = query.order_by('timestamp_recebido', direction='DESCENDING').limit(limit).stream()
-        
-        # Converte documentos Firestore para lista de dicionários
-        resultados = []
-        for doc in docs:
-            dados = doc.to_dict()
-            dados['id'] = doc.id  # Adiciona o ID do documento Firestore
-            resultados.append(dados)
-        
-        # Log no console
-        print(f"📊 Consultando Firebase: {len(resultados)} resultados")
-        
-        return {
-            "total": len(resultados),
-            "limit": limit,
-            "device_id_filter": device_id if device_id else "todos",
-            "dados": resultados,
-            "status": "success"
-        }
-        
+        # Requisições idênticas simultâneas (ou em menos de CONSULTA_COALESCER_TTL)
+        # compartilham a mesma consulta ao Firestore
+        return await coalescedor.obter(
+            (resolucao, limit, device_id, desde, ate),
+            lambda: buscar_leituras(db, resolucao, limit, device_id, desde, ate),
+        )
+    except LimiteExcedido:
+        raise
     except Exception as e:
-        print(f"❌ Erro ao consultar Firebase: {str(e)}")
         raise HTTPException(
             status_code=500,
             detail=f"Erro ao consultar dados: {str(e)}"
         )
 
 
+@app.get("/sensor-data/derivadas", tags=["Sensores"])
+async def ver_derivadas(limit: int = 100, device_id: str = None, resolucao: str = "raw",
+                        desde: Optional[datetime] = None, ate: Optional[datetime] = None):
+    """
+    Métricas derivadas das leituras, prontas para plotar
+    
+    Para cada dispositivo: volume e nível do reservatório (geometria em
+    RESERVATORIOS), taxa de variação da umidade do solo (%/h) e
+    amortecimento térmico do telhado (ar - telhado, °C). Ver
+    metricas_derivadas.py.
+    
+    As últimas leituras brutas de um dispositivo vêm da janela calculada na
+    ingestão (sem consultar o Firestore); as demais consultas calculam as
+    métricas de uma vez sobre as leituras de GET /sensor-data, com os
+    mesmos filtros e o mesmo resultado compartilhado.
+    
+    Returns:
+        dict: {"series": {device_id: {"timestamp": [...], "volume_litros": [...], ...}}}
+            em ordem cronológica, com null onde a métrica não se aplica
+    
+    Example:
+        GET http://localhost:8000/sensor-data/derivadas?device_id=ESP32_001&limit=200
+        GET http://localhost:8000/sensor-data/derivadas?resolucao=1h&limit=168
+    """
+    if device_id and resolucao == "raw" and desde is None and ate is None:
+        serie = calculadora.serie(device_id, limit)
+        if serie is not None:
+            return {"origem": "ingestao", "resolucao": resolucao, "series": {device_id: serie}, "status": "success"}
+
+    consulta = await obter_consulta(limit, device_id, resolucao, desde, ate)
+    return {"origem": "janela", "resolucao": resolucao, "series": derivadas_da_consulta(consulta), "status": "success"}
+
+
+def derivadas_da_consulta(consulta: dict) -> dict:
+    """Métricas derivadas da janela, calculadas uma vez por resultado compartilhado"""
+    if "derivadas" not in consulta:
+        consulta["derivadas"] = calcular_janela(consulta["resultados"], calculadora.reservatorios)
+    return consulta["derivadas"]
+
+
+@app.get("/sensor-data/grade", tags=["Sensores"])
+async def ver_grade(limit: int = 100, device_id: str = None, resolucao: str = "raw",
+                    desde: Optional[datetime] = None, ate: Optional[datetime] = None,
+                    passo: float = GRADE_PASSO, interpolar: float = GRADE_INTERPOLAR):
+    """
+    Leituras de cada dispositivo alinhadas em uma grade regular
+    
+    Cada célula de `passo` segundos recebe a média das leituras dela; células
+    sem leitura ficam null (quebram a linha do gráfico) e as sequências
+    delas são listadas como lacunas, com a duração. Lacunas internas de até
+    `interpolar` segundos são preenchidas por interpolação linear. A
+    completude é a porcentagem de células com leitura. Ver reamostragem.py.
+    
+    Usa o mesmo resultado compartilhado de GET /sensor-data; com desde/ate,
+    a grade cobre todo o período (lacunas nas bordas também contam).
+    
+    Args:
+        passo (float): Tamanho da célula, em segundos (padrão: GRADE_PASSO)
+        interpolar (float): Maior lacuna interpolada, em segundos (padrão: GRADE_INTERPOLAR)
+    
+    Returns:
+        dict: {"series": {device_id: {"timestamp": [...], "sensor_campo": [...],
+            "lacunas": [{"inicio", "fim", "duracao_segundos"}], "completude"}}}
+    
+    Raises:
+        HTTPException 400: passo/interpolar inválidos ou grade maior que GRADE_MAX_CELULAS
+    
+    Example:
+        GET http://localhost:8000/sensor-data/grade?device_id=ESP32_001&limit=500&passo=60&interpolar=120
+    """
+    if passo <= 0 or interpolar < 0:
+        raise HTTPException(status_code=400, detail="passo deve ser maior que zero e interpolar não pode ser negativo")
+
+    consulta = await obter_consulta(limit, device_id, resolucao, desde, ate)
+    chave = (passo, interpolar)
+    grades = consulta.setdefault("grades", {})
+    if chave not in grades:
+        try:
+            grades[chave] = reamostrar_documentos(
+                consulta["resultados"], passo, max_interpolar=interpolar,
+                inicio=para_datetime(desde).timestamp() if desde else None,
+                fim=para_datetime(ate).timestamp() if ate else None,
+                max_celulas=GRADE_MAX_CELULAS,
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return {"resolucao": resolucao, "passo": passo, "series": grades[chave], "status": "success"}
+
+
+async def buscar_leituras(db, resolucao: str, limit: int, device_id: Optional[str],
+                          desde: Optional[datetime], ate: Optional[datetime]) -> dict:
+    """
+    Executa a consulta de GET /sensor-data (Firestore e, se preciso, arquivo frio)
+
+    Chamada pelo coalescedor no máximo uma vez por consulta distinta em
+    andamento; o resultado é compartilhado e não deve ser alterado.
+
+    Returns:
+        dict: {"resultados", "plano", "arquivo_frio"}
+    """
+    try:
+        # O planejador escolhe o índice (simples, composto ou varredura filtrada)
+        # e retorna os documentos do mais recente para o mais antigo;
+        # no layout particionado, as leituras brutas vêm das partições
+
+        # Consultas por período anterior ao que está no Firestore vão ao arquivo frio
+        arquivado_ate = arquivo.arquivado_ate() if resolucao == "raw" and (desde or ate) else None
+        if arquivado_ate and ate and ate <= arquivado_ate:
+            resultados, plano = [], Plano("arquivo_frio", None, 0)
+        else:
+            async with limitador.vaga():
+                if resolucao == "raw" and layout is not None:
+                    resultados, plano = await layout.consultar_async(
+                        db, limit, device_id=device_id, desde=desde, ate=ate
+                    )
+                else:
+                    resultados, plano = await planejador.executar_async(
+                        db,
+                        COLECOES_POR_RESOLUCAO[resolucao],
+                        limit,
+                        device_id=device_id,
+                        desde=desde,
+                        ate=ate,
+                    )
+        firebase.registrar_sucesso()
+    except LimiteExcedido:
+        raise
+    except Exception as e:
+        firebase.registrar_falha(e)
+        print(f"❌ Erro ao consultar Firebase: {str(e)}")
+        raise
+
+    info_arquivo = None
+    if arquivado_ate and (desde is None or desde < arquivado_ate) and len(resultados) < limit:
+        try:
+            # Leitura do Parquet em disco: fora do event loop
+            antigos, info_arquivo = await asyncio.to_thread(
+                arquivo.consultar,
+                limit - len(resultados), device_id=device_id, desde=desde,
+                ate=min(ate, arquivado_ate) if ate else arquivado_ate,
+            )
+            resultados.extend(antigos)  # Todas mais antigas que as do Firestore
+        except ArquivoIndisponivel as e:
+            print(f"⚠️ Arquivo frio não consultado: {str(e)}")
+
+    # Log no console
+    print(f"📊 Consultando Firebase: {len(resultados)} resultados (plano: {plano.nome})")
+    return {"resultados": resultados, "plano": plano, "arquivo_frio": info_arquivo}
+
+
+@app.get("/sensor-data/historico", tags=["Sensores"])
+@perfilador.endpoint
+async def ver_historico(desde: datetime, ate: Optional[datetime] = None, device_id: str = None,
+                        pontos: int = 800):
+    """
+    Histórico de um intervalo na resolução que cabe no gráfico
+    
+    Escolhe o nível de retenção mais grosso com resolução menor ou igual a
+    (ate - desde) / pontos, lê apenas o intervalo pedido e devolve no máximo
+    `pontos` faixas com mínimo, máximo e média de cada campo. Usado pelo
+    zoom do dashboard: cada zoom ou deslocamento busca só o trecho visível.
+    Ver piramide.py.
+    
+    Args:
+        desde (datetime): Início do intervalo
+        ate (datetime, optional): Fim do intervalo (padrão: agora). Sem fuso,
+            ambos são interpretados no horário local do servidor
+        device_id (str, optional): Filtrar por ID do dispositivo
+        pontos (int): Faixas no máximo, ~ largura do gráfico em pixels (padrão: 800)
+    
+    Returns:
+        dict: "serie" ({"timestamp": [...], "sensor_campo": {"min", "max",
+            "media"}}), "niveis" lidos por trecho e "completo" (false se
+            algum trecho atingiu HISTORICO_MAX_DOCUMENTOS)
+    
+    Raises:
+        HTTPException 400: Intervalo ou pontos inválidos
+        HTTPException 503: Se Firebase não estiver configurado
+        HTTPException 500: Se houver erro na consulta
+    
+    Example:
+        GET http://localhost:8000/sensor-data/historico?desde=2025-01-01T00:00:00&pontos=800
+        GET http://localhost:8000/sensor-data/historico?device_id=ESP32_001&desde=2025-06-01T08:00:00&ate=2025-06-01T12:00:00
+    """
+    if not 1 <= pontos <= HISTORICO_MAX_PONTOS:
+        raise HTTPException(status_code=400, detail=f"pontos deve estar entre 1 e {HISTORICO_MAX_PONTOS}")
+    desde = para_datetime(desde)
+    ate = para_datetime(ate) if ate else agora_utc()
+    if ate <= desde:
+        raise HTTPException(status_code=400, detail="ate deve ser posterior a desde")
+
+    db = firebase.db_async
+    if not db:
+        raise HTTPException(status_code=503, detail="Firebase não configurado")
+
+    try:
+        with span("armazenamento"):
+            return await coalescedor.obter(
+                ("historico", device_id, desde, ate, pontos),
+                lambda: buscar_historico(db, device_id, desde, ate, pontos),
+            )
+    except LimiteExcedido:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Erro ao consultar histórico: {str(e)}"
+        )
+
+
+async def buscar_historico(db, device_id: Optional[str], desde: datetime, ate: datetime, pontos: int) -> dict:
+    """Lê cada trecho do intervalo no nível planejado e reduz a `pontos` faixas"""
+    resolucoes = {colecao: nome for nome, colecao in COLECOES_POR_RESOLUCAO.items()}
+    escolhido = piramide.escolher_nivel(desde, ate, pontos, agora_utc())
+    documentos, niveis, completo = [], [], True
+    try:
+        async with limitador.vaga():
+            marcas = await piramide.marcas(db) if escolhido > 0 else {}
+        for indice, inicio, fim in piramide.trechos(escolhido, marcas, desde, ate):
+            colecao = piramide.niveis[indice].colecao
+            async with limitador.vaga():
+                if indice == 0 and layout is not None:
+                    lidos, _ = await layout.consultar_async(
+                        db, piramide.max_documentos, device_id=device_id, desde=inicio, ate=fim
+                    )
+                else:
+                    lidos, _ = await planejador.executar_async(
+                        db, colecao, piramide.max_documentos, device_id=device_id, desde=inicio, ate=fim
+                    )
+            completo = completo and len(lidos) < piramide.max_documentos
+            documentos.extend(lidos)
+            niveis.append({
+                "resolucao": resolucoes[colecao],
+                "desde": inicio.isoformat(),
+                "ate": fim.isoformat(),
+                "documentos": len(lidos),
+            })
+        firebase.registrar_sucesso()
+    except LimiteExcedido:
+        raise
+    except Exception as e:
+        firebase.registrar_falha(e)
+        print(f"❌ Erro ao consultar histórico no Firebase: {str(e)}")
+        raise
+
+    with span("serializacao"):
+        serie = reduzir_min_max(documentos, desde, ate, pontos)
+    print(f"🔭 Histórico: {len(documentos)} documentos em {len(niveis)} trecho(s) -> {len(serie['timestamp'])} faixas")
+    return {
+        "device_id_filter": device_id if device_id else "todos",
+        "desde": desde.isoformat(),
+        "ate": ate.isoformat(),
+        "pontos": pontos,
+        "niveis": niveis,
+        "completo": completo,
+        "serie": serie,
+        "status": "success",
+    }
+
+
+# ========================================
+# SNAPSHOT DO DASHBOARD
+# ========================================
+
+@app.get("/dashboard/snapshot", tags=["Dashboard"])
+@perfilador.endpoint
+async def ver_snapshot(request: Request, device_id: str = None, window: int = 100,
+                       pontos: int = SNAPSHOT_PONTOS):
+    """
+    Tudo o que o dashboard exibe, em uma única resposta
+    
+    Dispositivos conhecidos, última leitura, resumo (min/max/mean/std/count)
+    de cada campo, série do gráfico em grade regular com no máximo `pontos`
+    pontos, lacunas e completude de cada dispositivo e métricas derivadas das últimas `window` leituras. Usa o mesmo resultado
+    compartilhado de GET /sensor-data (ver snapshot_dashboard.py).
+    
+    A resposta traz ETag; com If-None-Match igual ao ETag atual, a API
+    responde 304 sem corpo (nenhuma leitura nova desde o último snapshot).
+    
+    Args:
+        device_id (str, optional): Filtrar por ID do dispositivo
+        window (int): Leituras mais recentes consideradas (padrão: 100)
+        pontos (int): Máximo de pontos da série do gráfico (padrão: SNAPSHOT_PONTOS)
+    
+    Raises:
+        HTTPException 400: window ou pontos fora dos limites
+        HTTPException 503: Se Firebase não estiver configurado
+        HTTPException 500: Se houver erro na consulta
+    
+    Example:
+        GET http://localhost:8000/dashboard/snapshot?window=500
+        GET http://localhost:8000/dashboard/snapshot?device_id=ESP32_001&window=100
+    """
+    if not 1 <= window <= SNAPSHOT_MAX_JANELA:
+        raise HTTPException(status_code=400, detail=f"window deve estar entre 1 e {SNAPSHOT_MAX_JANELA}")
+    if pontos < 1:
+        raise HTTPException(status_code=400, detail="pontos deve ser maior que zero")
+
+    with span("armazenamento"):
+        consulta = await obter_consulta(window, device_id, "raw", None, None)
+        if "snapshots" not in consulta:
+            consulta["snapshots"] = {}
+            diretorio.registrar(documento.get("device_id") for documento in consulta["resultados"])
+        dispositivos = await listar_dispositivos(firebase.db_async)
+
+    # Corpo e ETag calculados uma vez por resultado compartilhado
+    chave = (pontos, tuple(dispositivos))
+    if chave not in consulta["snapshots"]:
+        with span("serializacao"):
+            snapshot = montar_snapshot(
+                consulta["resultados"], dispositivos, pontos, derivadas_da_consulta(consulta),
+                passo=GRADE_PASSO, max_interpolar=GRADE_INTERPOLAR,
+            )
+            consulta["snapshots"][chave] = serializar(snapshot)
+    corpo, etag = consulta["snapshots"][chave]
+
+    cabecalhos = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_confere(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=cabecalhos)
+    return Response(content=corpo, media_type="application/json", headers=cabecalhos)
+
+
+async def listar_dispositivos(db) -> List[str]:
+    """device_ids conhecidos; a varredura completa é refeita a cada DISPOSITIVOS_TTL segundos"""
+    if diretorio.expirado:
+        try:
+            varridos = await coalescedor.obter(("dispositivos",), lambda: varrer_dispositivos(db))
+            diretorio.atualizar(varridos)
+        except LimiteExcedido:
+            raise
+        except Exception as e:
+            print(f"⚠️ Lista de dispositivos não atualizada: {str(e)}")
+    return diretorio.lista()
+
+
+async def varrer_dispositivos(db) -> List[str]:
+    """Marcadores devices/{id} (layout particionado) ou device_ids das leituras mais recentes"""
+    async with limitador.vaga():
+        if layout is not None:
+            return [doc.id async for doc in db.collection(COLECAO_DISPOSITIVOS).stream()]
+        resultados, _ = await planejador.executar_async(db, COLECOES_POR_RESOLUCAO["raw"], DISPOSITIVOS_VARREDURA)
+    return [documento.get("device_id") for documento in resultados]
+
+
+# ========================================
+# PERFIL DE DESEMPENHO
+# ========================================
+
+@app.get("/debug/profile", tags=["Status"], include_in_schema=perfilador.ativo)
+async def ver_perfil(segundos: Optional[float] = None, formato: str = "folded"):
+    """
+    Perfil de desempenho da API (somente com PERFIL_ATIVO=1)
+    
+    Sem `segundos`: tempo médio/p50/p95 de cada etapa (validacao,
+    serializacao, armazenamento, log, resposta, outros) por rota, a partir
+    das requisições amostradas, e os últimos traces.
+    
+    Com `segundos`: perfila o event loop durante esse tempo, com o tráfego
+    normal, e devolve texto puro:
+    - formato=folded: pilhas no formato de flame graph ("f1;f2 contagem")
+    - formato=cprofile: tabela do cProfile por tempo acumulado
+    
+    Raises:
+        HTTPException 404: Perfil desativado
+        HTTPException 400: Formato ou duração inválidos
+        HTTPException 409: Outra captura em andamento
+        
+    Example:
+        GET http://localhost:8000/debug/profile
+        GET http://localhost:8000/debug/profile?segundos=10 > perfil.folded
+    """
+    if not perfilador.ativo:
+        raise HTTPException(status_code=404, detail="Perfil desativado (PERFIL_ATIVO=0)")
+    if segundos is None:
+        return perfilador.resumo()
+    if not 0 < segundos <= PERFIL_MAX_SEGUNDOS:
+        raise HTTPException(status_code=400, detail=f"segundos deve estar entre 0 e {PERFIL_MAX_SEGUNDOS:g}")
+    try:
+        return PlainTextResponse(await perfilador.capturar(segundos, formato))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except CapturaEmAndamento as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
 # ========================================
 # EXECUÇÃO DIRETA
 # ========================================
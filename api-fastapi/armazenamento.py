@@ -0,0 +1,160 @@
+"""
+Gravação de leituras no Firestore
+Sistema de Monitoramento do Telhado Verde - UFSM
+
+Funções compartilhadas pelos caminhos de ingestão (leitura única e lotes)
+para montar o documento salvo em `sensor_readings` e gravar várias
+leituras com batches do Firestore (até 500 operações por commit).
+
+`timestamp_recebido` é gravado como timestamp nativo do Firestore (UTC);
+documentos antigos, com o valor em texto ISO, são convertidos por
+scripts/migrar_timestamps.py.
+
+Autor: Equipe Projeto Integrador 4 - UFSM
+Data: 2025
+"""
+
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple, Union
+
+from deduplicacao import gerar_id_leitura
+
+COLECAO_LEITURAS = "sensor_readings"
+
+# Limite de operações por batch do Firestore
+TAMANHO_MAXIMO_BATCH = 500
+
+
+def agora_utc() -> datetime:
+    """Horário atual do servidor, com fuso UTC (gravado como timestamp nativo)"""
+    return datetime.now(timezone.utc)
+
+
+def para_datetime(valor: Union[datetime, str]) -> datetime:
+    """
+    Normaliza um `timestamp_recebido` para datetime com fuso UTC
+
+    Aceita o timestamp nativo lido do Firestore e o formato antigo (texto
+    ISO sem fuso, gerado com o horário local do servidor).
+    """
+    if isinstance(valor, str):
+        valor = datetime.fromisoformat(valor)
+    return valor.astimezone(timezone.utc)
+
+
+def montar_documento(leitura: dict, timestamp_recebido: Optional[datetime] = None) -> dict:
+    """
+    Monta o documento salvo no Firestore a partir de uma leitura validada
+
+    Args:
+        leitura (dict): {"device_id", "timestamp", "seq", "sensors"} e,
+            opcionalmente, "anomalias" (rótulos do detector de anomalias)
+        timestamp_recebido (datetime, optional): Timestamp do servidor (padrão: agora)
+
+    Returns:
+        dict: Documento no formato de `sensor_readings`
+    """
+    documento = {
+        "device_id": leitura["device_id"],
+        "timestamp": leitura["timestamp"],  # Timestamp do ESP32
+        "timestamp_recebido": timestamp_recebido or agora_utc(),  # Timestamp do servidor (nativo)
+        "sensors": leitura["sensors"]
+    }
+    if leitura.get("seq") is not None:
+        documento["seq"] = leitura["seq"]
+    if leitura.get("anomalias"):
+        documento["anomalias"] = leitura["anomalias"]
+    return documento
+
+
+def id_da_leitura(leitura: dict) -> str:
+    """ID determinístico do documento de uma leitura (ver deduplicacao.py)"""
+    return gerar_id_leitura(leitura["device_id"], leitura["timestamp"], leitura.get("seq"))
+
+
+def gravar_lote(db, leituras: List[dict], colecao: str = COLECAO_LEITURAS) -> Tuple[List[str], List[str]]:
+    """
+    Grava várias leituras usando batches do Firestore
+
+    Usa create() com o ID determinístico, como POST /sensor-data: uma
+    leitura já salva nunca é sobrescrita. O batch é atômico; se alguma
+    leitura dele já existir (ex.: reenvio após reinício da API, com o cache
+    de deduplicação vazio), as leituras desse batch são criadas uma a uma e
+    as existentes contam como duplicadas. Todas as leituras do lote recebem
+    o mesmo timestamp_recebido.
+
+    Args:
+        db: Cliente Firestore
+        leituras (list): Leituras validadas
+        colecao (str): Coleção de destino
+
+    Returns:
+        tuple: (IDs gravados, IDs que já existiam), na ordem de `leituras`
+    """
+    from google.api_core.exceptions import AlreadyExists  # SDK já carregado pelo cliente
+
+    referencia = db.collection(colecao)
+    gravados, duplicados = [], []
+    for parte in _partes_do_lote(leituras):
+        try:
+            _batch_de_criacao(db, referencia, parte).commit()
+            gravados.extend(doc_id for doc_id, _ in parte)
+        except AlreadyExists:
+            for doc_id, documento in parte:
+                try:
+                    referencia.document(doc_id).create(documento)
+                    gravados.append(doc_id)
+                except AlreadyExists:
+                    duplicados.append(doc_id)
+    return gravados, duplicados
+
+
+async def gravar_lote_async(db, leituras: List[dict], colecao: str = COLECAO_LEITURAS) -> Tuple[List[str], List[str]]:
+    """Mesmo que `gravar_lote`, com o cliente assíncrono (AsyncClient)"""
+    from google.api_core.exceptions import AlreadyExists  # SDK já carregado pelo cliente
+
+    referencia = db.collection(colecao)
+    gravados, duplicados = [], []
+    for parte in _partes_do_lote(leituras):
+        try:
+            await _batch_de_criacao(db, referencia, parte).commit()
+            gravados.extend(doc_id for doc_id, _ in parte)
+        except AlreadyExists:
+            for doc_id, documento in parte:
+                try:
+                    await referencia.document(doc_id).create(documento)
+                    gravados.append(doc_id)
+                except AlreadyExists:
+                    duplicados.append(doc_id)
+    return gravados, duplicados
+
+
+def gravar_documentos(db, documentos: List[Tuple[str, dict]], colecao: str = COLECAO_LEITURAS):
+    """
+    Grava documentos já montados [(doc_id, documento)] com batches
+
+    Usado pela importação de históricos, em que cada documento tem o seu
+    próprio timestamp_recebido. Usa set(): regravar não duplica.
+    """
+    referencia = db.collection(colecao)
+    for inicio in range(0, len(documentos), TAMANHO_MAXIMO_BATCH):
+        batch = db.batch()
+        for doc_id, documento in documentos[inicio:inicio + TAMANHO_MAXIMO_BATCH]:
+            batch.set(referencia.document(doc_id), documento)
+        batch.commit()
+
+
+def _partes_do_lote(leituras: List[dict]) -> List[List[Tuple[str, dict]]]:
+    """Documentos [(doc_id, documento)] do lote, em partes do tamanho de um batch"""
+    recebido_em = agora_utc()
+    documentos = [(id_da_leitura(leitura), montar_documento(leitura, recebido_em)) for leitura in leituras]
+    return [documentos[inicio:inicio + TAMANHO_MAXIMO_BATCH]
+            for inicio in range(0, len(documentos), TAMANHO_MAXIMO_BATCH)]
+
+
+def _batch_de_criacao(db, referencia, parte: List[Tuple[str, dict]]):
+    """Batch (ainda não enviado) com um create() por documento"""
+    batch = db.batch()
+    for doc_id, documento in parte:
+        batch.create(referencia.document(doc_id), documento)
+    return batch
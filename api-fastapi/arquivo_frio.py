@@ -0,0 +1,435 @@
+"""
+Arquivo frio: leituras antigas em Parquet (zstd) no disco local
+Sistema de Monitoramento do Telhado Verde - UFSM
+
+Manter anos de leituras brutas no Firestore é caro e lento para consultas
+de pesquisa. O `ArquivadorFrio` move cada mês já fechado das leituras
+brutas para arquivos Parquet comprimidos com zstd, particionados por mês:
+
+    <diretorio>/manifesto.json                       (meses e limite do arquivo)
+    <diretorio>/mes=2025-01/manifesto.json           (partes, linhas, período)
+    <diretorio>/mes=2025-01/parte-0001.parquet
+
+Cada arquivo é ordenado por (device_id, timestamp_recebido) e gravado em
+grupos de linhas com estatísticas, então a leitura filtrada por
+dispositivo/período descarta grupos inteiros sem descomprimi-los
+(predicate pushdown), e o arquivo é lido por memory map.
+
+Um mês só é apagado do Firestore depois de gravado e registrado no
+manifesto, e apenas até onde o nível agregado seguinte já foi calculado
+(mesma regra da retenção). GET /sensor-data consulta o arquivo quando o
+período pedido é anterior ao que está no Firestore.
+
+Requer pyarrow (import tardio: a API funciona sem ele se o arquivo estiver
+desativado).
+
+Autor: Equipe Projeto Integrador 4 - UFSM
+Data: 2025
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, List, Optional, Tuple
+
+from armazenamento import TAMANHO_MAXIMO_BATCH, agora_utc, para_datetime
+from campos_sensores import CAMPOS_NUMERICOS, NOMES_CAMPOS
+from retencao import NivelRetencao
+
+CAMPO_TEMPO = "timestamp_recebido"
+
+# Sensores na ordem de CAMPOS_NUMERICOS (colunas "<sensor>_status")
+SENSORES = list(dict.fromkeys(sensor for sensor, _ in CAMPOS_NUMERICOS))
+
+# Campos inteiros no documento original
+CAMPOS_INTEIROS = {"hl69_raw_value"}
+
+
+class ArquivoIndisponivel(Exception):
+    """pyarrow não instalado no servidor"""
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute  # noqa: F401 (pyarrow.compute.min/max)
+        import pyarrow.parquet
+    except ImportError:
+        raise ArquivoIndisponivel("pyarrow não instalado (pip install pyarrow)")
+    return pyarrow, pyarrow.parquet
+
+
+def inicio_mes(momento: datetime) -> datetime:
+    return datetime(momento.year, momento.month, 1, tzinfo=timezone.utc)
+
+
+def proximo_mes(momento: datetime) -> datetime:
+    if momento.month == 12:
+        return datetime(momento.year + 1, 1, 1, tzinfo=timezone.utc)
+    return datetime(momento.year, momento.month + 1, 1, tzinfo=timezone.utc)
+
+
+# ========================================
+# CONVERSÃO DOCUMENTO <-> LINHA
+# ========================================
+
+def _esquema():
+    pa, _ = _pyarrow()
+    return pa.schema(
+        [
+            ("id", pa.string()),
+            ("device_id", pa.string()),
+            ("timestamp", pa.string()),
+            (CAMPO_TEMPO, pa.timestamp("us", tz="UTC")),
+            ("seq", pa.int64()),
+            ("anomalias", pa.list_(pa.string())),
+        ]
+        + [(nome, pa.float64()) for nome in NOMES_CAMPOS]
+        + [(f"{sensor}_status", pa.string()) for sensor in SENSORES]
+    )
+
+
+def documento_para_linha(doc_id: str, documento: dict) -> dict:
+    """Achata um documento de sensor_readings em uma linha do Parquet"""
+    sensors = documento.get("sensors") or {}
+    linha = {
+        "id": doc_id,
+        "device_id": documento.get("device_id"),
+        "timestamp": documento.get("timestamp"),
+        CAMPO_TEMPO: para_datetime(documento[CAMPO_TEMPO]),
+        "seq": documento.get("seq"),
+        "anomalias": documento.get("anomalias") or None,
+    }
+    for sensor, campo in CAMPOS_NUMERICOS:
+        valor = (sensors.get(sensor) or {}).get(campo)
+        linha[f"{sensor}_{campo}"] = float(valor) if isinstance(valor, (int, float)) else None
+    for sensor in SENSORES:
+        linha[f"{sensor}_status"] = (sensors.get(sensor) or {}).get("status")
+    return linha
+
+
+def linha_para_documento(linha: dict) -> dict:
+    """Reconstrói o documento no formato de GET /sensor-data"""
+    sensors = {}
+    for sensor, campo in CAMPOS_NUMERICOS:
+        nome = f"{sensor}_{campo}"
+        if linha.get(nome) is not None:
+            valor = linha[nome]
+            sensors.setdefault(sensor, {})[campo] = int(valor) if nome in CAMPOS_INTEIROS else valor
+    for sensor in SENSORES:
+        if linha.get(f"{sensor}_status") is not None:
+            sensors.setdefault(sensor, {})["status"] = linha[f"{sensor}_status"]
+
+    documento = {
+        "id": linha["id"],
+        "device_id": linha["device_id"],
+        "timestamp": linha["timestamp"],
+        CAMPO_TEMPO: linha[CAMPO_TEMPO],
+        "sensors": sensors,
+        "arquivado": True,
+    }
+    if linha.get("seq") is not None:
+        documento["seq"] = linha["seq"]
+    if linha.get("anomalias"):
+        documento["anomalias"] = linha["anomalias"]
+    return documento
+
+
+# ========================================
+# ARQUIVO (DISCO)
+# ========================================
+
+class ArquivoFrio:
+    """
+    Leitura e escrita dos arquivos Parquet e manifestos
+
+    Args:
+        diretorio (str): Raiz do arquivo
+        nivel_zstd (int): Nível de compressão zstd
+        linhas_por_grupo (int): Linhas por row group (granularidade do pushdown)
+    """
+
+    def __init__(self, diretorio: str, nivel_zstd: int = 9, linhas_por_grupo: int = 16384):
+        self.diretorio = diretorio
+        self.nivel_zstd = nivel_zstd
+        self.linhas_por_grupo = linhas_por_grupo
+        self._lock = threading.Lock()
+        self._manifesto = None
+        self._manifesto_mtime = None
+
+    # ----------------------------------------
+    # Manifestos
+    # ----------------------------------------
+
+    def _caminho_mes(self, mes: str) -> str:
+        return os.path.join(self.diretorio, f"mes={mes}")
+
+    def manifesto(self) -> dict:
+        """Manifesto geral (recarregado quando o arquivo muda em disco)"""
+        caminho = os.path.join(self.diretorio, "manifesto.json")
+        try:
+            mtime = os.path.getmtime(caminho)
+        except OSError:
+            return {"meses": [], "arquivado_ate": None}
+        with self._lock:
+            if self._manifesto is None or mtime != self._manifesto_mtime:
+                with open(caminho, encoding="utf-8") as arquivo:
+                    self._manifesto = json.load(arquivo)
+                self._manifesto_mtime = mtime
+            return self._manifesto
+
+    def manifesto_mes(self, mes: str) -> Optional[dict]:
+        caminho = os.path.join(self._caminho_mes(mes), "manifesto.json")
+        if not os.path.exists(caminho):
+            return None
+        with open(caminho, encoding="utf-8") as arquivo:
+            return json.load(arquivo)
+
+    def arquivado_ate(self) -> Optional[datetime]:
+        """Fim do mês mais recente no arquivo (tudo antes disso saiu do Firestore)"""
+        valor = self.manifesto().get("arquivado_ate")
+        return para_datetime(valor) if valor else None
+
+    def _gravar_json(self, caminho: str, conteudo: dict):
+        """Gravação atômica (arquivo temporário + rename)"""
+        temporario = f"{caminho}.tmp"
+        with open(temporario, "w", encoding="utf-8") as arquivo:
+            json.dump(conteudo, arquivo, ensure_ascii=False, indent=2)
+        os.replace(temporario, caminho)
+
+    # ----------------------------------------
+    # Escrita
+    # ----------------------------------------
+
+    def ids_arquivados(self, mes: str) -> set:
+        """IDs já gravados no mês (evita duplicar após uma execução interrompida)"""
+        _, pq = _pyarrow()
+        manifesto = self.manifesto_mes(mes)
+        if not manifesto:
+            return set()
+        ids = set()
+        for parte in manifesto["partes"]:
+            tabela = pq.read_table(os.path.join(self._caminho_mes(mes), parte["arquivo"]),
+                                   columns=["id"], memory_map=True)
+            ids.update(tabela.column("id").to_pylist())
+        return ids
+
+    def gravar_mes(self, mes: str, linhas: List[dict]) -> dict:
+        """
+        Grava uma nova parte do mês e atualiza os manifestos
+
+        Returns:
+            dict: Descrição da parte gravada
+        """
+        pa, pq = _pyarrow()
+        pasta = self._caminho_mes(mes)
+        os.makedirs(pasta, exist_ok=True)
+
+        manifesto = self.manifesto_mes(mes) or {"mes": mes, "partes": []}
+        nome = f"parte-{len(manifesto['partes']) + 1:04d}.parquet"
+        caminho = os.path.join(pasta, nome)
+
+        tabela = pa.Table.from_pylist(linhas, schema=_esquema()).sort_by(
+            [("device_id", "ascending"), (CAMPO_TEMPO, "ascending")]
+        )
+        pq.write_table(
+            tabela, f"{caminho}.tmp",
+            compression="zstd",
+            compression_level=self.nivel_zstd,
+            row_group_size=self.linhas_por_grupo,
+            write_statistics=True,
+        )
+        os.replace(f"{caminho}.tmp", caminho)
+
+        with open(caminho, "rb") as arquivo:
+            sha256 = hashlib.sha256(arquivo.read()).hexdigest()
+        tempos = tabela.column(CAMPO_TEMPO)
+        parte = {
+            "arquivo": nome,
+            "linhas": tabela.num_rows,
+            "bytes": os.path.getsize(caminho),
+            "sha256": sha256,
+            "inicio": pa.compute.min(tempos).as_py().isoformat(),
+            "fim": pa.compute.max(tempos).as_py().isoformat(),
+            "dispositivos": sorted(set(tabela.column("device_id").to_pylist())),
+            "criado_em": agora_utc().isoformat(),
+        }
+        manifesto["partes"].append(parte)
+        manifesto["linhas"] = sum(p["linhas"] for p in manifesto["partes"])
+        manifesto["dispositivos"] = sorted({d for p in manifesto["partes"] for d in p["dispositivos"]})
+        self._gravar_json(os.path.join(pasta, "manifesto.json"), manifesto)
+        return parte
+
+    def concluir_mes(self, mes: str, fim: datetime):
+        """Registra o mês no manifesto geral e avança `arquivado_ate`"""
+        geral = dict(self.manifesto())
+        meses = sorted(set(geral.get("meses", [])) | {mes})
+        atual = geral.get("arquivado_ate")
+        geral["meses"] = meses
+        geral["arquivado_ate"] = max(fim, para_datetime(atual)).isoformat() if atual else fim.isoformat()
+        os.makedirs(self.diretorio, exist_ok=True)
+        self._gravar_json(os.path.join(self.diretorio, "manifesto.json"), geral)
+
+    # ----------------------------------------
+    # Leitura
+    # ----------------------------------------
+
+    def consultar(self, limit: int, device_id: Optional[str] = None,
+                  desde: Optional[datetime] = None, ate: Optional[datetime] = None) -> Tuple[List[dict], dict]:
+        """
+        Leituras arquivadas mais recentes no período, como GET /sensor-data
+
+        Percorre os meses do mais recente para o mais antigo, lendo apenas
+        as partes cujo período e dispositivos podem atender ao filtro.
+
+        Returns:
+            tuple: (documentos do mais recente para o mais antigo,
+                    {"meses": meses lidos, "linhas_lidas": linhas após o pushdown})
+        """
+        pa, pq = _pyarrow()
+        filtros = []
+        if device_id:
+            filtros.append(("device_id", "==", device_id))
+        if desde:
+            filtros.append((CAMPO_TEMPO, ">=", desde))
+        if ate:
+            filtros.append((CAMPO_TEMPO, "<", ate))
+
+        resultados, lidos, linhas_lidas = [], [], 0
+        for mes in sorted(self.manifesto().get("meses", []), reverse=True):
+            if len(resultados) >= limit:
+                break  # Meses anteriores só têm leituras mais antigas
+            inicio = datetime.strptime(mes, "%Y-%m").replace(tzinfo=timezone.utc)
+            if (ate and inicio >= ate) or (desde and proximo_mes(inicio) <= desde):
+                continue
+            manifesto = self.manifesto_mes(mes) or {"partes": []}
+            tabelas = []
+            for parte in manifesto["partes"]:
+                if device_id and device_id not in parte["dispositivos"]:
+                    continue
+                if (ate and para_datetime(parte["inicio"]) >= ate) or (desde and para_datetime(parte["fim"]) < desde):
+                    continue
+                tabelas.append(pq.read_table(
+                    os.path.join(self._caminho_mes(mes), parte["arquivo"]),
+                    filters=filtros or None,
+                    memory_map=True,
+                ))
+            if not tabelas:
+                continue
+            lidos.append(mes)
+            tabela = pa.concat_tables(tabelas)
+            linhas_lidas += tabela.num_rows
+            tabela = tabela.sort_by([(CAMPO_TEMPO, "descending")]).slice(0, limit - len(resultados))
+            resultados.extend(linha_para_documento(linha) for linha in tabela.to_pylist())
+
+        return resultados, {"meses": lidos, "linhas_lidas": linhas_lidas}
+
+
+# ========================================
+# ARQUIVADOR (FIRESTORE -> DISCO)
+# ========================================
+
+class ArquivadorFrio:
+    """
+    Move meses fechados das leituras brutas para o arquivo frio
+
+    Args:
+        db: Cliente Firestore
+        arquivo (ArquivoFrio): Destino dos arquivos
+        origem (NivelRetencao): Nível bruto (coleção única ou particionada)
+        atraso (timedelta): Tempo após o fim do mês antes de arquivá-lo
+        limite_seguro (callable, optional): Retorna até quando os dados já
+            foram agregados; meses posteriores não são arquivados
+        tamanho_pagina (int): Documentos lidos por consulta
+        pausa_entre_lotes (float): Espera entre batches de exclusão, em segundos
+    """
+
+    def __init__(self, db, arquivo: ArquivoFrio, origem: NivelRetencao, atraso,
+                 limite_seguro: Optional[Callable[[], Optional[datetime]]] = None,
+                 tamanho_pagina: int = 1000, pausa_entre_lotes: float = 1.0):
+        self.db = db
+        self.arquivo = arquivo
+        self.origem = origem
+        self.atraso = atraso
+        self.limite_seguro = limite_seguro
+        self.tamanho_pagina = tamanho_pagina
+        self.pausa_entre_lotes = pausa_entre_lotes
+
+    def executar(self, agora: Optional[datetime] = None) -> dict:
+        """
+        Arquiva todos os meses fechados ainda presentes no Firestore
+
+        Returns:
+            dict: {"aaaa-mm": leituras arquivadas}
+        """
+        agora = para_datetime(agora) if agora else agora_utc()
+        limite = inicio_mes(agora - self.atraso)
+        if self.limite_seguro is not None:
+            seguro = self.limite_seguro()
+            if seguro is None:
+                return {}
+            limite = min(limite, inicio_mes(seguro))
+
+        resultado = {}
+        mes = self._mes_mais_antigo()
+        while mes is not None and mes < limite:
+            fim = proximo_mes(mes)
+            resultado[mes.strftime("%Y-%m")] = self._arquivar_mes(mes, fim)
+            mes = self._mes_mais_antigo()
+            if mes is not None and mes < fim:
+                break  # Exclusão incompleta; tenta de novo na próxima execução
+        return resultado
+
+    def _mes_mais_antigo(self) -> Optional[datetime]:
+        primeiros = [
+            para_datetime(doc.to_dict()[CAMPO_TEMPO])
+            for referencia in self.origem.referencias(self.db)
+            for doc in referencia.order_by(CAMPO_TEMPO).limit(1).stream()
+        ]
+        return inicio_mes(min(primeiros)) if primeiros else None
+
+    def _documentos(self, inicio: datetime, fim: datetime):
+        """Documentos de [inicio, fim) de todas as fontes, em páginas"""
+        for referencia in self.origem.referencias(self.db, inicio, fim):
+            query = (
+                referencia
+                .where(CAMPO_TEMPO, ">=", inicio)
+                .where(CAMPO_TEMPO, "<", fim)
+                .order_by(CAMPO_TEMPO)
+            )
+            ultimo = None
+            while True:
+                pagina = query.start_after(ultimo) if ultimo is not None else query
+                docs = list(pagina.limit(self.tamanho_pagina).stream())
+                if not docs:
+                    break
+                yield from docs
+                ultimo = docs[-1]
+
+    def _arquivar_mes(self, inicio: datetime, fim: datetime) -> int:
+        mes = inicio.strftime("%Y-%m")
+        ja_arquivados = self.arquivo.ids_arquivados(mes)
+
+        linhas, referencias = [], []
+        for doc in self._documentos(inicio, fim):
+            referencias.append(doc.reference)
+            if doc.id not in ja_arquivados:
+                linhas.append(documento_para_linha(doc.id, doc.to_dict()))
+
+        if linhas:
+            parte = self.arquivo.gravar_mes(mes, linhas)
+            print(f"🧊 Arquivo frio: {parte['linhas']} leituras de {mes} em {parte['arquivo']} "
+                  f"({parte['bytes'] / 1024:.0f} KiB)")
+        self.arquivo.concluir_mes(mes, fim)
+
+        # Só apaga depois que o Parquet e os manifestos estão gravados
+        for i in range(0, len(referencias), TAMANHO_MAXIMO_BATCH):
+            batch = self.db.batch()
+            for referencia in referencias[i:i + TAMANHO_MAXIMO_BATCH]:
+                batch.delete(referencia)
+            batch.commit()
+            time.sleep(self.pausa_entre_lotes)
+        return len(linhas)
@@ -0,0 +1,75 @@
+"""
+Campos numéricos das leituras de sensores
+Sistema de Monitoramento do Telhado Verde - UFSM
+
+Lista única dos valores numéricos gravados em `sensors` (mesma estrutura
+dos modelos Pydantic da API), usada pelos estágios que agregam ou analisam
+leituras sem precisar conhecer cada sensor, e as regras de validação
+comuns ao JSON (modelos.py) e ao formato compacto (formato_compacto.py).
+
+Autor: Equipe Projeto Integrador 4 - UFSM
+Data: 2025
+"""
+
+from datetime import datetime
+
+# (sensor, campo) de cada valor numérico salvo em sensors
+CAMPOS_NUMERICOS = [
+    ("ds18b20", "temperature"),
+    ("dht11", "temperature"),
+    ("dht11", "humidity"),
+    ("hcsr04", "distance"),
+    ("hl69", "soil_moisture"),
+    ("hl69", "raw_value"),
+]
+
+# Nomes achatados ("sensor_campo"), ex.: "dht11_humidity"
+NOMES_CAMPOS = [f"{sensor}_{campo}" for sensor, campo in CAMPOS_NUMERICOS]
+
+# Faixa física (mínimo, máximo) de cada campo, conforme os datasheets dos
+# sensores; valores fora dela são rejeitados na ingestão, exceto a distância
+# do HC-SR04, que só marca o sensor com status "error"
+FAIXAS_VALIDAS = {
+    "ds18b20_temperature": (-55.0, 125.0),
+    "dht11_temperature": (-40.0, 80.0),
+    "dht11_humidity": (0.0, 100.0),
+    "hcsr04_distance": (2.0, 400.0),
+    "hl69_soil_moisture": (0.0, 100.0),
+    "hl69_raw_value": (0, 4095),
+}
+
+
+def interpretar_timestamp(valor) -> datetime:
+    """
+    Timestamp da coleta enviado pelo firmware
+
+    Mesmo parser nos dois formatos de ingestão: só texto ISO 8601
+    (datetime.fromisoformat); números e epoch em texto são rejeitados.
+
+    Raises:
+        ValueError: Se o valor não for texto ou não for uma data ISO 8601
+    """
+    if not isinstance(valor, str):
+        raise ValueError("timestamp deve ser texto ISO 8601")
+    try:
+        return datetime.fromisoformat(valor)
+    except ValueError:
+        raise ValueError(f"timestamp não é uma data ISO 8601: {valor!r}")
+
+
+def extrair_valores(sensors: dict) -> dict:
+    """
+    Achata o dicionário `sensors` de uma leitura
+
+    Args:
+        sensors (dict): Bloco `sensors` salvo no Firestore
+
+    Returns:
+        dict: {"sensor_campo": float} apenas com os valores numéricos presentes
+    """
+    valores = {}
+    for sensor, campo in CAMPOS_NUMERICOS:
+        valor = (sensors.get(sensor) or {}).get(campo)
+        if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+            valores[f"{sensor}_{campo}"] = float(valor)
+    return valores
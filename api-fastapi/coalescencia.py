@@ -0,0 +1,104 @@
+"""
+Coalescência de consultas idênticas (single-flight + micro-TTL)
+Sistema de Monitoramento do Telhado Verde - UFSM
+
+Várias sessões do dashboard atualizam juntas e enviam a mesma consulta
+(limit, device_id, ...) a GET /sensor-data no mesmo instante. Aqui cada
+consulta distinta tem no máximo uma execução em andamento: as requisições
+idênticas que chegam enquanto ela roda aguardam a mesma tarefa e recebem o
+mesmo resultado. O resultado continua valendo por `ttl` segundos (cerca de
+1 s), o que absorve rajadas de atualização sem atrasar dados de forma
+perceptível.
+
+Assim o volume de leituras no Firestore acompanha o número de consultas
+distintas por segundo, e não o número de pessoas olhando o dashboard.
+
+Autor: Equipe Projeto Integrador 4 - UFSM
+Data: 2025
+"""
+
+import asyncio
+import time
+from typing import Awaitable, Callable, Hashable
+
+
+class CoalescedorConsultas:
+    """
+    Compartilha a execução e o resultado de consultas com a mesma chave
+
+    Erros não ficam guardados: todas as requisições que aguardavam a
+    execução com falha recebem o erro, e a próxima tenta de novo.
+
+    Args:
+        ttl (float): Segundos em que um resultado concluído é reaproveitado
+            (0 = apenas junta execuções simultâneas)
+        max_chaves (int): Acima disso, resultados expirados são descartados
+    """
+
+    def __init__(self, ttl: float = 1.0, max_chaves: int = 1024):
+        self.ttl = ttl
+        self.max_chaves = max_chaves
+        self._tarefas = {}  # chave -> (tarefa, concluída em | None)
+
+        self.consultas = 0
+        self.executadas = 0
+        self.coalescidas = 0  # Aguardaram uma execução em andamento
+        self.reaproveitadas = 0  # Receberam um resultado com menos de `ttl` s
+        self.erros = 0
+
+    async def obter(self, chave: Hashable, executar: Callable[[], Awaitable]):
+        """
+        Resultado de `executar()` para a chave, executando no máximo uma vez
+        por vez (e por `ttl` segundos após concluir)
+        """
+        self.consultas += 1
+        agora = time.monotonic()
+
+        entrada = self._tarefas.get(chave)
+        if entrada is not None:
+            tarefa, concluida_em = entrada
+            if concluida_em is None:
+                self.coalescidas += 1
+            elif agora - concluida_em < self.ttl:
+                self.reaproveitadas += 1
+            else:
+                entrada = None
+
+        if entrada is None:
+            if len(self._tarefas) >= self.max_chaves:
+                self._descartar_expiradas(agora)
+            tarefa = asyncio.ensure_future(executar())
+            self._tarefas[chave] = (tarefa, None)
+            self.executadas += 1
+            tarefa.add_done_callback(lambda t, chave=chave: self._concluir(chave, t))
+
+        # shield: a desconexão de um cliente não cancela a consulta dos demais
+        return await asyncio.shield(tarefa)
+
+    def _concluir(self, chave, tarefa):
+        if self._tarefas.get(chave, (None,))[0] is not tarefa:
+            return
+        if tarefa.cancelled() or tarefa.exception() is not None:
+            self.erros += 1
+            del self._tarefas[chave]
+        elif self.ttl > 0:
+            self._tarefas[chave] = (tarefa, time.monotonic())
+        else:
+            del self._tarefas[chave]
+
+    def _descartar_expiradas(self, agora: float):
+        for chave, (_, concluida_em) in list(self._tarefas.items()):
+            if concluida_em is not None and agora - concluida_em >= self.ttl:
+                del self._tarefas[chave]
+
+    def status(self) -> dict:
+        return {
+            "ttl_segundos": self.ttl,
+            "consultas": self.consultas,
+            "executadas": self.executadas,
+            "coalescidas": self.coalescidas,
+            "reaproveitadas": self.reaproveitadas,
+            "erros": self.erros,
+            "chaves_ativas": len(self._tarefas),
+            "economia": round(1 - self.executadas / self.consultas, 3) if self.consultas else 0.0,
+        }
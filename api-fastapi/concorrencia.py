@@ -0,0 +1,87 @@
+"""
+Limite de operações simultâneas no Firestore
+Sistema de Monitoramento do Telhado Verde - UFSM
+
+Com os endpoints assíncronos, o número de requisições em andamento deixa de
+ser limitado pelo threadpool do Starlette (40 threads). O limitador define
+quantas operações podem estar em voo ao mesmo tempo no AsyncClient; as
+excedentes aguardam na fila até `espera_maxima` segundos e então recebem
+503, em vez de acumular indefinidamente e estourar os timeouts do Firestore.
+
+Autor: Equipe Projeto Integrador 4 - UFSM
+Data: 2025
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+
+class LimiteExcedido(Exception):
+    """Operação esperou mais que `espera_maxima` por uma vaga"""
+
+
+class LimitadorConcorrencia:
+    """
+    Semáforo com fila limitada no tempo e contadores para /health/ready
+
+    Args:
+        maximo (int): Operações simultâneas permitidas
+        espera_maxima (float): Tempo máximo na fila, em segundos
+    """
+
+    def __init__(self, maximo: int = 200, espera_maxima: float = 5.0):
+        self.maximo = maximo
+        self.espera_maxima = espera_maxima
+        self._semaforo = None  # Criado no event loop da API, no primeiro uso
+
+        self.em_andamento = 0
+        self.aguardando = 0
+        self.pico = 0
+        self.concluidas = 0
+        self.rejeitadas = 0
+        self.espera_total = 0.0
+
+    @asynccontextmanager
+    async def vaga(self):
+        """
+        Reserva uma vaga durante o bloco
+
+        Raises:
+            LimiteExcedido: A fila não andou dentro de `espera_maxima`
+        """
+        if self._semaforo is None:
+            self._semaforo = asyncio.Semaphore(self.maximo)
+
+        inicio = time.perf_counter()
+        self.aguardando += 1
+        try:
+            await asyncio.wait_for(self._semaforo.acquire(), self.espera_maxima)
+        except asyncio.TimeoutError:
+            self.rejeitadas += 1
+            raise LimiteExcedido(
+                f"{self.maximo} operações no Firestore em andamento; tente novamente"
+            ) from None
+        finally:
+            self.aguardando -= 1
+        self.espera_total += time.perf_counter() - inicio
+
+        self.em_andamento += 1
+        self.pico = max(self.pico, self.em_andamento)
+        try:
+            yield
+        finally:
+            self.em_andamento -= 1
+            self.concluidas += 1
+            self._semaforo.release()
+
+    def status(self) -> dict:
+        return {
+            "maximo": self.maximo,
+            "em_andamento": self.em_andamento,
+            "aguardando": self.aguardando,
+            "pico": self.pico,
+            "concluidas": self.concluidas,
+            "rejeitadas": self.rejeitadas,
+            "espera_media_ms": round(self.espera_total / self.concluidas * 1000, 2) if self.concluidas else 0.0,
+        }
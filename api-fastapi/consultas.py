@@ -0,0 +1,253 @@
+"""
+Planejador de consultas e índices compostos do Firestore
+Sistema de Monitoramento do Telhado Verde - UFSM
+
+Filtrar por `device_id` e ordenar por `timestamp_recebido` exige um índice
+composto no Firestore; sem ele a consulta falha em tempo de execução. Os
+índices necessários ficam declarados em `firestore.indexes.json` (mesmo
+formato do Firebase CLI, aplicado com `firebase deploy --only
+firestore:indexes`) e são verificados quando a API conecta.
+
+O `PlanejadorConsultas` escolhe, para cada combinação de filtros, o plano
+mais barato que tenha índice disponível:
+
+- indice_simples:     sem filtro de dispositivo; usa o índice automático
+                      de `timestamp_recebido` (lê apenas `limit` documentos)
+- indice_composto:    device_id + ordem temporal no índice composto
+                      (lê apenas `limit` documentos)
+- varredura_filtrada: índice composto ausente; percorre a coleção em ordem
+                      temporal, em páginas, e filtra o dispositivo em
+                      memória até um teto de leituras
+
+A lógica de cada consulta é escrita como um gerador que entrega as queries
+ao executor e recebe de volta os documentos lidos. O mesmo gerador roda com
+o cliente síncrono (`executar`, usado por scripts e tarefas de segundo
+plano) ou com o AsyncClient (`executar_async`, usado pelos endpoints).
+
+Autor: Equipe Projeto Integrador 4 - UFSM
+Data: 2025
+"""
+
+import json
+import os
+from datetime import datetime
+from typing import Any, Generator, List, Optional, Tuple
+
+from armazenamento import agora_utc
+
+CAMPO_TEMPO = "timestamp_recebido"
+
+ARQUIVO_INDICES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "firestore.indexes.json")
+
+
+def rodar(passos: Generator) -> Any:
+    """Executa um gerador de consulta com o cliente síncrono"""
+    try:
+        query = next(passos)
+        while True:
+            query = passos.send(list(query.stream()))
+    except StopIteration as fim:
+        return fim.value
+
+
+async def rodar_async(passos: Generator) -> Any:
+    """Executa um gerador de consulta com o AsyncClient"""
+    try:
+        query = next(passos)
+        while True:
+            query = passos.send([doc async for doc in query.stream()])
+    except StopIteration as fim:
+        return fim.value
+
+
+class IndiceComposto:
+    """Índice composto declarado: coleção e campos [(campo, ordem)]"""
+
+    __slots__ = ("colecao", "campos")
+
+    def __init__(self, colecao: str, campos: Tuple[Tuple[str, str], ...]):
+        self.colecao = colecao
+        self.campos = campos
+
+    def __repr__(self):
+        campos = ", ".join(f"{campo} {'ASC' if ordem == 'ASCENDING' else 'DESC'}" for campo, ordem in self.campos)
+        return f"{self.colecao}({campos})"
+
+
+class Plano:
+    """Plano escolhido para uma consulta e o custo estimado em leituras"""
+
+    __slots__ = ("nome", "indice", "leituras_maximas")
+
+    def __init__(self, nome: str, indice: Optional[IndiceComposto], leituras_maximas: int):
+        self.nome = nome
+        self.indice = indice
+        self.leituras_maximas = leituras_maximas
+
+    def descricao(self) -> dict:
+        return {
+            "plano": self.nome,
+            "indice": repr(self.indice) if self.indice else None,
+            "leituras_maximas": self.leituras_maximas,
+        }
+
+
+def carregar_indices(caminho: str = ARQUIVO_INDICES) -> List[IndiceComposto]:
+    """Lê os índices compostos declarados em firestore.indexes.json"""
+    with open(caminho, encoding="utf-8") as arquivo:
+        declarados = json.load(arquivo).get("indexes", [])
+    return [
+        IndiceComposto(
+            indice["collectionGroup"],
+            tuple((campo["fieldPath"], campo["order"]) for campo in indice["fields"]),
+        )
+        for indice in declarados
+    ]
+
+
+class PlanejadorConsultas:
+    """
+    Escolhe e executa o plano de consulta de leituras por coleção/filtros
+
+    Args:
+        indices (list): Índices compostos declarados
+        fator_varredura (int): Na varredura filtrada, lê até `limit` vezes
+            este fator antes de desistir de completar o resultado
+        max_varredura (int): Teto absoluto de documentos lidos na varredura
+    """
+
+    def __init__(self, indices: List[IndiceComposto], fator_varredura: int = 20,
+                 max_varredura: int = 5000):
+        self.indices = {(i.colecao, i.campos): i for i in indices}
+        self.fator_varredura = fator_varredura
+        self.max_varredura = max_varredura
+        self.ausentes = set()  # Índices que a verificação não encontrou no projeto
+        self.verificado_em = None
+        self.planos_executados = {}
+
+    # ----------------------------------------
+    # Verificação dos índices
+    # ----------------------------------------
+
+    def verificar(self, db) -> dict:
+        """
+        Confere se cada índice declarado existe no projeto do Firestore
+
+        Executa uma consulta mínima (limit 1) que só é aceita com o índice;
+        o Firestore responde FailedPrecondition, com o link de criação,
+        quando ele não existe.
+
+        Returns:
+            dict: Estado dos índices (ver `status()`)
+        """
+        from google.api_core.exceptions import FailedPrecondition  # SDK já carregado pelo cliente
+
+        ausentes = set()
+        for indice in self.indices.values():
+            try:
+                list(self._consulta_de_teste(db, indice).stream())
+            except FailedPrecondition as e:
+                ausentes.add(indice)
+                print(f"⚠️ Índice composto ausente: {indice!r}")
+                print(f"   Crie com: firebase deploy --only firestore:indexes ({str(e)})")
+        self.ausentes = ausentes
+        self.verificado_em = agora_utc().isoformat()
+        if not ausentes:
+            print(f"🗂️ Índices compostos verificados: {len(self.indices)} disponíveis")
+        return self.status()
+
+    def _consulta_de_teste(self, db, indice: IndiceComposto):
+        """Igualdade em todos os campos menos o último, que define a ordem"""
+        query = db.collection(indice.colecao)
+        for campo, _ in indice.campos[:-1]:
+            query = query.where(campo, "==", "")
+        campo, ordem = indice.campos[-1]
+        return query.order_by(campo, direction=ordem).limit(1)
+
+    def status(self) -> dict:
+        return {
+            "declarados": [repr(i) for i in self.indices.values()],
+            "ausentes": [repr(i) for i in self.ausentes],
+            "verificado_em": self.verificado_em,
+            "planos_executados": dict(self.planos_executados),
+        }
+
+    # ----------------------------------------
+    # Planejamento e execução
+    # ----------------------------------------
+
+    def planejar(self, colecao: str, limit: int, device_id: Optional[str] = None) -> Plano:
+        """Escolhe o plano mais barato com índice disponível"""
+        if not device_id:
+            return Plano("indice_simples", None, limit)
+
+        indice = self.indices.get((colecao, (("device_id", "ASCENDING"), (CAMPO_TEMPO, "DESCENDING"))))
+        if indice is not None and indice not in self.ausentes:
+            return Plano("indice_composto", indice, limit)
+
+        return Plano("varredura_filtrada", None, min(limit * self.fator_varredura, self.max_varredura))
+
+    def executar(self, db, colecao: str, limit: int, device_id: Optional[str] = None,
+                 desde: Optional[datetime] = None, ate: Optional[datetime] = None) -> Tuple[List[dict], Plano]:
+        """
+        Consulta as leituras mais recentes de uma coleção
+
+        Args:
+            db: Cliente Firestore
+            colecao (str): Coleção consultada
+            limit (int): Máximo de documentos retornados
+            device_id (str, optional): Filtrar por dispositivo
+            desde (datetime, optional): timestamp_recebido >= desde
+            ate (datetime, optional): timestamp_recebido < ate
+
+        Returns:
+            tuple: (documentos do mais recente para o mais antigo, plano usado)
+        """
+        return rodar(self._passos(db, colecao, limit, device_id, desde, ate))
+
+    async def executar_async(self, db, colecao: str, limit: int, device_id: Optional[str] = None,
+                             desde: Optional[datetime] = None, ate: Optional[datetime] = None) -> Tuple[List[dict], Plano]:
+        """Mesmo que `executar`, com o AsyncClient"""
+        return await rodar_async(self._passos(db, colecao, limit, device_id, desde, ate))
+
+    def _passos(self, db, colecao, limit, device_id, desde, ate):
+        plano = self.planejar(colecao, limit, device_id)
+        self.planos_executados[plano.nome] = self.planos_executados.get(plano.nome, 0) + 1
+
+        query = db.collection(colecao)
+        if plano.nome == "indice_composto":
+            query = query.where("device_id", "==", device_id)
+        if desde:
+            query = query.where(CAMPO_TEMPO, ">=", desde)
+        if ate:
+            query = query.where(CAMPO_TEMPO, "<", ate)
+        query = query.order_by(CAMPO_TEMPO, direction="DESCENDING")
+
+        if plano.nome != "varredura_filtrada":
+            docs = yield query.limit(limit)
+            return [_para_dict(doc) for doc in docs], plano
+
+        # Varredura: páginas em ordem temporal, filtrando o dispositivo em memória
+        resultados, lidos, ultimo = [], 0, None
+        tamanho_pagina = max(limit * 2, 50)
+        while len(resultados) < limit and lidos < plano.leituras_maximas:
+            pagina = query.start_after(ultimo) if ultimo is not None else query
+            docs = yield pagina.limit(min(tamanho_pagina, plano.leituras_maximas - lidos))
+            if not docs:
+                break
+            lidos += len(docs)
+            ultimo = docs[-1]
+            for doc in docs:
+                dados = doc.to_dict()
+                if dados.get("device_id") == device_id:
+                    resultados.append(_com_id(doc, dados))
+        return resultados[:limit], plano
+
+
+def _para_dict(doc) -> dict:
+    return _com_id(doc, doc.to_dict())
+
+
+def _com_id(doc, dados: dict) -> dict:
+    dados["id"] = doc.id  # Adiciona o ID do documento Firestore
+    return dados
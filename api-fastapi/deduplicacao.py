@@ -0,0 +1,83 @@
+"""
+Deduplicação de leituras e ingestão idempotente
+Sistema de Monitoramento do Telhado Verde - UFSM
+
+Reenvios do ESP32, replays e gateways que repetem requisições geravam
+documentos duplicados em `sensor_readings`. Cada leitura agora recebe um
+ID de documento determinístico, derivado de (device_id, timestamp) ou de
+(device_id, seq, timestamp) quando o dispositivo envia um número de
+sequência, e um cache LRU em memória rejeita repetições recentes sem
+consultar o Firestore.
+
+O seq do firmware fica na memória RTC e volta a 0 após falta de energia;
+por isso ele nunca identifica a leitura sozinho, apenas distingue leituras
+com o mesmo timestamp.
+
+Autor: Equipe Projeto Integrador 4 - UFSM
+Data: 2025
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+
+def gerar_id_leitura(device_id: str, timestamp: str, seq: Optional[int] = None) -> str:
+    """
+    Gera o ID de documento Firestore de uma leitura
+
+    O mesmo par (device_id, timestamp) — ou trio (device_id, seq,
+    timestamp) — sempre gera o mesmo ID. O hash evita caracteres inválidos em IDs (ex.: '/').
+
+    Args:
+        device_id (str): Identificador do dispositivo
+        timestamp (str): Timestamp da coleta informado pelo ESP32
+        seq (int, optional): Número de sequência enviado pelo dispositivo
+
+    Returns:
+        str: ID hexadecimal de 40 caracteres
+    """
+    if seq is not None:
+        # Com o timestamp: o seq reinicia em 0 quando o ESP32 perde energia
+        chave = f"{device_id}|seq|{seq}|{timestamp}"
+    else:
+        chave = f"{device_id}|ts|{timestamp}"
+    return hashlib.sha1(chave.encode("utf-8")).hexdigest()
+
+
+class CacheLeiturasRecentes:
+    """
+    Conjunto LRU limitado com os IDs das leituras aceitas recentemente
+
+    Thread-safe, pois os endpoints síncronos rodam no threadpool do Starlette.
+
+    Args:
+        capacidade (int): Quantidade máxima de IDs mantidos em memória
+    """
+
+    def __init__(self, capacidade: int = 10000):
+        self.capacidade = capacidade
+        self._ids = OrderedDict()
+        self._lock = threading.Lock()
+        self.duplicadas_rejeitadas = 0
+
+    def contem(self, doc_id: str) -> bool:
+        """Verifica se o ID já foi visto (e o marca como recente)"""
+        with self._lock:
+            if doc_id in self._ids:
+                self._ids.move_to_end(doc_id)
+                self.duplicadas_rejeitadas += 1
+                return True
+            return False
+
+    def registrar(self, doc_id: str):
+        """Adiciona um ID aceito, descartando o mais antigo se necessário"""
+        with self._lock:
+            self._ids[doc_id] = None
+            self._ids.move_to_end(doc_id)
+            if len(self._ids) > self.capacidade:
+                self._ids.popitem(last=False)
+
+    def __len__(self):
+        return len(self._ids)
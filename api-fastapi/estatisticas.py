@@ -0,0 +1,63 @@
+"""
+Estatísticas resumidas de um conjunto de leituras
+Sistema de Monitoramento do Telhado Verde - UFSM
+
+Calcula, em uma única passada, mínimo, máximo, média, desvio padrão e
+contagem de cada campo numérico das leituras retornadas por
+GET /sensor-data. Assim o dashboard recebe o resumo pronto e não precisa
+agregar nada ao renderizar.
+
+Autor: Equipe Projeto Integrador 4 - UFSM
+Data: 2025
+"""
+
+import math
+from typing import List
+
+from campos_sensores import NOMES_CAMPOS, extrair_valores
+
+ESTATISTICAS = ("min", "max", "mean", "std", "count")
+
+
+def resumir_leituras(documentos: List[dict]) -> dict:
+    """
+    Resume os campos numéricos de uma lista de leituras
+
+    Usa o algoritmo de Welford para média e variância (uma passada, sem
+    guardar os valores). O desvio padrão é amostral (n - 1), igual ao
+    `DataFrame.std()` do pandas usado no dashboard.
+
+    Args:
+        documentos (list): Documentos com o bloco `sensors`
+
+    Returns:
+        dict: {"sensor_campo": {"min", "max", "mean", "std", "count"}}; campos
+            sem nenhum valor têm count 0 e as demais estatísticas None
+    """
+    acumulados = {nome: [0, 0.0, 0.0, math.inf, -math.inf] for nome in NOMES_CAMPOS}
+
+    for documento in documentos:
+        for nome, valor in extrair_valores(documento.get("sensors") or {}).items():
+            acumulado = acumulados[nome]
+            acumulado[0] += 1
+            diferenca = valor - acumulado[1]
+            acumulado[1] += diferenca / acumulado[0]
+            acumulado[2] += diferenca * (valor - acumulado[1])
+            if valor < acumulado[3]:
+                acumulado[3] = valor
+            if valor > acumulado[4]:
+                acumulado[4] = valor
+
+    resumo = {}
+    for nome, (n, media, m2, minimo, maximo) in acumulados.items():
+        if n == 0:
+            resumo[nome] = {"min": None, "max": None, "mean": None, "std": None, "count": 0}
+            continue
+        resumo[nome] = {
+            "min": minimo,
+            "max": maximo,
+            "mean": media,
+            "std": math.sqrt(m2 / (n - 1)) if n > 1 else None,
+            "count": n,
+        }
+    return resumo
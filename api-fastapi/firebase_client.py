@@ -0,0 +1,252 @@
+"""
+Gerenciador do cliente Firebase Firestore
+Sistema de Monitoramento do Telhado Verde - UFSM
+
+Este módulo concentra o ciclo de vida da conexão com o Firestore:
+- Importa o SDK do Firebase somente quando a conexão é criada (startup rápido)
+- Conecta e aquece o canal gRPC em uma thread de segundo plano
+- Reconecta com backoff exponencial após falhas (credencial ausente,
+  inválida ou erros consecutivos de conexão nas operações)
+
+Cada conexão cria dois clientes sobre o mesmo app: o síncrono (`db`),
+usado pelas tarefas de segundo plano e scripts, e o AsyncClient
+(`db_async`), usado pelos endpoints sem ocupar threads do threadpool.
+
+Autor: Equipe Projeto Integrador 4 - UFSM
+Data: 2025
+"""
+
+import os
+import random
+import threading
+import time
+from datetime import datetime
+
+
+def erro_de_conexao(erro: Exception) -> bool:
+    """
+    Indica se o erro veio do canal com o Firestore e não da operação
+
+    Contam como conexão: serviço indisponível, prazo esgotado, novas
+    tentativas esgotadas, credencial rejeitada/expirada e erros de
+    transporte/rede. Os módulos do SDK só são importados aqui, no caminho
+    de erro, para não pesar no startup.
+    """
+    if isinstance(erro, (ConnectionError, TimeoutError)):
+        return True
+    try:
+        from google.api_core import exceptions as api_core
+        from google.auth import exceptions as auth
+    except ImportError:  # SDK ausente: não há canal a reconectar
+        return False
+    return isinstance(erro, (
+        api_core.ServiceUnavailable,
+        api_core.DeadlineExceeded,
+        api_core.RetryError,
+        api_core.Unauthenticated,
+        auth.TransportError,
+        auth.RefreshError,
+    ))
+
+
+class GerenciadorFirebase:
+    """
+    Mantém o cliente Firestore da API
+
+    O cliente é criado em segundo plano por `iniciar()`. Enquanto não houver
+    conexão, `db` retorna None e os endpoints respondem 503, exatamente como
+    acontecia quando as credenciais não estavam configuradas.
+
+    Args:
+        cred_path (str): Caminho do arquivo de credenciais (service account)
+        backoff_inicial (float): Espera inicial entre tentativas, em segundos
+        backoff_maximo (float): Espera máxima entre tentativas, em segundos
+        falhas_para_reconectar (int): Erros consecutivos de conexão nas
+            operações que descartam o cliente atual e forçam uma nova conexão
+        ao_conectar (callable, optional): Chamado com o cliente Firestore
+            na thread de conexão, logo após cada conexão bem-sucedida
+            (ex.: verificação dos índices compostos)
+    """
+
+    def __init__(self, cred_path: str, backoff_inicial: float = 1.0,
+                 backoff_maximo: float = 60.0, falhas_para_reconectar: int = 3,
+                 ao_conectar=None):
+        self.cred_path = cred_path
+        self.ao_conectar = ao_conectar
+        self.backoff_inicial = backoff_inicial
+        self.backoff_maximo = backoff_maximo
+        self.falhas_para_reconectar = falhas_para_reconectar
+
+        self._db = None
+        self._db_async = None
+        self._app = None
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._thread = None
+
+        self.tentativas = 0  # Tentativas de conexão desde a última falha
+        self.falhas_consecutivas = 0  # Erros de conexão seguidos nas operações
+        self.ultimo_erro = None
+        self.conectado_em = None
+
+    # ----------------------------------------
+    # Ciclo de vida
+    # ----------------------------------------
+
+    def iniciar(self):
+        """Dispara a thread de conexão (não bloqueia o startup da API)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._parar.clear()
+        self._thread = threading.Thread(
+            target=self._laco_conexao, name="firebase-conexao", daemon=True
+        )
+        self._thread.start()
+
+    def parar(self, timeout: float = 5.0):
+        """Encerra a thread de conexão e libera o app do Firebase"""
+        self._parar.set()
+        self._acordar.set()
+        if self._thread:
+            self._thread.join(timeout)
+        with self._lock:
+            self._descartar()
+
+    @property
+    def db(self):
+        """Cliente Firestore atual ou None se ainda não conectado"""
+        return self._db
+
+    @property
+    def db_async(self):
+        """AsyncClient do Firestore (endpoints) ou None se ainda não conectado"""
+        return self._db_async
+
+    @property
+    def pronto(self) -> bool:
+        return self._db is not None
+
+    # ----------------------------------------
+    # Registro de resultado das operações
+    # ----------------------------------------
+
+    def registrar_sucesso(self):
+        """Zera o contador de falhas após uma operação bem-sucedida"""
+        self.falhas_consecutivas = 0
+
+    def registrar_falha(self, erro: Exception):
+        """
+        Registra erro em uma operação do Firestore
+
+        Só erros de conexão/transporte (ver `erro_de_conexao`) contam para a
+        reconexão: após `falhas_para_reconectar` deles seguidos o cliente é
+        descartado e a thread de conexão tenta reconectar com backoff. Erros
+        da própria operação (documento já existente, argumento inválido...)
+        mostram que o canal responde e não derrubam o cliente.
+        """
+        self.ultimo_erro = str(erro)
+        if not erro_de_conexao(erro):
+            return
+        self.falhas_consecutivas += 1
+        if self.falhas_consecutivas >= self.falhas_para_reconectar:
+            with self._lock:
+                self._descartar()
+            print(f"⚠️ {self.falhas_consecutivas} falhas de conexão seguidas no Firestore, reconectando...")
+            self._acordar.set()
+
+    def status(self) -> dict:
+        """Resumo do estado da conexão (usado em /health/ready)"""
+        return {
+            "conectado": self.pronto,
+            "conectado_em": self.conectado_em,
+            "tentativas": self.tentativas,
+            "falhas_consecutivas": self.falhas_consecutivas,
+            "ultimo_erro": self.ultimo_erro,
+        }
+
+    # ----------------------------------------
+    # Conexão
+    # ----------------------------------------
+
+    def _laco_conexao(self):
+        """Tenta conectar até conseguir; depois aguarda um pedido de reconexão"""
+        while not self._parar.is_set():
+            if self._db is None:
+                try:
+                    self._conectar()
+                except Exception as e:
+                    self.tentativas += 1
+                    self.ultimo_erro = str(e)
+                    espera = self._calcular_backoff()
+                    print(f"❌ Erro ao conectar Firebase: {str(e)}")
+                    print(f"Nova tentativa em {espera:.1f}s (tentativa {self.tentativas})")
+                    self._parar.wait(espera)
+                    continue
+
+            self._acordar.wait()
+            self._acordar.clear()
+
+    def _calcular_backoff(self) -> float:
+        """Backoff exponencial com jitter para não sincronizar reconexões"""
+        espera = min(self.backoff_maximo, self.backoff_inicial * (2 ** (self.tentativas - 1)))
+        return espera * random.uniform(0.5, 1.0)
+
+    def _conectar(self):
+        """Importa o SDK, cria o cliente e faz uma leitura mínima de aquecimento"""
+        if not os.path.exists(self.cred_path):
+            raise FileNotFoundError(
+                f"Arquivo de credenciais não encontrado: {self.cred_path} "
+                f"(siga o guia docs/GUIA_RAPIDO.md para configurar)"
+            )
+
+        inicio = time.perf_counter()
+
+        # Import tardio: o SDK do Firebase/gRPC leva centenas de ms para carregar
+        import firebase_admin
+        from firebase_admin import credentials, firestore, firestore_async
+
+        with self._lock:
+            self._descartar()
+            cred = credentials.Certificate(self.cred_path)
+            app = firebase_admin.initialize_app(cred, name=f"telhado-{int(time.time() * 1000)}")
+            try:
+                db = firestore.client(app)
+                # Aquece o canal gRPC (DNS, TLS, autenticação) antes da 1ª requisição
+                list(db.collection('sensor_readings').limit(1).stream())
+                # O canal gRPC assíncrono é aberto no primeiro uso, já no event loop da API
+                db_async = firestore_async.client(app)
+            except Exception:
+                firebase_admin.delete_app(app)
+                raise
+
+            self._app = app
+            self._db = db
+            self._db_async = db_async
+
+        self.tentativas = 0
+        self.falhas_consecutivas = 0
+        self.ultimo_erro = None
+        self.conectado_em = datetime.now().isoformat()
+
+        print("=" * 60)
+        print(f"🔥 Firebase Firestore conectado com sucesso! ({time.perf_counter() - inicio:.2f}s)")
+        print("=" * 60)
+
+        if self.ao_conectar is not None:
+            try:
+                self.ao_conectar(db)
+            except Exception as e:
+                print(f"⚠️ Erro após conectar ao Firebase: {str(e)}")
+
+    def _descartar(self):
+        """Remove o cliente e o app atuais (chamar com o lock adquirido)"""
+        self._db = None
+        self._db_async = None
+        if self._app is not None:
+            import firebase_admin
+            try:
+                firebase_admin.delete_app(self._app)
+            except ValueError:
+                pass  # App já removido
+            self._app = None
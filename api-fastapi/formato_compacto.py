@@ -0,0 +1,168 @@
+"""
+Formato compacto (msgpack/CBOR) para leituras do ESP32
+Sistema de Monitoramento do Telhado Verde - UFSM
+
+O JSON enviado pelo firmware repete unidades e status em toda leitura e,
+na API, passa pela árvore de cinco modelos Pydantic. O formato compacto é
+um mapa plano com chaves curtas, codificado em msgpack ou CBOR:
+
+    {
+        "d": "ESP32_TELHADO_VERDE",   # device_id
+        "t": "2025-11-12T14:30:00",   # timestamp (ISO 8601)
+        "q": 1234,                    # seq (opcional)
+        "st": 22.3,                   # ds18b20.temperature  (°C)
+        "at": 25.8,                   # dht11.temperature    (°C)
+        "ah": 72.3,                   # dht11.humidity       (%)
+        "dist": 15.7,                 # hcsr04.distance      (cm)
+        "sm": 68.4,                   # hl69.soil_moisture   (%)
+        "raw": 2380,                  # hl69.raw_value       (0-4095)
+        "e": 0                        # bits de erro (opcional, ver BITS_ERRO)
+    }
+
+Unidades são implícitas e o status de cada sensor é "ok", exceto quando o
+bit correspondente em "e" está ligado ("error"). O decodificador monta
+diretamente o dicionário que seria gerado por `leitura_de_modelo()`, sem
+instanciar os modelos aninhados, com as mesmas regras de modelos.py:
+valores nas faixas físicas (FAIXAS_VALIDAS) e timestamp em ISO canônico.
+
+Autor: Equipe Projeto Integrador 4 - UFSM
+Data: 2025
+"""
+
+import math
+
+from campos_sensores import FAIXAS_VALIDAS, interpretar_timestamp
+
+TIPOS_MSGPACK = {"application/msgpack", "application/x-msgpack", "application/vnd.msgpack"}
+TIPOS_CBOR = {"application/cbor"}
+TIPOS_COMPACTOS = TIPOS_MSGPACK | TIPOS_CBOR
+
+# Chave curta -> (sensor, campo) no formato completo
+CAMPOS_COMPACTOS = {
+    "st": ("ds18b20", "temperature"),
+    "at": ("dht11", "temperature"),
+    "ah": ("dht11", "humidity"),
+    "dist": ("hcsr04", "distance"),
+    "sm": ("hl69", "soil_moisture"),
+}
+
+# Bit de erro de cada sensor no campo "e"
+BITS_ERRO = {"ds18b20": 1, "dht11": 2, "hcsr04": 4, "hl69": 8}
+
+# Unidades implícitas (mesmos valores padrão dos modelos Pydantic)
+UNIDADES_IMPLICITAS = {
+    "ds18b20": {"unit": "celsius"},
+    "dht11": {"unit_temp": "celsius", "unit_humidity": "percent"},
+    "hcsr04": {"unit": "cm"},
+    "hl69": {"unit": "percent"},
+}
+
+
+class FormatoNaoSuportado(Exception):
+    """Biblioteca de decodificação não instalada no servidor"""
+
+
+def decodificar_corpo(corpo: bytes, content_type: str):
+    """
+    Decodifica um corpo msgpack/CBOR (import tardio da biblioteca)
+
+    Raises:
+        ValueError: Se o corpo não puder ser decodificado
+        FormatoNaoSuportado: Se a biblioteca do formato não estiver instalada
+    """
+    if content_type in TIPOS_MSGPACK:
+        try:
+            import msgpack
+        except ImportError:
+            raise FormatoNaoSuportado("msgpack não instalado (pip install msgpack)")
+        try:
+            return msgpack.unpackb(corpo, raw=False, strict_map_key=True)
+        except Exception as e:
+            raise ValueError(f"msgpack inválido: {str(e)}")
+
+    try:
+        import cbor2
+    except ImportError:
+        raise FormatoNaoSuportado("cbor2 não instalado (pip install cbor2)")
+    try:
+        return cbor2.loads(corpo)
+    except Exception as e:
+        raise ValueError(f"CBOR inválido: {str(e)}")
+
+
+def _numero(mapa: dict, chave: str) -> float:
+    valor = mapa.get(chave)
+    if isinstance(valor, bool) or not isinstance(valor, (int, float)):
+        raise ValueError(f"Campo '{chave}' deve ser numérico")
+    if not math.isfinite(valor):  # Inclusive "dist" com o bit de erro do HC-SR04
+        raise ValueError(f"Campo '{chave}' deve ser um número finito: {valor}")
+    return float(valor)
+
+
+def _na_faixa(chave: str, nome: str, valor):
+    minimo, maximo = FAIXAS_VALIDAS[nome]
+    if not minimo <= valor <= maximo:  # NaN também é rejeitado
+        raise ValueError(f"Campo '{chave}' fora da faixa ({minimo:g} a {maximo:g}): {valor}")
+
+
+def decodificar_leitura_compacta(corpo: bytes, content_type: str) -> dict:
+    """
+    Decodifica e valida uma leitura no formato compacto
+
+    Args:
+        corpo (bytes): Corpo da requisição
+        content_type (str): Tipo de mídia já normalizado (sem parâmetros)
+
+    Returns:
+        dict: {"device_id", "timestamp", "seq", "sensors"} com `sensors` no
+            mesmo formato de `Sensors.model_dump()`
+
+    Raises:
+        ValueError: Se o corpo for inválido ou faltar algum campo
+        FormatoNaoSuportado: Se a biblioteca do formato não estiver instalada
+    """
+    mapa = decodificar_corpo(corpo, content_type)
+    if not isinstance(mapa, dict):
+        raise ValueError("A leitura compacta deve ser um mapa")
+    return leitura_de_mapa_compacto(mapa)
+
+
+def leitura_de_mapa_compacto(mapa: dict) -> dict:
+    """Valida um mapa compacto já decodificado (ver decodificar_leitura_compacta)"""
+    device_id = mapa.get("d")
+    if not isinstance(device_id, str) or not 1 <= len(device_id) <= 128:
+        raise ValueError("Campo 'd' (device_id) deve ser texto de 1 a 128 caracteres")
+    try:
+        timestamp = interpretar_timestamp(mapa.get("t")).isoformat()
+    except ValueError as e:
+        raise ValueError(f"Campo 't': {str(e)}")
+
+    seq = mapa.get("q")
+    if seq is not None and (isinstance(seq, bool) or not isinstance(seq, int) or seq < 0):
+        raise ValueError("Campo 'q' (seq) deve ser inteiro não negativo")
+
+    erros = mapa.get("e", 0)
+    if isinstance(erros, bool) or not isinstance(erros, int):
+        raise ValueError("Campo 'e' (bits de erro) deve ser inteiro")
+
+    raw = mapa.get("raw")
+    if isinstance(raw, bool) or not isinstance(raw, int):
+        raise ValueError("Campo 'raw' deve ser inteiro")
+
+    _na_faixa("raw", "hl69_raw_value", raw)
+
+    sensors = {sensor: dict(unidades) for sensor, unidades in UNIDADES_IMPLICITAS.items()}
+    for chave, (sensor, campo) in CAMPOS_COMPACTOS.items():
+        valor = sensors[sensor][campo] = _numero(mapa, chave)
+        if sensor != "hcsr04":
+            _na_faixa(chave, f"{sensor}_{campo}", valor)
+    sensors["hl69"]["raw_value"] = raw
+    for sensor, bit in BITS_ERRO.items():
+        sensors[sensor]["status"] = "error" if erros & bit else "ok"
+
+    # HC-SR04 fora do alcance (ex.: -1 sem eco): só o sensor fica com erro, como em modelos.py
+    minimo, maximo = FAIXAS_VALIDAS["hcsr04_distance"]
+    if not minimo <= sensors["hcsr04"]["distance"] <= maximo:
+        sensors["hcsr04"]["status"] = "error"
+
+    return {"device_id": device_id, "timestamp": timestamp, "seq": seq, "sensors": sensors}
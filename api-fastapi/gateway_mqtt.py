@@ -0,0 +1,332 @@
+"""
+Gateway de ingestão MQTT
+Sistema de Monitoramento do Telhado Verde - UFSM
+
+Alternativa ao POST /sensor-data: o ESP32 mantém uma conexão persistente
+com um broker MQTT e publica cada leitura (ou lote do buffer) em
+`telhado/{device_id}/readings` com QoS 1, sem abrir uma requisição HTTP
+por envio. A API assina `telhado/+/readings` e:
+
+- decodifica o payload: JSON (DadosSensor, ou lista) ou msgpack no
+  formato compacto do firmware (mapa, ou lista de mapas)
+- valida com os mesmos modelos de POST /sensor-data e /sensor-data/batch
+  e confere o device_id com o do tópico
+- acumula as leituras de várias mensagens e as grava juntas pelo mesmo
+  caminho do lote HTTP (deduplicação, anomalias, batches do Firestore)
+
+O PUBACK só é enviado depois que o lote foi gravado (confirmação manual):
+se a gravação falha, as mensagens ficam pendentes, o gateway tenta de novo
+com espera exponencial e, se a API cair, o broker as reentrega na próxima
+conexão (sessão persistente). Os IDs determinísticos tornam a reentrega
+inofensiva. Mensagens inválidas são confirmadas e descartadas, para não
+serem reentregues para sempre.
+
+Transportes: ClientePaho (broker real, biblioteca paho-mqtt, importada só
+quando usada) e BrokerLocal, um substituto em processo para testes e
+simulações sem broker.
+
+Autor: Equipe Projeto Integrador 4 - UFSM
+Data: 2025
+"""
+
+import asyncio
+import json
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from formato_compacto import decodificar_corpo, leitura_de_mapa_compacto
+from modelos import validar_itens
+
+TOPICO_LEITURAS = "telhado/+/readings"
+
+
+# ========================================
+# DECODIFICAÇÃO DAS MENSAGENS
+# ========================================
+
+def device_do_topico(topico: str) -> Optional[str]:
+    """device_id de "telhado/{device_id}/readings" (None se o tópico for outro)"""
+    partes = topico.split("/")
+    if len(partes) == 3 and partes[0] == "telhado" and partes[2] == "readings" and partes[1]:
+        return partes[1]
+    return None
+
+
+def decodificar_mensagem(topico: str, payload: bytes) -> Tuple[List[dict], List[dict]]:
+    """
+    Leituras validadas de uma mensagem
+
+    JSON começa com "{" ou "["; qualquer outro payload é tratado como
+    msgpack compacto. Itens no formato DadosSensor (com "sensors") passam
+    juntos por `validar_itens`, o mesmo caminho de POST /sensor-data/batch;
+    mapas compactos, por `leitura_de_mapa_compacto`. Como no lote HTTP, um
+    item inválido não impede o restante.
+
+    Returns:
+        tuple: (leituras válidas, [{"indice", "erro"}] dos itens rejeitados)
+
+    Raises:
+        ValueError: Tópico ou payload que não pode ser decodificado
+        FormatoNaoSuportado: msgpack não instalado
+    """
+    device_id = device_do_topico(topico)
+    if device_id is None:
+        raise ValueError(f"Tópico inesperado: {topico}")
+
+    if payload[:1] in (b"{", b"["):
+        itens = json.loads(payload)
+    else:
+        itens = decodificar_corpo(payload, "application/msgpack")
+    if not isinstance(itens, list):
+        itens = [itens]
+
+    completos = [indice for indice, item in enumerate(itens) if isinstance(item, dict) and "sensors" in item]
+    validas, rejeitadas = validar_itens([itens[indice] for indice in completos])
+    validas = [(completos[posicao], leitura) for posicao, leitura in validas]
+    rejeitadas = [{**rejeitada, "indice": completos[rejeitada["indice"]]} for rejeitada in rejeitadas]
+
+    for indice, item in enumerate(itens):
+        if isinstance(item, dict) and "sensors" in item:
+            continue
+        try:
+            if not isinstance(item, dict):
+                raise ValueError("A leitura deve ser um objeto/mapa")
+            validas.append((indice, leitura_de_mapa_compacto(item)))
+        except ValueError as e:
+            rejeitadas.append({"indice": indice, "erro": str(e)})
+
+    leituras = []
+    for indice, leitura in sorted(validas, key=lambda par: par[0]):
+        if leitura["device_id"] != device_id:
+            rejeitadas.append({
+                "indice": indice,
+                "erro": f"device_id {leitura['device_id']!r} diferente do tópico ({device_id!r})",
+            })
+        else:
+            leituras.append(leitura)
+    rejeitadas.sort(key=lambda rejeitada: rejeitada["indice"])
+    return leituras, rejeitadas
+
+
+# ========================================
+# GATEWAY (INDEPENDENTE DO TRANSPORTE)
+# ========================================
+
+class GatewayMQTT:
+    """
+    Acumula as leituras recebidas e as grava em lotes, confirmando depois
+
+    O lote é gravado ao atingir `max_lote` leituras ou `intervalo` segundos
+    depois da primeira mensagem pendente. Após uma falha, só a nova
+    tentativa agendada grava (as mensagens novas apenas aguardam).
+
+    Args:
+        ingerir (callable): async (leituras) -> None; grava o lote ou levanta exceção
+        max_lote (int): Leituras por gravação
+        intervalo (float): Espera máxima de uma leitura antes da gravação, em segundos
+        backoff_maximo (float): Maior espera entre tentativas após falha
+    """
+
+    def __init__(self, ingerir: Callable[[List[dict]], Awaitable[None]], max_lote: int = 100,
+                 intervalo: float = 0.5, backoff_maximo: float = 30.0):
+        self.ingerir = ingerir
+        self.max_lote = max_lote
+        self.intervalo = intervalo
+        self.backoff_maximo = backoff_maximo
+        self._pendentes = []  # [(leituras, confirmar)] na ordem de chegada
+        self._leituras_pendentes = 0
+        self._trava = asyncio.Lock()
+        self._agendado = None
+        self._falhas_seguidas = 0
+
+        # Estatísticas
+        self.mensagens = 0
+        self.processadas = 0
+        self.rejeitadas = 0
+        self.lotes = 0
+        self.falhas = 0
+
+    async def receber(self, topico: str, payload: bytes, confirmar: Callable[[], None]):
+        """Trata uma mensagem; `confirmar` envia o PUBACK ao broker"""
+        self.mensagens += 1
+        try:
+            validas, rejeitadas = decodificar_mensagem(topico, payload)
+        except Exception as e:
+            validas, rejeitadas = [], [{"indice": None, "erro": str(e)}]
+        if rejeitadas:
+            self.rejeitadas += len(rejeitadas)
+            print(f"⚠️ MQTT {topico}: {len(rejeitadas)} leitura(s) rejeitada(s): {rejeitadas[0]['erro']}")
+        if not validas:
+            confirmar()  # Nada a gravar: descarta em vez de receber de novo
+            return
+
+        self._pendentes.append((validas, confirmar))
+        self._leituras_pendentes += len(validas)
+        if self._leituras_pendentes >= self.max_lote and not self._falhas_seguidas:
+            await self.descarregar()
+        else:
+            self._agendar(self.intervalo)
+
+    def _agendar(self, espera: float):
+        if self._agendado is None or self._agendado.done():
+            self._agendado = asyncio.ensure_future(self._descarregar_depois(espera))
+
+    async def _descarregar_depois(self, espera: float):
+        await asyncio.sleep(espera)
+        await self.descarregar()
+
+    async def descarregar(self):
+        """Grava tudo o que está pendente; em caso de falha, mantém e agenda nova tentativa"""
+        async with self._trava:
+            while self._pendentes:
+                # Mensagens inteiras, até max_lote leituras (ao menos uma mensagem)
+                lote, leituras = [], []
+                while self._pendentes and (not lote or len(leituras) + len(self._pendentes[0][0]) <= self.max_lote):
+                    lote.append(self._pendentes.pop(0))
+                    leituras.extend(lote[-1][0])
+                self._leituras_pendentes -= len(leituras)
+                try:
+                    await self.ingerir(leituras)
+                except Exception as e:
+                    # Volta para o início da fila, sem confirmar
+                    self._pendentes[:0] = lote
+                    self._leituras_pendentes += len(leituras)
+                    self.falhas += 1
+                    self._falhas_seguidas += 1
+                    espera = min(self.intervalo * 2 ** self._falhas_seguidas, self.backoff_maximo)
+                    print(f"❌ MQTT: falha ao gravar {len(leituras)} leituras ({str(e)}); nova tentativa em {espera:.1f}s")
+                    if self._agendado is not None and self._agendado is not asyncio.current_task():
+                        self._agendado.cancel()  # Substituída pela tentativa com espera
+                    self._agendado = None
+                    self._agendar(espera)
+                    return
+                self._falhas_seguidas = 0
+                self.lotes += 1
+                self.processadas += len(leituras)
+                for _, confirmar in lote:
+                    confirmar()
+
+    def estatisticas(self) -> dict:
+        return {
+            "mensagens": self.mensagens,
+            "leituras_processadas": self.processadas,
+            "leituras_rejeitadas": self.rejeitadas,
+            "lotes": self.lotes,
+            "falhas": self.falhas,
+            "pendentes": self._leituras_pendentes,
+        }
+
+
+# ========================================
+# TRANSPORTES
+# ========================================
+
+class ClientePaho:
+    """
+    Conexão com um broker real (paho-mqtt 2.x), em sessão persistente
+
+    A rede roda na thread do paho; cada mensagem é repassada ao event loop
+    da API. Com confirmação manual, o broker não envia mais do que a sua
+    janela de mensagens QoS 1 sem PUBACK: a gravação lenta segura a entrega
+    em vez de acumular leituras na memória.
+    """
+
+    def __init__(self, gateway: GatewayMQTT, host: str = "localhost", porta: int = 1883,
+                 client_id: str = "telhado-api", topico: str = TOPICO_LEITURAS,
+                 usuario: Optional[str] = None, senha: Optional[str] = None):
+        self.gateway = gateway
+        self.host = host
+        self.porta = porta
+        self.client_id = client_id
+        self.topico = topico
+        self.usuario = usuario
+        self.senha = senha
+        self._cliente = None
+
+    def iniciar(self, loop: asyncio.AbstractEventLoop):
+        try:
+            import paho.mqtt.client as mqtt
+        except ImportError:
+            raise RuntimeError("paho-mqtt não instalado (pip install paho-mqtt)")
+
+        cliente = mqtt.Client(
+            mqtt.CallbackAPIVersion.VERSION2, client_id=self.client_id, clean_session=False, manual_ack=True,
+        )
+        if self.usuario:
+            cliente.username_pw_set(self.usuario, self.senha)
+        cliente.reconnect_delay_set(min_delay=1, max_delay=60)
+
+        def ao_conectar(cliente, _userdata, _flags, codigo, _propriedades):
+            if codigo.is_failure:
+                print(f"❌ MQTT: conexão recusada pelo broker ({codigo})")
+                return
+            cliente.subscribe(self.topico, qos=1)
+            print(f"✅ MQTT: conectado a {self.host}:{self.porta}, assinando {self.topico}")
+
+        def ao_receber(cliente, _userdata, mensagem):
+            def confirmar(mid=mensagem.mid, qos=mensagem.qos):
+                cliente.ack(mid, qos)
+            asyncio.run_coroutine_threadsafe(
+                self.gateway.receber(mensagem.topic, mensagem.payload, confirmar), loop
+            )
+
+        cliente.on_connect = ao_conectar
+        cliente.on_message = ao_receber
+        cliente.connect_async(self.host, self.porta, keepalive=60)
+        cliente.loop_start()
+        self._cliente = cliente
+
+    def parar(self):
+        if self._cliente is not None:
+            self._cliente.disconnect()
+            self._cliente.loop_stop()
+            self._cliente = None
+
+
+class BrokerLocal:
+    """
+    Substituto do broker em processo (testes e simulações sem rede)
+
+    Entrega cada publicação às assinaturas cujo filtro combina com o tópico
+    (curingas + e #). Mensagens QoS 1 ficam pendentes até a confirmação;
+    reentregar() simula a reconexão de um assinante com sessão persistente.
+    """
+
+    def __init__(self):
+        self._assinaturas = []  # [(filtro, callback async (topico, payload, confirmar))]
+        self._pendentes = {}  # mid -> (callback, topico, payload)
+        self._proximo_mid = 1
+
+    def assinar(self, filtro: str, callback):
+        self._assinaturas.append((filtro, callback))
+
+    async def publicar(self, topico: str, payload: bytes, qos: int = 1):
+        for filtro, callback in self._assinaturas:
+            if topico_combina(filtro, topico):
+                await self._entregar(callback, topico, payload, qos)
+
+    async def _entregar(self, callback, topico: str, payload: bytes, qos: int):
+        mid, self._proximo_mid = self._proximo_mid, self._proximo_mid + 1
+        if qos:
+            self._pendentes[mid] = (callback, topico, payload)
+        await callback(topico, payload, lambda: self._pendentes.pop(mid, None))
+
+    async def reentregar(self):
+        """Entrega de novo as mensagens QoS 1 ainda não confirmadas"""
+        pendentes, self._pendentes = self._pendentes, {}
+        for callback, topico, payload in pendentes.values():
+            await self._entregar(callback, topico, payload, 1)
+
+    @property
+    def nao_confirmadas(self) -> int:
+        return len(self._pendentes)
+
+
+def topico_combina(filtro: str, topico: str) -> bool:
+    """Filtro de assinatura MQTT (+ = um nível, # = o restante)"""
+    partes_filtro, partes_topico = filtro.split("/"), topico.split("/")
+    for indice, parte in enumerate(partes_filtro):
+        if parte == "#":
+            return True
+        if indice >= len(partes_topico) or (parte != "+" and parte != partes_topico[indice]):
+            return False
+    return len(partes_filtro) == len(partes_topico)
@@ -0,0 +1,205 @@
+"""
+Intervalo de leitura recomendado por dispositivo (amostragem adaptativa)
+Sistema de Monitoramento do Telhado Verde - UFSM
+
+O firmware lia a cada 30 s fixos, inclusive de madrugada, quando umidade do
+solo e nível do reservatório quase não mudam. A resposta de POST
+/sensor-data passa a trazer `intervalo_recomendado_ms`, e o ESP32 usa esse
+valor como próximo intervalo de leitura.
+
+O intervalo de cada dispositivo vem da variabilidade recente dele:
+
+- para cada campo com tolerância configurada, a taxa de variação entre
+  leituras seguidas é medida em "tolerâncias por segundo"
+- a taxa sobe na hora (chuva, irrigação) e desce devagar, por média móvel
+  exponencial (EWMA)
+- intervalo ideal = 1 / maior taxa, ou seja, o tempo para o campo mais
+  agitado variar uma tolerância, limitado a [minimo, maximo]; ele encurta
+  na hora, mas cresce no máximo 2x por leitura
+
+Um orçamento global de leituras por dia vale para todos os dispositivos
+ativos juntos. Se a soma das taxas ideais passar do orçamento, todos os
+intervalos crescem na mesma proporção, até o máximo.
+
+O eixo do tempo é o timestamp do ESP32, de modo que leituras de um lote
+acumulado no buffer contam com o espaçamento real da coleta. Valores com
+status de erro ou marcados como anomalia ficam de fora.
+
+Autor: Equipe Projeto Integrador 4 - UFSM
+Data: 2025
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from campos_sensores import NOMES_CAMPOS, extrair_valores
+from reamostragem import instante_da_leitura
+
+# Variação considerada relevante em cada campo (unidades do próprio campo)
+TOLERANCIAS_PADRAO = "hl69.soil_moisture=1,hcsr04.distance=1,dht11.temperature=0.5,dht11.humidity=2,ds18b20.temperature=0.25"
+
+
+def interpretar_tolerancias(texto: str) -> Dict[str, float]:
+    """
+    Converte INTERVALO_TOLERANCIAS ("sensor.campo=valor,...") em {"sensor_campo": valor}
+
+    Raises:
+        ValueError: Se o formato for inválido, o campo for desconhecido ou
+            a tolerância não for positiva
+    """
+    tolerancias = {}
+    for item in texto.split(","):
+        if not item.strip():
+            continue
+        campo, separador, valor = item.partition("=")
+        nome = campo.strip().replace(".", "_", 1)
+        if not separador or nome not in NOMES_CAMPOS:
+            raise ValueError(f"Tolerância inválida: '{item}' (use sensor.campo=valor)")
+        tolerancias[nome] = float(valor)
+        if tolerancias[nome] <= 0:
+            raise ValueError(f"Tolerância deve ser positiva: '{item}'")
+    return tolerancias
+
+
+class EstadoDispositivo:
+    """Última leitura e taxa de variação suavizada de cada campo"""
+
+    __slots__ = ("anteriores", "taxas", "ideal", "visto_em")
+
+    def __init__(self):
+        self.anteriores = {}  # campo -> (instante, valor)
+        self.taxas = {}       # campo -> EWMA da taxa, em tolerâncias por segundo
+        self.ideal = None     # intervalo ideal em segundos (None = sem estimativa)
+        self.visto_em = 0.0   # time.monotonic() da última leitura
+
+
+class ControladorIntervalo:
+    """
+    Intervalo recomendado por dispositivo, dentro do orçamento global de ingestão
+
+    Args:
+        minimo, maximo (float): Limites do intervalo, em segundos
+        padrao (float): Intervalo enquanto não há duas leituras do dispositivo
+        orcamento_diario (float): Leituras por dia somando todos os
+            dispositivos ativos (0 = sem orçamento)
+        tolerancias (dict): {"sensor_campo": variação relevante}
+        alfa (float): Peso da taxa nova na EWMA quando a variação diminui
+        max_dispositivos (int): Estados mantidos; os mais antigos são descartados
+    """
+
+    def __init__(self, minimo: float = 15.0, maximo: float = 300.0, padrao: float = 30.0,
+                 orcamento_diario: float = 0.0, tolerancias: Optional[Dict[str, float]] = None,
+                 alfa: float = 0.3, max_dispositivos: int = 10000):
+        self.minimo = minimo
+        self.maximo = max(maximo, minimo)
+        self.padrao = min(max(padrao, minimo), self.maximo)
+        self.orcamento = orcamento_diario / 86400.0  # leituras por segundo
+        self.tolerancias = tolerancias if tolerancias is not None else interpretar_tolerancias(TOLERANCIAS_PADRAO)
+        self.alfa = alfa
+        self.max_dispositivos = max_dispositivos
+        # Sem leitura há 2 intervalos máximos, o dispositivo sai da conta do orçamento
+        self.ativo_por = 2 * self.maximo
+
+        self._estados = OrderedDict()  # device_id -> EstadoDispositivo
+        self._demanda = 0.0            # soma de 1/ideal dos dispositivos ativos
+        self._limpo_em = time.monotonic()
+        self._lock = threading.Lock()
+
+    def observar(self, leitura: dict):
+        """Atualiza a variabilidade do dispositivo com uma leitura já gravada"""
+        instante = instante_da_leitura(leitura)
+        if math.isnan(instante):
+            instante = time.time()
+        sensors = leitura.get("sensors") or {}
+        anomalos = {rotulo.split(":", 1)[0] for rotulo in leitura.get("anomalias") or []}
+
+        with self._lock:
+            estado, contado = self._estado(leitura["device_id"])
+            for nome, valor in extrair_valores(sensors).items():
+                tolerancia = self.tolerancias.get(nome)
+                sensor = nome.split("_", 1)[0]
+                if tolerancia is None or nome in anomalos or (sensors.get(sensor) or {}).get("status", "ok") != "ok":
+                    continue
+                anterior = estado.anteriores.get(nome)
+                if anterior is not None and instante <= anterior[0]:
+                    continue  # Leitura antiga (reenvio fora de ordem)
+                estado.anteriores[nome] = (instante, valor)
+                if anterior is None:
+                    continue
+                taxa = abs(valor - anterior[1]) / (instante - anterior[0]) / tolerancia
+                atual = estado.taxas.get(nome)
+                # Sobe na hora, desce pela EWMA: o intervalo encurta no início da chuva
+                estado.taxas[nome] = taxa if atual is None or taxa > atual else atual + self.alfa * (taxa - atual)
+
+            if estado.taxas:
+                taxa = max(estado.taxas.values())
+                ideal = min(max(1.0 / taxa, self.minimo), self.maximo) if taxa > 0 else self.maximo
+                # Cresce no máximo 2x por leitura (encurtar continua imediato)
+                ideal = min(ideal, 2 * (estado.ideal or self.padrao))
+                self._demanda += 1.0 / ideal - (1.0 / estado.ideal if contado else 0.0)
+                estado.ideal = ideal
+
+    def recomendar(self, device_id: str) -> int:
+        """Próximo intervalo de leitura do dispositivo, em milissegundos"""
+        with self._lock:
+            self._limpar_inativos()
+            estado = self._estados.get(device_id)
+            ideal = estado.ideal if estado is not None and estado.ideal else self.padrao
+            intervalo = min(ideal * self.fator_orcamento, self.maximo)
+        return int(round(intervalo)) * 1000
+
+    @property
+    def fator_orcamento(self) -> float:
+        """Quanto os intervalos ideais são esticados para caber no orçamento (>= 1)"""
+        if self.orcamento <= 0:
+            return 1.0
+        return max(1.0, self._demanda / self.orcamento)
+
+    def _estado(self, device_id: str):
+        """Estado do dispositivo e se o intervalo ideal dele já estava na demanda"""
+        estado = self._estados.get(device_id)
+        if estado is None:
+            estado = self._estados[device_id] = EstadoDispositivo()
+            if len(self._estados) > self.max_dispositivos:
+                _, removido = self._estados.popitem(last=False)
+                self._descontar(removido)
+        else:
+            self._estados.move_to_end(device_id)
+        contado = bool(estado.ideal) and self._ativo(estado)
+        estado.visto_em = time.monotonic()
+        return estado, contado
+
+    def _ativo(self, estado: EstadoDispositivo) -> bool:
+        return time.monotonic() - estado.visto_em < self.ativo_por
+
+    def _descontar(self, estado: EstadoDispositivo):
+        if estado.ideal and self._ativo(estado):
+            self._demanda -= 1.0 / estado.ideal
+
+    def _limpar_inativos(self):
+        """
+        Recalcula a demanda só com os dispositivos ativos (no máximo a cada ativo_por / 10)
+
+        Entre os recálculos a demanda é mantida de forma incremental em
+        `observar` e pode ficar levemente defasada.
+        """
+        agora = time.monotonic()
+        if agora - self._limpo_em < self.ativo_por / 10:
+            return
+        self._limpo_em = agora
+        self._demanda = sum(1.0 / e.ideal for e in self._estados.values() if e.ideal and self._ativo(e))
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            self._limpar_inativos()
+            return {
+                "dispositivos_ativos": sum(1 for e in self._estados.values() if self._ativo(e)),
+                "minimo_segundos": self.minimo,
+                "maximo_segundos": self.maximo,
+                "demanda_leituras_dia": round(self._demanda * 86400),
+                "orcamento_leituras_dia": round(self.orcamento * 86400) or None,
+                "fator_orcamento": round(self.fator_orcamento, 3),
+            }
@@ -0,0 +1,113 @@
+"""
+Controle de admissão da ingestão (token bucket por dispositivo e por IP)
+Sistema de Monitoramento do Telhado Verde - UFSM
+
+Um ESP32 que perde o intervalo de leitura (READ_INTERVAL_MS) ou um script
+de demonstração apontado para produção pode inundar POST /sensor-data, e
+cada requisição vira uma escrita no Firestore. Cada chave (device_id ou IP
+do cliente) tem um balde de `rajada` fichas reabastecido a `taxa` fichas
+por segundo; a requisição sem ficha disponível recebe 429 com Retry-After
+antes de qualquer validação ou gravação.
+
+O device_id é extraído do corpo sem validar a leitura: uma busca no JSON
+ou a decodificação do mapa compacto (msgpack/CBOR), que é barata.
+
+Autor: Equipe Projeto Integrador 4 - UFSM
+Data: 2025
+"""
+
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Optional
+
+from formato_compacto import TIPOS_COMPACTOS, decodificar_corpo
+
+# Primeiro "device_id": "..." do corpo JSON (leitura única ou primeira do lote)
+_DEVICE_ID_JSON = re.compile(rb'"device_id"\s*:\s*"((?:[^"\\]|\\.){1,128})"')
+
+
+def device_id_do_corpo(corpo: bytes, content_type: str) -> Optional[str]:
+    """device_id da leitura (ou da primeira leitura do lote), sem validação"""
+    if content_type in TIPOS_COMPACTOS:
+        try:
+            dados = decodificar_corpo(corpo, content_type)
+        except Exception:
+            return None  # O erro de formato é respondido na validação
+        if isinstance(dados, list):
+            dados = dados[0] if dados else None
+        device_id = dados.get("d") if isinstance(dados, dict) else None
+        return device_id if isinstance(device_id, str) else None
+
+    encontrado = _DEVICE_ID_JSON.search(corpo)
+    return encontrado.group(1).decode("utf-8", "replace") if encontrado else None
+
+
+class LimitadorTaxa:
+    """
+    Baldes de fichas por chave, com contadores de bloqueio
+
+    Args:
+        taxa (float): Fichas repostas por segundo (0 = sem limite)
+        rajada (float): Capacidade do balde (requisições seguidas permitidas)
+        max_chaves (int): Baldes mantidos; os usados há mais tempo são descartados
+    """
+
+    def __init__(self, taxa: float, rajada: float, max_chaves: int = 10000):
+        self.taxa = taxa
+        self.rajada = max(rajada, 1.0)
+        self.max_chaves = max_chaves
+        self._baldes = OrderedDict()  # chave -> [fichas, último reabastecimento]
+        self._lock = threading.Lock()
+
+        self.permitidas = 0
+        self.bloqueadas = 0
+        self._bloqueios_por_chave = Counter()
+
+    @property
+    def ativo(self) -> bool:
+        return self.taxa > 0
+
+    def consumir(self, chave: str, custo: float = 1.0) -> float:
+        """
+        Retira `custo` fichas do balde da chave
+
+        Returns:
+            float: 0 se a requisição foi admitida; senão, segundos até haver
+                fichas suficientes (valor para o Retry-After)
+        """
+        if not self.ativo:
+            return 0.0
+        agora = time.monotonic()
+        with self._lock:
+            balde = self._baldes.get(chave)
+            if balde is None:
+                balde = self._baldes[chave] = [self.rajada, agora]
+                if len(self._baldes) > self.max_chaves:
+                    self._baldes.popitem(last=False)
+            else:
+                self._baldes.move_to_end(chave)
+                balde[0] = min(self.rajada, balde[0] + (agora - balde[1]) * self.taxa)
+                balde[1] = agora
+
+            if balde[0] >= custo:
+                balde[0] -= custo
+                self.permitidas += 1
+                return 0.0
+
+            self.bloqueadas += 1
+            self._bloqueios_por_chave[chave] += 1
+            if len(self._bloqueios_por_chave) > 1000:
+                self._bloqueios_por_chave = Counter(dict(self._bloqueios_por_chave.most_common(100)))
+            return (custo - balde[0]) / self.taxa
+
+    def status(self) -> dict:
+        return {
+            "taxa_por_segundo": self.taxa,
+            "rajada": self.rajada,
+            "permitidas": self.permitidas,
+            "bloqueadas": self.bloqueadas,
+            "baldes_ativos": len(self._baldes),
+            "mais_bloqueadas": dict(self._bloqueios_por_chave.most_common(10)),
+        }
@@ -0,0 +1,267 @@
+"""
+Métricas derivadas das leituras (reservatório, solo e telhado)
+Sistema de Monitoramento do Telhado Verde - UFSM
+
+As leituras guardam apenas os valores brutos dos sensores. Este módulo
+calcula, por dispositivo, as grandezas físicas que o dashboard e os
+relatórios usam:
+
+- volume_litros / nivel_percentual: volume de água no reservatório, a partir
+  da distância do HC-SR04 (sensor no topo, medindo até a lâmina d'água) e da
+  geometria do reservatório
+- taxa_umidade_solo: variação da umidade do solo do HL-69 em %/h (negativa
+  quando o substrato seca por evapotranspiração, positiva com chuva/irrigação)
+- amortecimento_termico: temperatura do ar (DHT11) menos a do telhado
+  (DS18B20), em °C; positiva quando o telhado verde está mais frio que o ar
+
+Valores de sensores com status diferente de "ok" ficam de fora (a métrica
+vira None), e a taxa de umidade usa a última leitura válida do solo.
+
+Há dois caminhos com o mesmo resultado:
+
+- `calcular_janela`: vetorizado (numpy) sobre uma janela de documentos já
+  gravados (GET /sensor-data/derivadas)
+- `CalculadoraIncremental`: uma leitura por vez na ingestão, mantendo por
+  dispositivo apenas a leitura anterior e uma janela recente em memória
+
+A geometria vem de RESERVATORIOS, ex.:
+    "*=cilindro:altura=30,diametro=40;ESP32_B=retangular:altura=25,largura=30,comprimento=50"
+onde "*" vale para os dispositivos sem geometria própria (medidas em cm).
+
+Autor: Equipe Projeto Integrador 4 - UFSM
+Data: 2025
+"""
+
+import math
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+
+from reamostragem import instante_da_coleta
+
+# Séries devolvidas, na ordem das colunas da resposta
+METRICAS = ["volume_litros", "nivel_percentual", "taxa_umidade_solo", "amortecimento_termico"]
+
+
+# ========================================
+# GEOMETRIA DO RESERVATÓRIO
+# ========================================
+
+class Reservatorio:
+    """
+    Reservatório com seção constante (cilindro ou retangular)
+
+    Args:
+        altura (float): Distância do sensor ao fundo, em cm
+        area (float): Área da seção horizontal, em cm²
+    """
+
+    __slots__ = ("altura", "area")
+
+    def __init__(self, altura: float, area: float):
+        if altura <= 0 or area <= 0:
+            raise ValueError("Altura e área do reservatório devem ser positivas")
+        self.altura = altura
+        self.area = area
+
+    @property
+    def capacidade_litros(self) -> float:
+        return self.area * self.altura / 1000  # cm³ -> L
+
+    def nivel_cm(self, distancia: float) -> float:
+        """Altura da lâmina d'água, limitada a [0, altura]"""
+        return min(max(self.altura - distancia, 0.0), self.altura)
+
+
+def interpretar_reservatorio(texto: str) -> Reservatorio:
+    """
+    Converte "cilindro:altura=30,diametro=40" ou
+    "retangular:altura=25,largura=30,comprimento=50" em Reservatorio
+    """
+    formato, _, medidas = texto.strip().partition(":")
+    try:
+        valores = {
+            nome.strip(): float(valor)
+            for nome, _, valor in (item.partition("=") for item in medidas.split(",") if item.strip())
+        }
+        if formato == "cilindro":
+            return Reservatorio(valores["altura"], math.pi * (valores["diametro"] / 2) ** 2)
+        if formato == "retangular":
+            return Reservatorio(valores["altura"], valores["largura"] * valores["comprimento"])
+    except KeyError as e:
+        raise ValueError(f"Medida ausente no reservatório '{texto}': {e.args[0]}")
+    raise ValueError(f"Formato de reservatório desconhecido: '{formato}' (use cilindro ou retangular)")
+
+
+def interpretar_reservatorios(texto: str) -> Dict[str, Reservatorio]:
+    """Converte RESERVATORIOS ("dispositivo=geometria;...") em {device_id ou "*": Reservatorio}"""
+    reservatorios = {}
+    for item in texto.split(";"):
+        if not item.strip():
+            continue
+        device_id, separador, geometria = item.partition("=")
+        if not separador:
+            raise ValueError(f"Reservatório sem dispositivo: '{item}' (use dispositivo=geometria ou *=geometria)")
+        reservatorios[device_id.strip()] = interpretar_reservatorio(geometria)
+    return reservatorios
+
+
+# ========================================
+# CÁLCULO VETORIZADO SOBRE UMA JANELA
+# ========================================
+
+def _segundos(timestamp) -> float:
+    """Instante da leitura em segundos (timestamps sem fuso estão em FUSO_FIRMWARE)"""
+    return instante_da_coleta(timestamp)
+
+
+def _valor(sensors: dict, sensor: str, campo: str) -> float:
+    """Valor numérico do campo; NaN se ausente ou se o sensor não estiver com status "ok" (como em anomalias.py)"""
+    leitura = sensors.get(sensor) or {}
+    if leitura.get("status", "ok") != "ok":
+        return math.nan  # Ex.: HC-SR04 sem eco envia distance -1; DHT11/DS18B20 com falha, 0.0
+    valor = leitura.get(campo)
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return float(valor)
+    return math.nan
+
+
+def calcular_janela(documentos: List[dict], reservatorios: Dict[str, Reservatorio]) -> Dict[str, dict]:
+    """
+    Métricas derivadas de uma janela de leituras, por dispositivo
+
+    Args:
+        documentos (list): Leituras (brutas, agregadas ou do arquivo frio) em
+            qualquer ordem
+        reservatorios (dict): Geometria por dispositivo ("*" = padrão)
+
+    Returns:
+        dict: {device_id: {"timestamp": [...], "volume_litros": [...], ...}}
+            em ordem cronológica (pelo timestamp do dispositivo), com None
+            onde a métrica não pode ser calculada
+    """
+    import numpy as np  # Import tardio: só usado por esta consulta
+
+    por_dispositivo = {}
+    for documento in documentos:
+        por_dispositivo.setdefault(documento.get("device_id"), []).append(documento)
+
+    series = {}
+    for device_id, docs in por_dispositivo.items():
+        sensors = [d.get("sensors") or {} for d in docs]
+        instantes = np.array([_segundos(d.get("timestamp") or d.get("timestamp_recebido")) for d in docs])
+        ordem = np.argsort(instantes, kind="stable")
+        instantes = instantes[ordem]
+        distancia = np.array([_valor(s, "hcsr04", "distance") for s in sensors])[ordem]
+        umidade_solo = np.array([_valor(s, "hl69", "soil_moisture") for s in sensors])[ordem]
+        temp_ar = np.array([_valor(s, "dht11", "temperature") for s in sensors])[ordem]
+        temp_telhado = np.array([_valor(s, "ds18b20", "temperature") for s in sensors])[ordem]
+
+        reservatorio = reservatorios.get(device_id) or reservatorios.get("*")
+        if reservatorio is not None:
+            nivel = np.clip(reservatorio.altura - distancia, 0.0, reservatorio.altura)
+            volume = nivel * reservatorio.area / 1000
+            percentual = nivel / reservatorio.altura * 100
+        else:
+            volume = percentual = np.full(len(docs), np.nan)
+
+        # Diferença para a leitura válida anterior do mesmo dispositivo, em %/h
+        taxa = np.full(len(docs), np.nan)
+        validas = np.flatnonzero(~np.isnan(instantes) & ~np.isnan(umidade_solo))
+        if len(validas) > 1:
+            intervalo_h = np.diff(instantes[validas]) / 3600
+            with np.errstate(divide="ignore", invalid="ignore"):
+                taxa[validas[1:]] = np.where(intervalo_h > 0, np.diff(umidade_solo[validas]) / intervalo_h, np.nan)
+
+        colunas = {
+            "volume_litros": volume,
+            "nivel_percentual": percentual,
+            "taxa_umidade_solo": taxa,
+            "amortecimento_termico": temp_ar - temp_telhado,
+        }
+        series[device_id] = {
+            "timestamp": [docs[i].get("timestamp") for i in ordem],
+            **{nome: _lista(colunas[nome]) for nome in METRICAS},
+        }
+    return series
+
+
+def _lista(valores) -> list:
+    """Array numpy -> lista JSON (NaN vira None), arredondada a 4 casas"""
+    return [None if math.isnan(v) else round(v, 4) for v in valores.tolist()]
+
+
+# ========================================
+# CÁLCULO INCREMENTAL NA INGESTÃO
+# ========================================
+
+class CalculadoraIncremental:
+    """
+    Calcula as métricas de cada leitura recebida e guarda as mais recentes
+
+    Por dispositivo, mantém a leitura anterior (para a taxa de umidade do
+    solo) e as últimas `tamanho_janela` métricas, servidas por
+    GET /sensor-data/derivadas sem consultar o Firestore.
+
+    As leituras devem chegar em ordem por dispositivo (como no detector de
+    anomalias); uma leitura mais antiga que a anterior não gera taxa.
+
+    Args:
+        reservatorios (dict): Geometria por dispositivo ("*" = padrão)
+        tamanho_janela (int): Métricas guardadas por dispositivo
+    """
+
+    def __init__(self, reservatorios: Dict[str, Reservatorio], tamanho_janela: int = 500):
+        self.reservatorios = reservatorios
+        self.tamanho_janela = tamanho_janela
+        self._anteriores = {}  # device_id -> (segundos, umidade do solo)
+        self._janelas = {}  # device_id -> deque de métricas
+        self._lock = threading.Lock()
+
+    def atualizar(self, leitura: dict) -> dict:
+        """Métricas derivadas de uma leitura, registradas na janela do dispositivo"""
+        device_id = leitura["device_id"]
+        sensors = leitura.get("sensors") or {}
+        instante = _segundos(leitura.get("timestamp"))
+        umidade_solo = _valor(sensors, "hl69", "soil_moisture")
+        distancia = _valor(sensors, "hcsr04", "distance")
+
+        metricas = {"timestamp": leitura.get("timestamp")}
+        reservatorio = self.reservatorios.get(device_id) or self.reservatorios.get("*")
+        if reservatorio is not None and not math.isnan(distancia):
+            nivel = reservatorio.nivel_cm(distancia)
+            metricas["volume_litros"] = round(nivel * reservatorio.area / 1000, 4)
+            metricas["nivel_percentual"] = round(nivel / reservatorio.altura * 100, 4)
+        else:
+            metricas["volume_litros"] = metricas["nivel_percentual"] = None
+
+        with self._lock:
+            anterior = self._anteriores.get(device_id)
+            taxa = math.nan
+            # Leituras sem umidade válida não entram na taxa (a próxima usa a última válida)
+            if not math.isnan(instante) and not math.isnan(umidade_solo) and (anterior is None or instante > anterior[0]):
+                if anterior is not None:
+                    taxa = (umidade_solo - anterior[1]) / ((instante - anterior[0]) / 3600)
+                self._anteriores[device_id] = (instante, umidade_solo)
+
+            amortecimento = _valor(sensors, "dht11", "temperature") - _valor(sensors, "ds18b20", "temperature")
+            metricas["taxa_umidade_solo"] = None if math.isnan(taxa) else round(taxa, 4)
+            metricas["amortecimento_termico"] = None if math.isnan(amortecimento) else round(amortecimento, 4)
+
+            janela = self._janelas.get(device_id)
+            if janela is None:
+                janela = self._janelas[device_id] = deque(maxlen=self.tamanho_janela)
+            janela.append(metricas)
+        return metricas
+
+    def serie(self, device_id: str, limit: int) -> Optional[dict]:
+        """
+        Últimas `limit` métricas do dispositivo em colunas (ordem cronológica),
+        ou None se a janela em memória ainda não tiver `limit` leituras
+        """
+        with self._lock:
+            janela = self._janelas.get(device_id)
+            if janela is None or len(janela) < limit:
+                return None
+            recentes = list(janela)[-limit:]
+        return {coluna: [m[coluna] for m in recentes] for coluna in ["timestamp", *METRICAS]}
@@ -0,0 +1,198 @@
+"""
+Modelos de dados das leituras (Pydantic)
+Sistema de Monitoramento do Telhado Verde - UFSM
+
+Estrutura do JSON enviado pelo ESP32, usada na validação da API
+(POST /sensor-data e /sensor-data/batch) e das ferramentas em scripts/
+que importam leituras sem passar pela API.
+
+A validação é estrita e feita uma única vez, na ingestão:
+
+- números não são convertidos de texto nem de booleanos
+- cada campo numérico precisa estar na faixa física do sensor
+  (FAIXAS_VALIDAS); a exceção é a distância do HC-SR04, que só precisa
+  ser finita: fora do alcance (sem eco o firmware envia -1; o timeout do
+  eco permite até ~514 cm) o sensor passa a ter status "error" e o
+  restante da leitura é aceito
+- status é um de "ok", "warning" ou "error"
+- o timestamp precisa ser texto ISO 8601 (campos_sensores.interpretar_timestamp,
+  o mesmo parser do formato compacto) e é gravado no formato ISO canônico
+  (o mesmo do firmware, "2025-11-12T14:30:00")
+
+O validador compilado (TypeAdapter) fica em cache no módulo e é
+reaproveitado por todas as leituras, avulsas ou em lote.
+
+Autor: Equipe Projeto Integrador 4 - UFSM
+Data: 2025
+"""
+
+import json
+from datetime import datetime
+from enum import Enum
+from typing import Annotated, List, Optional, Tuple
+
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field, Strict, TypeAdapter, ValidationError, model_validator
+
+from campos_sensores import FAIXAS_VALIDAS, interpretar_timestamp
+
+
+def _faixa(nome: str, **kwargs):
+    """Field com os limites de FAIXAS_VALIDAS[nome] (verificados no pydantic-core)"""
+    minimo, maximo = FAIXAS_VALIDAS[nome]
+    return Field(ge=minimo, le=maximo, **kwargs)
+
+
+# ========================================
+# MODELOS DE DADOS (Pydantic)
+# ========================================
+# Define a estrutura esperada dos dados JSON recebidos do ESP32
+
+class StatusSensor(str, Enum):
+    """Status informado pelo firmware para cada sensor"""
+    OK = "ok"
+    WARNING = "warning"
+    ERROR = "error"
+
+
+# Texto -> enum (o modo estrito só aceitaria a instância do enum em dicionários)
+Status = Annotated[StatusSensor, Strict(False)]
+
+
+class ModeloEstrito(BaseModel):
+    """Base dos modelos: sem conversões implícitas; status gravado como texto"""
+    model_config = ConfigDict(strict=True, use_enum_values=True)
+
+
+class SensorDS18B20(ModeloEstrito):
+    """
+    Modelo para sensor de temperatura do solo DS18B20
+    - Sensor digital de temperatura
+    - Precisão: ±0.5°C
+    - Faixa: -55°C a 125°C
+    """
+    temperature: float = _faixa("ds18b20_temperature")  # Temperatura em graus Celsius
+    unit: str = "celsius"  # Unidade de medida
+    status: Status = "ok"  # Status do sensor (ok, warning, error)
+
+
+class SensorDHT11(ModeloEstrito):
+    """
+    Modelo para sensor de temperatura e umidade DHT11
+    - Sensor digital para ambiente
+    - Temperatura: -40°C a 80°C
+    - Umidade: 0% a 100%
+    """
+    temperature: float = _faixa("dht11_temperature")  # Temperatura do ar em Celsius
+    humidity: float = _faixa("dht11_humidity")  # Umidade relativa do ar em %
+    unit_temp: str = "celsius"
+    unit_humidity: str = "percent"
+    status: Status = "ok"
+
+class SensorHCSR04(ModeloEstrito):
+    """
+    Modelo para sensor ultrassônico HC-SR04
+    - Medição de distância por ultrassom
+    - Usado para medir nível de água no reservatório
+    - Alcance: 2cm a 400cm (fora dele, o sensor fica com status "error")
+    """
+    distance: float = Field(allow_inf_nan=False)  # Distância em centímetros (finita mesmo com status "error")
+    unit: str = "cm"
+    status: Status = "ok"
+
+    @model_validator(mode="after")
+    def _distancia_na_faixa(self):
+        # Rejeitar a leitura inteira perderia os outros sensores
+        minimo, maximo = FAIXAS_VALIDAS["hcsr04_distance"]
+        if not minimo <= self.distance <= maximo:
+            self.status = StatusSensor.ERROR.value
+        return self
+
+
+class SensorHL69(ModeloEstrito):
+    """
+    Modelo para sensor de umidade do solo HL-69
+    - Sensor analógico resistivo
+    - Mede umidade do solo: 0% a 100%
+    - Valor bruto: 0 a 4095 (ADC de 12 bits do ESP32)
+    """
+    soil_moisture: float = _faixa("hl69_soil_moisture")  # Umidade do solo em %
+    raw_value: int = _faixa("hl69_raw_value")  # Valor bruto analógico (0-4095)
+    unit: str = "percent"
+    status: Status = "ok"
+
+
+class Sensors(ModeloEstrito):
+    """
+    Conjunto completo de todos os sensores do sistema
+    Agrupa todas as leituras em uma única estrutura
+    """
+    ds18b20: SensorDS18B20
+    dht11: SensorDHT11
+    hcsr04: SensorHCSR04
+    hl69: SensorHL69
+
+
+class DadosSensor(ModeloEstrito):
+    """
+    Modelo principal de dados enviados pelo ESP32
+
+    Estrutura do JSON esperado:
+    {
+        "device_id": "ESP32_TELHADO_VERDE",
+        "timestamp": "2025-11-12T14:30:00",
+        "seq": 1234,  (opcional)
+        "sensors": { ... }
+    }
+    """
+    device_id: str = Field(min_length=1, max_length=128)  # Identificador único do dispositivo ESP32
+    timestamp: Annotated[datetime, BeforeValidator(interpretar_timestamp)]  # Timestamp da coleta (texto ISO 8601)
+    seq: Optional[int] = Field(default=None, ge=0)  # Número de sequência da leitura (opcional, usado na deduplicação)
+    sensors: Sensors  # Dados de todos os sensores
+
+
+# Validador compilado, reaproveitado em todas as requisições
+LEITURA = TypeAdapter(DadosSensor)
+
+
+def leitura_de_modelo(dados: DadosSensor) -> dict:
+    """Converte o modelo validado para o dicionário usado na gravação"""
+    return {
+        "device_id": dados.device_id,
+        "timestamp": dados.timestamp.isoformat(),  # Formato canônico (ID da leitura e gravação)
+        "seq": dados.seq,
+        "sensors": dados.sensors.model_dump()  # Converte Pydantic para dict
+    }
+
+
+def validar_lista_json(corpo: bytes) -> Tuple[List[Tuple[int, dict]], List[dict]]:
+    """
+    Valida uma lista JSON de leituras, separando os itens inválidos
+
+    O corpo é decodificado uma única vez e cada item passa pelo validador
+    em cache (LEITURA): um item inválido é rejeitado logo, sem revalidar o
+    restante do lote. Validar a lista inteira em uma chamada não foi mais
+    rápido com todos os itens válidos e, com inválidos, exigia decodificar
+    e validar o lote de novo (ver scripts/benchmark_validacao.py).
+
+    Returns:
+        tuple: ([(indice, leitura)], [{"indice", "erro"}])
+
+    Raises:
+        ValueError: Se o corpo não for JSON ou não for uma lista
+    """
+    itens = json.loads(corpo)  # JSONDecodeError é um ValueError
+    if not isinstance(itens, list):
+        raise ValueError("O lote deve ser uma lista de leituras")
+    return validar_itens(itens)
+
+
+def validar_itens(itens: list) -> Tuple[List[Tuple[int, dict]], List[dict]]:
+    """Mesmo que `validar_lista_json`, para uma lista já decodificada"""
+    validas, rejeitadas = [], []
+    for indice, item in enumerate(itens):
+        try:
+            validas.append((indice, leitura_de_modelo(LEITURA.validate_python(item))))
+        except ValidationError as e:
+            erro = e.errors(include_url=False, include_input=False, include_context=False)
+            rejeitadas.append({"indice": indice, "erro": erro})
+    return validas, rejeitadas
@@ -0,0 +1,302 @@
+"""
+Layout particionado das leituras por dispositivo e mês
+Sistema de Monitoramento do Telhado Verde - UFSM
+
+Com todas as leituras em `sensor_readings`, o índice de
+`timestamp_recebido` (sempre crescente) concentra as escritas de toda a
+frota no mesmo trecho do índice, e o Firestore passa a limitar as escritas
+a partir de algumas centenas por segundo. Neste layout cada dispositivo e
+mês tem sua própria subcoleção:
+
+    devices/{device_id}                              (marcador do dispositivo)
+    devices/{device_id}/readings/{aaaa-mm}           (marcador da partição)
+    devices/{device_id}/readings/{aaaa-mm}/leituras/{id}
+
+Os índices de uma subcoleção são independentes dos das outras, então a
+vazão de escrita cresce com o número de dispositivos. O ID do documento é o
+hash determinístico da leitura (deduplicacao.py), que já funciona como
+chave de espalhamento dentro da partição. Nenhum índice de grupo de
+coleções é usado, pois ele voltaria a reunir todas as partições em um
+único índice.
+
+O mês da partição vem do `timestamp` enviado pelo ESP32, para que o
+reenvio de uma leitura caia sempre no mesmo documento.
+
+Gravação e consulta têm versões para o AsyncClient (sufixo `_async`),
+usadas pelos endpoints; as consultas compartilham o mesmo gerador de
+passos (ver consultas.rodar).
+
+Autor: Equipe Projeto Integrador 4 - UFSM
+Data: 2025
+"""
+
+import threading
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from armazenamento import TAMANHO_MAXIMO_BATCH, agora_utc, id_da_leitura, montar_documento, para_datetime
+from consultas import CAMPO_TEMPO, Plano, rodar, rodar_async
+
+COLECAO_DISPOSITIVOS = "devices"
+SUBCOLECAO_MESES = "readings"
+SUBCOLECAO_LEITURAS = "leituras"
+
+
+def mes_da_leitura(leitura: dict) -> str:
+    """Partição "aaaa-mm" da leitura (horário do servidor se o timestamp for inválido)"""
+    try:
+        momento = datetime.fromisoformat(leitura["timestamp"])
+    except (TypeError, ValueError):
+        momento = agora_utc()
+    return momento.strftime("%Y-%m")
+
+
+def meses_possiveis(desde: Optional[datetime], ate: Optional[datetime]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Faixa de partições que podem ter leituras recebidas em [desde, ate)
+
+    Uma leitura é recebida depois de coletada, então as recebidas antes de
+    `ate` estão em meses <= mês de `ate`. Leituras enviadas em lote podem
+    chegar no mês seguinte ao da coleta, então a faixa começa um mês antes
+    de `desde`.
+    """
+    minimo = maximo = None
+    if desde:
+        minimo = f"{desde.year - 1}-12" if desde.month == 1 else f"{desde.year}-{desde.month - 1:02d}"
+    if ate:
+        maximo = ate.strftime("%Y-%m")
+    return minimo, maximo
+
+
+class LayoutParticionado:
+    """
+    Grava e consulta leituras nas partições devices/{id}/readings/{mes}
+
+    Os marcadores do dispositivo e do mês são gravados apenas na primeira
+    leitura de cada partição vista por este processo; eles permitem listar
+    as partições sem índices extras.
+    """
+
+    def __init__(self):
+        self._conhecidas = set()  # (device_id, mes) com marcador já gravado
+        self._lock = threading.Lock()
+
+    # ----------------------------------------
+    # Referências
+    # ----------------------------------------
+
+    def colecao(self, db, device_id: str, mes: str):
+        """Subcoleção de leituras de um dispositivo em um mês"""
+        return (
+            db.collection(COLECAO_DISPOSITIVOS).document(device_id)
+            .collection(SUBCOLECAO_MESES).document(mes)
+            .collection(SUBCOLECAO_LEITURAS)
+        )
+
+    def dispositivos(self, db) -> List[str]:
+        return sorted(doc.id for doc in db.collection(COLECAO_DISPOSITIVOS).stream())
+
+    def meses(self, db, device_id: str) -> List[str]:
+        """Partições de um dispositivo, da mais recente para a mais antiga"""
+        referencia = db.collection(COLECAO_DISPOSITIVOS).document(device_id).collection(SUBCOLECAO_MESES)
+        return sorted((doc.id for doc in referencia.stream()), reverse=True)
+
+    def colecoes(self, db, desde: Optional[datetime] = None, ate: Optional[datetime] = None) -> list:
+        """Subcoleções de leituras que podem ter dados recebidos em [desde, ate) (usado pela retenção)"""
+        minimo, maximo = meses_possiveis(desde, ate)
+        return [
+            self.colecao(db, device_id, mes)
+            for device_id in self.dispositivos(db)
+            for mes in self.meses(db, device_id)
+            if (minimo is None or mes >= minimo) and (maximo is None or mes <= maximo)
+        ]
+
+    def _marcadores(self, db, batch, leituras: List[dict]):
+        """Acrescenta ao batch os marcadores das partições ainda não vistas"""
+        with self._lock:
+            novas = {(l["device_id"], mes_da_leitura(l)) for l in leituras} - self._conhecidas
+        for device_id, mes in novas:
+            dispositivo = db.collection(COLECAO_DISPOSITIVOS).document(device_id)
+            batch.set(dispositivo, {"device_id": device_id}, merge=True)
+            batch.set(dispositivo.collection(SUBCOLECAO_MESES).document(mes),
+                      {"device_id": device_id, "mes": mes}, merge=True)
+        return novas
+
+    # ----------------------------------------
+    # Escrita
+    # ----------------------------------------
+
+    def criar(self, db, leitura: dict, doc_id: str, documento: dict):
+        """
+        Cria o documento da leitura na sua partição
+
+        Falha com AlreadyExists se a leitura já foi gravada (como create()).
+        """
+        referencia, batch, novas = self._preparar_criacao(db, leitura, doc_id, documento)
+        if not novas:
+            referencia.create(documento)
+            return
+        batch.commit()
+        with self._lock:
+            self._conhecidas |= novas
+
+    async def criar_async(self, db, leitura: dict, doc_id: str, documento: dict):
+        """Mesmo que `criar`, com o AsyncClient"""
+        referencia, batch, novas = self._preparar_criacao(db, leitura, doc_id, documento)
+        if not novas:
+            await referencia.create(documento)
+            return
+        await batch.commit()
+        with self._lock:
+            self._conhecidas |= novas
+
+    def _preparar_criacao(self, db, leitura: dict, doc_id: str, documento: dict):
+        """Referência do documento e, se a partição for nova, batch com marcadores + create"""
+        referencia = self.colecao(db, leitura["device_id"], mes_da_leitura(leitura)).document(doc_id)
+        batch = db.batch()
+        novas = self._marcadores(db, batch, [leitura])
+        if novas:
+            batch.create(referencia, documento)
+        return referencia, batch, novas
+
+    def gravar_lote(self, db, leituras: List[dict]) -> Tuple[List[str], List[str]]:
+        """Mesmo contrato de armazenamento.gravar_lote (create(), sem sobrescrever), nas partições"""
+        from google.api_core.exceptions import AlreadyExists  # SDK já carregado pelo cliente
+
+        gravados, duplicados = [], []
+        for parte, batch, novas in self._batches(db, self._documentos(leituras), criar=True):
+            try:
+                batch.commit()
+                with self._lock:
+                    self._conhecidas |= novas
+                gravados.extend(doc_id for doc_id, _ in parte)
+            except AlreadyExists:
+                for doc_id, documento in parte:
+                    try:
+                        self.criar(db, documento, doc_id, documento)
+                        gravados.append(doc_id)
+                    except AlreadyExists:
+                        duplicados.append(doc_id)
+        return gravados, duplicados
+
+    async def gravar_lote_async(self, db, leituras: List[dict]) -> Tuple[List[str], List[str]]:
+        """Mesmo que `gravar_lote`, com o AsyncClient"""
+        from google.api_core.exceptions import AlreadyExists  # SDK já carregado pelo cliente
+
+        gravados, duplicados = [], []
+        for parte, batch, novas in self._batches(db, self._documentos(leituras), criar=True):
+            try:
+                await batch.commit()
+                with self._lock:
+                    self._conhecidas |= novas
+                gravados.extend(doc_id for doc_id, _ in parte)
+            except AlreadyExists:
+                for doc_id, documento in parte:
+                    try:
+                        await self.criar_async(db, documento, doc_id, documento)
+                        gravados.append(doc_id)
+                    except AlreadyExists:
+                        duplicados.append(doc_id)
+        return gravados, duplicados
+
+    def _documentos(self, leituras: List[dict]) -> List[Tuple[str, dict]]:
+        recebido_em = agora_utc()
+        return [(id_da_leitura(l), montar_documento(l, recebido_em)) for l in leituras]
+
+    def gravar_documentos(self, db, documentos: List[Tuple[str, dict]]):
+        """
+        Grava documentos já montados [(doc_id, documento)] nas partições
+
+        Usa set(): regravar os mesmos documentos não os duplica (a migração
+        pode ser repetida).
+        """
+        for _, batch, novas in self._batches(db, documentos):
+            batch.commit()
+            with self._lock:
+                self._conhecidas |= novas
+
+    def _batches(self, db, documentos: List[Tuple[str, dict]], criar: bool = False):
+        """
+        Batches (ainda não enviados) com os documentos e os marcadores que cada um grava
+
+        Gera (documentos do batch, batch, partições novas). Com `criar`, os
+        documentos entram com create() em vez de set().
+        """
+        # Marcadores ocupam até 2 operações por leitura no batch
+        por_batch = TAMANHO_MAXIMO_BATCH // 3
+        for inicio in range(0, len(documentos), por_batch):
+            parte = documentos[inicio:inicio + por_batch]
+            batch = db.batch()
+            novas = self._marcadores(db, batch, [documento for _, documento in parte])
+            for doc_id, documento in parte:
+                particao = self.colecao(db, documento["device_id"], mes_da_leitura(documento))
+                if criar:
+                    batch.create(particao.document(doc_id), documento)
+                else:
+                    batch.set(particao.document(doc_id), documento)
+            yield parte, batch, novas
+
+    # ----------------------------------------
+    # Consulta
+    # ----------------------------------------
+
+    def consultar(self, db, limit: int, device_id: Optional[str] = None,
+                  desde: Optional[datetime] = None, ate: Optional[datetime] = None) -> Tuple[List[dict], Plano]:
+        """
+        Leituras mais recentes (por timestamp_recebido), como GET /sensor-data
+
+        Com device_id, lê as partições do dispositivo da mais recente para a
+        mais antiga. Ao completar `limit`, lê mais uma partição: leituras
+        enviadas em lote podem chegar no mês seguinte ao da coleta. Sem
+        device_id, faz o mesmo para cada dispositivo e junta os resultados.
+
+        Returns:
+            tuple: (documentos do mais recente para o mais antigo, plano usado)
+        """
+        return rodar(self._passos_consulta(db, limit, device_id, desde, ate))
+
+    async def consultar_async(self, db, limit: int, device_id: Optional[str] = None,
+                              desde: Optional[datetime] = None, ate: Optional[datetime] = None) -> Tuple[List[dict], Plano]:
+        """Mesmo que `consultar`, com o AsyncClient"""
+        return await rodar_async(self._passos_consulta(db, limit, device_id, desde, ate))
+
+    def _passos_consulta(self, db, limit, device_id, desde, ate):
+        if device_id:
+            resultados, lidas = yield from self._passos_dispositivo(db, device_id, limit, desde, ate)
+            return resultados, Plano("particao_dispositivo", None, lidas)
+
+        resultados, lidas = [], 0
+        for doc in sorted((yield db.collection(COLECAO_DISPOSITIVOS)), key=lambda d: d.id):
+            parciais, n = yield from self._passos_dispositivo(db, doc.id, limit, desde, ate)
+            resultados.extend(parciais)
+            lidas += n
+        resultados.sort(key=lambda d: para_datetime(d[CAMPO_TEMPO]), reverse=True)
+        return resultados[:limit], Plano("particoes_todos_dispositivos", None, lidas)
+
+    def _passos_dispositivo(self, db, device_id: str, limit: int,
+                            desde: Optional[datetime], ate: Optional[datetime]):
+        minimo, maximo = meses_possiveis(desde, ate)
+        particoes = yield db.collection(COLECAO_DISPOSITIVOS).document(device_id).collection(SUBCOLECAO_MESES)
+
+        resultados, lidas, completo = [], 0, False
+        for mes in sorted((doc.id for doc in particoes), reverse=True):
+            if maximo and mes > maximo:
+                continue
+            if minimo and mes < minimo:
+                break
+            query = self.colecao(db, device_id, mes)
+            if desde:
+                query = query.where(CAMPO_TEMPO, ">=", desde)
+            if ate:
+                query = query.where(CAMPO_TEMPO, "<", ate)
+            for doc in (yield query.order_by(CAMPO_TEMPO, direction="DESCENDING").limit(limit)):
+                dados = doc.to_dict()
+                dados["id"] = doc.id  # Adiciona o ID do documento Firestore
+                resultados.append(dados)
+                lidas += 1
+            if completo:
+                break
+            completo = len(resultados) >= limit  # Lê mais uma partição e para
+
+        resultados.sort(key=lambda d: para_datetime(d[CAMPO_TEMPO]), reverse=True)
+        return resultados[:limit], lidas
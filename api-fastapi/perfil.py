@@ -0,0 +1,269 @@
+"""
+Perfil de desempenho das requisições (amostrado e opcional)
+Sistema de Monitoramento do Telhado Verde - UFSM
+
+Com PERFIL_ATIVO=1, 1 a cada PERFIL_AMOSTRAGEM requisições é rastreada:
+os trechos marcados com `span()` (validacao, serializacao, armazenamento,
+log) e o envio da resposta são cronometrados e guardados em um buffer
+circular em memória, consultado em GET /debug/profile.
+
+Sob demanda, GET /debug/profile?segundos=N captura o que o event loop da
+API executa durante N segundos:
+
+- formato=folded: pilhas amostradas a cada milissegundo no formato
+  "f1;f2;f3 contagem" (flamegraph.pl, speedscope, inferno)
+- formato=cprofile: tabela do cProfile ordenada pelo tempo acumulado
+
+Com o perfil desativado o middleware nem é instalado e `span()` devolve
+um contexto vazio compartilhado: o custo é uma leitura de ContextVar.
+
+Autor: Equipe Projeto Integrador 4 - UFSM
+Data: 2025
+"""
+
+import contextlib
+import functools
+import io
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from typing import Optional
+
+# Trace da requisição amostrada em andamento (None = não amostrada)
+_trace_atual: ContextVar[Optional[dict]] = ContextVar("trace_perfil", default=None)
+
+_NULO = contextlib.nullcontext()
+
+# Chave interna: instante em que o endpoint retornou (início de "resposta")
+_FIM_ENDPOINT = "_fim_endpoint"
+
+
+class _Span:
+    __slots__ = ("trace", "nome", "inicio")
+
+    def __init__(self, trace: dict, nome: str):
+        self.trace = trace
+        self.nome = nome
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+
+    def __exit__(self, *erro):
+        self.trace[self.nome] = self.trace.get(self.nome, 0.0) + time.perf_counter() - self.inicio
+
+
+def span(nome: str):
+    """Cronometra um trecho da requisição amostrada (sem efeito nas demais)"""
+    trace = _trace_atual.get()
+    if trace is None:
+        return _NULO
+    return _Span(trace, nome)
+
+
+class CapturaEmAndamento(Exception):
+    """Já existe uma captura sob demanda rodando"""
+
+
+class Perfilador:
+    """
+    Amostragem de requisições e buffer circular de traces
+
+    Args:
+        ativo (bool): Instala o middleware e aceita capturas sob demanda
+        amostragem (int): Rastreia 1 a cada N requisições
+        capacidade (int): Traces guardados no buffer circular
+    """
+
+    def __init__(self, ativo: bool = False, amostragem: int = 100, capacidade: int = 1000):
+        self.ativo = ativo
+        self.amostragem = max(1, amostragem)
+        self.traces = deque(maxlen=capacidade)
+        self._contador = 0
+        self._capturando = False
+
+    def sortear(self) -> bool:
+        self._contador += 1
+        return self._contador % self.amostragem == 0
+
+    # ----------------------------------------
+    # Integração com a aplicação
+    # ----------------------------------------
+
+    def instalar(self, app):
+        """Adiciona o middleware de amostragem (somente se ativo)"""
+        if self.ativo:
+            app.add_middleware(MiddlewarePerfil, perfilador=self)
+
+    def endpoint(self, funcao):
+        """
+        Marca o fim do endpoint; o restante até o último byte é o span "resposta"
+        (serialização do FastAPI e envio). Sem efeito com o perfil desativado.
+        """
+        if not self.ativo:
+            return funcao
+
+        @functools.wraps(funcao)
+        async def medido(*args, **kwargs):
+            try:
+                return await funcao(*args, **kwargs)
+            finally:
+                trace = _trace_atual.get()
+                if trace is not None:
+                    trace[_FIM_ENDPOINT] = time.perf_counter()
+
+        return medido
+
+    def registrar(self, metodo: str, rota: str, status: Optional[int], total: float, trace: dict):
+        spans = {nome: round(valor * 1000, 3) for nome, valor in trace.items() if not nome.startswith("_")}
+        spans["outros"] = round(max(total * 1000 - sum(spans.values()), 0.0), 3)
+        self.traces.append({
+            "metodo": metodo,
+            "rota": rota,
+            "status": status,
+            "total_ms": round(total * 1000, 3),
+            "spans_ms": spans,
+            "em": time.time(),
+        })
+
+    # ----------------------------------------
+    # Consulta
+    # ----------------------------------------
+
+    def resumo(self, ultimos: int = 20) -> dict:
+        """Médias e percentis de cada span por rota, mais os últimos traces"""
+        por_rota = {}
+        for trace in self.traces:
+            rota = por_rota.setdefault(f"{trace['metodo']} {trace['rota']}", {"total_ms": []})
+            rota["total_ms"].append(trace["total_ms"])
+            for nome, valor in trace["spans_ms"].items():
+                rota.setdefault(nome, []).append(valor)
+
+        return {
+            "amostragem": f"1/{self.amostragem}",
+            "traces_guardados": len(self.traces),
+            "rotas": {
+                rota: {nome: _estatisticas(valores) for nome, valores in spans.items()}
+                for rota, spans in por_rota.items()
+            },
+            "ultimos": list(self.traces)[-ultimos:],
+        }
+
+    async def capturar(self, segundos: float, formato: str = "folded") -> str:
+        """
+        Perfila o event loop por `segundos` enquanto a API atende o tráfego normal
+
+        Raises:
+            CapturaEmAndamento: Outra captura ainda não terminou
+            ValueError: Formato desconhecido
+        """
+        import asyncio
+
+        if formato not in ("folded", "cprofile"):
+            raise ValueError(f"Formato desconhecido: {formato} (use folded ou cprofile)")
+        if self._capturando:
+            raise CapturaEmAndamento("Já existe uma captura em andamento")
+        self._capturando = True
+        try:
+            if formato == "cprofile":
+                import cProfile
+                import pstats
+
+                perfil = cProfile.Profile()
+                perfil.enable()  # Perfila a thread atual: a do event loop
+                try:
+                    await asyncio.sleep(segundos)
+                finally:
+                    perfil.disable()
+                saida = io.StringIO()
+                pstats.Stats(perfil, stream=saida).sort_stats("cumulative").print_stats(60)
+                return saida.getvalue()
+
+            amostrador = AmostradorPilhas(threading.get_ident())
+            amostrador.start()
+            try:
+                await asyncio.sleep(segundos)
+            finally:
+                amostrador.parar()
+            return amostrador.folded()
+        finally:
+            self._capturando = False
+
+
+def _estatisticas(valores: list) -> dict:
+    ordenados = sorted(valores)
+    return {
+        "n": len(ordenados),
+        "media": round(sum(ordenados) / len(ordenados), 3),
+        "p50": ordenados[len(ordenados) // 2],
+        "p95": ordenados[min(len(ordenados) - 1, int(len(ordenados) * 0.95))],
+    }
+
+
+class MiddlewarePerfil:
+    """Middleware ASGI: rastreia as requisições sorteadas pelo Perfilador"""
+
+    def __init__(self, app, perfilador: Perfilador):
+        self.app = app
+        self.perfilador = perfilador
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.perfilador.sortear():
+            await self.app(scope, receive, send)
+            return
+
+        trace, marcos = {}, {}
+        token = _trace_atual.set(trace)
+        inicio = time.perf_counter()
+
+        async def enviar(mensagem):
+            if mensagem["type"] == "http.response.start":
+                marcos["status"] = mensagem["status"]
+            await send(mensagem)
+            if mensagem["type"] == "http.response.body" and not mensagem.get("more_body"):
+                marcos["fim_resposta"] = time.perf_counter()
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _trace_atual.reset(token)
+            fim = time.perf_counter()
+            if _FIM_ENDPOINT in trace:
+                trace["resposta"] = marcos.get("fim_resposta", fim) - trace[_FIM_ENDPOINT]
+            self.perfilador.registrar(scope["method"], scope["path"], marcos.get("status"), fim - inicio, trace)
+
+
+class AmostradorPilhas(threading.Thread):
+    """
+    Amostra a pilha de uma thread a cada `intervalo` segundos
+
+    Gera pilhas no formato "folded" (raiz;...;folha contagem), aceito pelas
+    ferramentas de flame graph.
+    """
+
+    def __init__(self, thread_id: int, intervalo: float = 0.001):
+        super().__init__(name="perfil-amostrador", daemon=True)
+        self.thread_id = thread_id
+        self.intervalo = intervalo
+        self.pilhas = Counter()
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.wait(self.intervalo):
+            frame = sys._current_frames().get(self.thread_id)
+            nomes = []
+            while frame is not None:
+                codigo = frame.f_code
+                nomes.append(f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})")
+                frame = frame.f_back
+            if nomes:
+                self.pilhas[";".join(reversed(nomes))] += 1
+
+    def parar(self):
+        self._parar.set()
+        self.join()
+
+    def folded(self) -> str:
+        return "\n".join(f"{pilha} {n}" for pilha, n in self.pilhas.most_common()) + "\n"
@@ -0,0 +1,154 @@
+"""
+Histórico em múltiplas resoluções (pirâmide min/max)
+Sistema de Monitoramento do Telhado Verde - UFSM
+
+Os níveis de retenção já formam uma pirâmide: leituras brutas e agregados
+de 5 min e 1 h com min/max/soma/n de cada campo (ver retencao.py). Para
+desenhar um intervalo qualquer, GET /sensor-data/historico escolhe o nível
+mais grosso cuja resolução ainda cabe na largura do gráfico (`pontos`),
+lê somente o intervalo visível e reduz o resultado a no máximo `pontos`
+faixas com mínimo, máximo e média. Assim um ano de dados vem do nível de
+1 h (cerca de 8.800 documentos por dispositivo) e um zoom de algumas horas
+vem das leituras brutas.
+
+Cada nível agregado só existe até a sua marca d'água (agregado_ate); o
+trecho mais recente do intervalo é lido do nível seguinte mais fino que
+o cobre, até as leituras brutas.
+
+Autor: Equipe Projeto Integrador 4 - UFSM
+Data: 2025
+"""
+
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from armazenamento import para_datetime
+from campos_sensores import NOMES_CAMPOS
+from retencao import COLECAO_ESTADO, NivelRetencao, acumular_estatisticas, estatisticas_do_documento, momento_da_leitura
+
+
+class PiramideHistorico:
+    """
+    Escolha dos níveis e redução das leituras de um intervalo
+
+    Args:
+        niveis (list): Níveis de retenção, do bruto ao mais agregado
+        intervalo_bruto (timedelta): Intervalo nominal entre leituras brutas
+            (READ_INTERVAL_MS do firmware), usado para estimar documentos
+        max_documentos (int): Documentos lidos por trecho, no máximo
+        cache_marcas (float): Segundos em que as marcas d'água lidas do
+            Firestore são reaproveitadas
+    """
+
+    def __init__(self, niveis: List[NivelRetencao], intervalo_bruto: timedelta = timedelta(seconds=30),
+                 max_documentos: int = 5000, cache_marcas: float = 60.0):
+        self.niveis = niveis
+        self.intervalo_bruto = intervalo_bruto
+        self.max_documentos = max_documentos
+        self.cache_marcas = cache_marcas
+        self._marcas = None
+        self._marcas_lidas_em = 0.0
+
+    def resolucao(self, indice: int) -> timedelta:
+        return self.niveis[indice].resolucao or self.intervalo_bruto
+
+    # ----------------------------------------
+    # Planejamento
+    # ----------------------------------------
+
+    def escolher_nivel(self, desde: datetime, ate: datetime, pontos: int, agora: datetime) -> int:
+        """
+        Índice do nível mais grosso com resolução <= (ate - desde) / pontos
+
+        Níveis cuja retenção já apagou o início do intervalo são evitados
+        (usa o primeiro nível mais grosso que ainda guarda `desde`).
+        """
+        alvo = (ate - desde) / pontos
+        escolhido = 0
+        for indice in range(1, len(self.niveis)):
+            if self.resolucao(indice) <= alvo:
+                escolhido = indice
+        while escolhido < len(self.niveis) - 1:
+            reter_por = self.niveis[escolhido].reter_por
+            if reter_por is None or desde >= agora - reter_por:
+                break
+            escolhido += 1
+        return escolhido
+
+    def trechos(self, escolhido: int, marcas: Dict[int, Optional[datetime]],
+                desde: datetime, ate: datetime) -> List[Tuple[int, datetime, datetime]]:
+        """
+        Divide [desde, ate) entre o nível escolhido e os mais finos
+
+        Cada nível agregado cobre até a sua marca d'água; o restante do
+        intervalo vai para o próximo nível mais fino, até o bruto.
+
+        Returns:
+            list: [(índice do nível, início, fim)] em ordem cronológica
+        """
+        trechos, inicio = [], desde
+        for indice in range(escolhido, 0, -1):
+            marca = marcas.get(indice)
+            if marca is None or marca <= inicio:
+                continue
+            fim = min(ate, marca)
+            trechos.append((indice, inicio, fim))
+            inicio = fim
+            if inicio >= ate:
+                return trechos
+        trechos.append((0, inicio, ate))
+        return trechos
+
+    async def marcas(self, db) -> Dict[int, Optional[datetime]]:
+        """Marca d'água de cada nível agregado (cacheadas por `cache_marcas` s)"""
+        agora = time.monotonic()
+        if self._marcas is None or agora - self._marcas_lidas_em >= self.cache_marcas:
+            marcas = {}
+            for indice, nivel in enumerate(self.niveis[1:], start=1):
+                doc = await db.collection(COLECAO_ESTADO).document(nivel.colecao).get()
+                marcas[indice] = para_datetime(doc.to_dict()["agregado_ate"]) if doc.exists else None
+            self._marcas, self._marcas_lidas_em = marcas, agora
+        return self._marcas
+
+
+# ========================================
+# REDUÇÃO MIN/MAX
+# ========================================
+
+def reduzir_min_max(documentos: List[dict], desde: datetime, ate: datetime, pontos: int) -> dict:
+    """
+    Reduz leituras brutas e/ou agregadas a no máximo `pontos` faixas iguais
+
+    Cada faixa guarda, por campo, o mínimo e o máximo (picos preservados
+    mesmo em resoluções grossas) e a média ponderada pelo número de
+    leituras. Faixas sem nenhuma leitura são omitidas (lacunas no gráfico).
+    Cada documento entra na faixa do seu horário de coleta, não no de
+    recebimento (leituras enviadas em lote chegam todas juntas).
+
+    Returns:
+        dict: {"timestamp": [início da faixa, ISO], "sensor_campo":
+            {"min": [...], "max": [...], "media": [...]}}
+    """
+    largura = (ate - desde) / pontos
+    faixas = {}
+    for documento in documentos:
+        indice = int((momento_da_leitura(documento) - desde) / largura)
+        if 0 <= indice < pontos:
+            acumular_estatisticas(faixas.setdefault(indice, {}), estatisticas_do_documento(documento))
+
+    serie = {"timestamp": [], **{nome: {"min": [], "max": [], "media": []} for nome in NOMES_CAMPOS}}
+    for indice in sorted(faixas):
+        serie["timestamp"].append((desde + largura * indice).isoformat())
+        for nome in NOMES_CAMPOS:
+            estat = faixas[indice].get(nome)
+            coluna = serie[nome]
+            if estat and estat["n"]:
+                coluna["min"].append(round(estat["min"], 3))
+                coluna["max"].append(round(estat["max"], 3))
+                coluna["media"].append(round(estat["soma"] / estat["n"], 3))
+            else:
+                coluna["min"].append(None)
+                coluna["max"].append(None)
+                coluna["media"].append(None)
+    return serie
@@ -0,0 +1,233 @@
+"""
+Reamostragem em grade regular e detecção de lacunas
+Sistema de Monitoramento do Telhado Verde - UFSM
+
+As leituras chegam a cada ~30 s, mas quedas de Wi-Fi e POSTs com falha
+deixam intervalos sem dados. Desenhadas com linhas, essas lacunas viram
+retas enganosas. Aqui as leituras de cada dispositivo são alinhadas em uma
+grade regular de `passo` segundos, em uma passada sobre arrays (numpy):
+
+- células sem leitura ficam NaN (quebram a linha do gráfico)
+- lacunas (células vazias seguidas) são listadas com início e duração
+- lacunas curtas podem ser interpoladas linearmente (`max_interpolar`)
+- completude = células com leitura (ou em lacuna curta interpolada) /
+  células da grade; com a amostragem adaptativa, o espaçamento planejado
+  entre leituras (até INTERVALO_MAXIMO) não conta como lacuna
+
+O eixo do tempo é o timestamp do ESP32 (o firmware guarda no buffer as
+leituras não enviadas com o horário da coleta); sem ele, o de recebimento.
+O ESP32 envia o horário local sem fuso (UTC-3, ver hardware/main.ino), que
+é convertido com FUSO_FIRMWARE; `instante_da_coleta` é usado também pelas
+métricas derivadas, pelas regras de alerta e pelos agregados de retenção.
+
+Módulo sem dependências da API (apenas numpy e campos_sensores): o
+dashboard importa o mesmo código para o modo Firestore direto.
+
+Autor: Equipe Projeto Integrador 4 - UFSM
+Data: 2025
+"""
+
+import math
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from campos_sensores import NOMES_CAMPOS, extrair_valores
+
+
+def interpretar_fuso(texto: str) -> timezone:
+    """"-03:00" -> timezone(UTC-3)"""
+    sinal = -1 if texto.startswith("-") else 1
+    horas, _, minutos = texto.strip().lstrip("+-").partition(":")
+    return timezone(sinal * timedelta(hours=int(horas), minutes=int(minutos or 0)))
+
+
+# Fuso dos timestamps sem fuso enviados pelo ESP32 (configTime(-3*3600, ...) no firmware)
+FUSO_FIRMWARE = interpretar_fuso(os.getenv("FUSO_FIRMWARE", "-03:00"))
+
+
+def instante_da_coleta(timestamp) -> float:
+    """Segundos (epoch) do timestamp do ESP32 (sem fuso: FUSO_FIRMWARE); NaN se inválido"""
+    try:
+        momento = timestamp if isinstance(timestamp, datetime) else datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        return math.nan
+    if momento.tzinfo is None:
+        momento = momento.replace(tzinfo=FUSO_FIRMWARE)
+    return momento.timestamp()
+
+
+def instante_da_leitura(documento: dict) -> float:
+    """Segundos (epoch) do timestamp do ESP32 ou, sem ele, do recebimento; NaN se inválido"""
+    instante = instante_da_coleta(documento.get("timestamp"))
+    if not math.isnan(instante):
+        return instante
+    recebido = documento.get("timestamp_recebido")
+    try:
+        momento = recebido if isinstance(recebido, datetime) else datetime.fromisoformat(recebido)
+    except (TypeError, ValueError):
+        return math.nan
+    # Formato antigo (texto sem fuso): horário local do servidor, como em armazenamento.para_datetime
+    return momento.timestamp()
+
+
+def grade_regular(instantes, colunas: Dict[str, "object"], passo: float,
+                  inicio: Optional[float] = None, fim: Optional[float] = None,
+                  max_interpolar: float = 0.0, max_celulas: Optional[int] = None) -> dict:
+    """
+    Alinha uma série irregular (um dispositivo) em uma grade regular
+
+    Cada célula [inicio + k*passo, inicio + (k+1)*passo) recebe a média das
+    leituras que caem nela. Valores NaN e instantes fora de [inicio, fim)
+    são ignorados.
+
+    Args:
+        instantes: Array de segundos (epoch), em qualquer ordem
+        colunas (dict): {nome: array de valores, alinhado com instantes}
+        passo (float): Tamanho da célula, em segundos
+        inicio, fim (float, optional): Limites da grade (padrão: primeira e
+            última leitura); permitem contar lacunas nas bordas
+        max_interpolar (float): Lacunas de até esta duração (s) são
+            preenchidas por interpolação linear (0 = nenhuma)
+        max_celulas (int, optional): Limite de células da grade
+
+    Returns:
+        dict: "inicio", "passo", "instantes" (início de cada célula),
+            "colunas" ({nome: array com NaN nas lacunas}), "lacunas"
+            ([(inicio, fim, duracao)] em segundos) e "completude" (0-100,
+            contando as células interpoladas como preenchidas)
+
+    Raises:
+        ValueError: Se a grade passar de `max_celulas` células
+    """
+    import numpy as np  # Import tardio: a API só usa numpy nestas consultas
+
+    instantes = np.asarray(instantes, dtype=float)
+    validos = ~np.isnan(instantes)
+    if inicio is None:
+        inicio = float(instantes[validos].min()) if validos.any() else 0.0
+    if fim is None:
+        fim = float(instantes[validos].max()) + passo if validos.any() else inicio
+    celulas = max(int(math.ceil((fim - inicio) / passo)), 0)
+    if max_celulas is not None and celulas > max_celulas:
+        raise ValueError(f"Grade com {celulas} células (máximo {max_celulas}); aumente o passo")
+
+    indices = np.floor((instantes - inicio) / passo)
+    dentro = validos & (indices >= 0) & (indices < celulas)
+    indices = indices[dentro].astype(np.int64)
+
+    # Ocupação por célula (qualquer campo) e média por coluna via bincount
+    preenchidas = np.bincount(indices, minlength=celulas) > 0
+    resultado = {}
+    for nome, valores in colunas.items():
+        valores = np.asarray(valores, dtype=float)[dentro]
+        presentes = ~np.isnan(valores)
+        soma = np.bincount(indices[presentes], weights=valores[presentes], minlength=celulas)
+        contagem = np.bincount(indices[presentes], minlength=celulas)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            resultado[nome] = np.where(contagem > 0, soma / contagem, np.nan)
+
+    # Lacunas: sequências de células vazias (início/fim pelas bordas da máscara)
+    vazias = np.concatenate(([0], (~preenchidas).astype(np.int8), [0]))
+    bordas = np.diff(vazias)
+    inicios, fins = np.flatnonzero(bordas == 1), np.flatnonzero(bordas == -1)
+    lacunas = [(inicio + a * passo, inicio + b * passo, (b - a) * passo) for a, b in zip(inicios.tolist(), fins.tolist())]
+
+    cobertas = preenchidas
+    if max_interpolar > 0 and preenchidas.any():
+        curtas = np.zeros(celulas, dtype=bool)
+        for a, b in zip(inicios.tolist(), fins.tolist()):
+            # Só lacunas internas: nas bordas não há os dois lados para interpolar
+            if a > 0 and b < celulas and (b - a) * passo <= max_interpolar:
+                curtas[a:b] = True
+        if curtas.any():
+            cobertas = preenchidas | curtas
+            eixo = np.arange(celulas)
+            for nome, valores in resultado.items():
+                conhecidos = ~np.isnan(valores)
+                if conhecidos.sum() >= 2:
+                    valores[curtas] = np.interp(eixo[curtas], eixo[conhecidos], valores[conhecidos])
+        lacunas = [lacuna for lacuna in lacunas if lacuna[2] > max_interpolar or lacuna[0] == inicio
+                   or lacuna[1] == inicio + celulas * passo]
+
+    return {
+        "inicio": inicio,
+        "passo": passo,
+        "instantes": inicio + np.arange(celulas) * passo,
+        "colunas": resultado,
+        "lacunas": lacunas,
+        "completude": round(float(cobertas.mean()) * 100, 2) if celulas else 0.0,
+    }
+
+
+def reamostrar_documentos(documentos: List[dict], passo: float, max_interpolar: float = 0.0,
+                          inicio: Optional[float] = None, fim: Optional[float] = None,
+                          max_celulas: Optional[int] = None) -> Dict[str, dict]:
+    """
+    Grade regular de cada dispositivo, pronta para JSON (ver grade_regular)
+
+    Returns:
+        dict: {device_id: {"timestamp": [...], "sensor_campo": [...],
+            "lacunas": [{"inicio", "fim", "duracao_segundos"}], "completude"}}
+            com null nas células sem leitura
+    """
+    por_dispositivo = {}
+    for documento in documentos:
+        por_dispositivo.setdefault(documento.get("device_id"), []).append(documento)
+
+    series = {}
+    for device_id, docs in por_dispositivo.items():
+        valores = [extrair_valores(d.get("sensors") or {}) for d in docs]
+        grade = grade_regular(
+            [instante_da_leitura(d) for d in docs],
+            {nome: [v.get(nome, math.nan) for v in valores] for nome in NOMES_CAMPOS},
+            passo, inicio=inicio, fim=fim, max_interpolar=max_interpolar, max_celulas=max_celulas,
+        )
+        series[device_id] = {
+            "timestamp": [_iso(t) for t in grade["instantes"].tolist()],
+            **{nome: _lista(coluna) for nome, coluna in grade["colunas"].items()},
+            "lacunas": [
+                {"inicio": _iso(a), "fim": _iso(b), "duracao_segundos": duracao}
+                for a, b, duracao in grade["lacunas"]
+            ],
+            "completude": grade["completude"],
+        }
+    return series
+
+
+def serie_regular(documentos: List[dict], passo: float, pontos: Optional[int] = None,
+                  max_interpolar: float = 0.0) -> dict:
+    """
+    Série única do gráfico (leituras de todos os dispositivos juntas) em grade regular
+
+    Com `pontos`, o passo aumenta o necessário para a grade caber em
+    `pontos` células (cada célula é a média das leituras dela).
+
+    Returns:
+        dict: {"timestamp": [...], "sensor_campo": [...], "passo_segundos"},
+            em ordem cronológica, com null nas células sem leitura
+    """
+    valores = [extrair_valores(d.get("sensors") or {}) for d in documentos]
+    instantes = [instante_da_leitura(d) for d in documentos]
+    validos = [t for t in instantes if not math.isnan(t)]
+    if pontos and pontos > 1 and len(validos) > 1:
+        passo = max(passo, (max(validos) - min(validos)) / (pontos - 1))
+    grade = grade_regular(
+        instantes,
+        {nome: [v.get(nome, math.nan) for v in valores] for nome in NOMES_CAMPOS},
+        passo, max_interpolar=max_interpolar,
+    )
+    return {
+        "timestamp": [_iso(t) for t in grade["instantes"].tolist()],
+        **{nome: _lista(coluna) for nome, coluna in grade["colunas"].items()},
+        "passo_segundos": round(passo, 3),
+    }
+
+
+def _iso(segundos: float) -> str:
+    return datetime.fromtimestamp(segundos, tz=timezone.utc).isoformat()
+
+
+def _lista(valores) -> list:
+    """Array numpy -> lista JSON (NaN vira None)"""
+    return [None if math.isnan(v) else round(v, 3) for v in valores.tolist()]
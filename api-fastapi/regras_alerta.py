@@ -0,0 +1,301 @@
+"""
+Motor de regras de alerta avaliado na ingestão
+Sistema de Monitoramento do Telhado Verde - UFSM
+
+Regras declarativas, uma por condição, no formato:
+
+    hl69.soil_moisture < 30 for 15m     (solo seco por 15 minutos)
+    hcsr04.distance > 28                (reservatório quase vazio)
+
+As regras são compiladas uma única vez em um índice por campo, ordenado
+pelo limite. A cada leitura, uma busca binária seleciona só as regras
+cujo limite está entre o valor anterior e o atual do mesmo dispositivo
+(as únicas que podem ter mudado de estado), além das regras que aguardam
+o tempo do "for". O custo por leitura é O(log R + k): a seleção é
+logarítmica no total de regras R, mas as k regras cruzadas pela variação
+do valor precisam ser reavaliadas, e k cresce com a densidade de limites
+perto dos valores lidos (regras_avaliadas em `estatisticas()`).
+
+Valores de sensores com status diferente de "ok" são ignorados (não
+disparam nem resolvem regras), como em anomalias.py.
+
+Cada regra dispara uma notificação quando a condição se mantém pelo tempo
+configurado e outra quando volta ao normal; enquanto continuar ativa, não
+há notificações repetidas, e uma regra resolvida só dispara de novo após
+o intervalo mínimo (evita alertas oscilando no limite).
+
+Autor: Equipe Projeto Integrador 4 - UFSM
+Data: 2025
+"""
+
+import bisect
+import heapq
+import json
+import math
+import operator
+import re
+import threading
+import time
+from datetime import datetime
+from typing import List
+
+from campos_sensores import CAMPOS_NUMERICOS, NOMES_CAMPOS, extrair_valores
+from reamostragem import instante_da_coleta
+from retencao import interpretar_duracao
+
+OPERADORES = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+# "sensor_campo" -> sensor, para consultar o status informado pelo firmware
+_SENSOR_DO_CAMPO = {f"{sensor}_{campo}": sensor for sensor, campo in CAMPOS_NUMERICOS}
+
+_PADRAO_REGRA = re.compile(
+    r"^\s*(?P<sensor>\w+)\.(?P<campo>\w+)\s*(?P<op><=|>=|<|>)\s*(?P<limite>-?\d+(?:\.\d+)?)"
+    r"(?:\s+for\s+(?P<duracao>\d+(?:\.\d+)?[smhd]))?\s*$"
+)
+
+
+class Regra:
+    """Regra compilada: campo, operador, limite e duração mínima em segundos"""
+
+    __slots__ = ("indice", "texto", "campo", "comparar", "limite", "duracao")
+
+    def __init__(self, indice: int, texto: str, campo: str, comparar, limite: float, duracao: float):
+        self.indice = indice
+        self.texto = texto
+        self.campo = campo
+        self.comparar = comparar
+        self.limite = limite
+        self.duracao = duracao
+
+
+def compilar_regras(textos: List[str]) -> List[Regra]:
+    """
+    Compila as regras de alerta
+
+    Args:
+        textos (list): Regras no formato "sensor.campo <op> limite [for duração]"
+
+    Returns:
+        list: Regras compiladas
+
+    Raises:
+        ValueError: Se alguma regra for inválida ou usar um campo desconhecido
+    """
+    regras = []
+    for texto in (t.strip() for t in textos):
+        if not texto:
+            continue
+        encontrado = _PADRAO_REGRA.match(texto)
+        if not encontrado:
+            raise ValueError(f"Regra de alerta inválida: {texto!r}")
+        campo = f"{encontrado['sensor']}_{encontrado['campo']}"
+        if campo not in NOMES_CAMPOS:
+            raise ValueError(f"Campo desconhecido na regra {texto!r}")
+        duracao = interpretar_duracao(encontrado["duracao"]) if encontrado["duracao"] else None
+        regras.append(Regra(
+            indice=len(regras),
+            texto=texto,
+            campo=campo,
+            comparar=OPERADORES[encontrado["op"]],
+            limite=float(encontrado["limite"]),
+            duracao=duracao.total_seconds() if duracao else 0.0,
+        ))
+    return regras
+
+
+# ========================================
+# DESTINOS DAS NOTIFICAÇÕES
+# ========================================
+
+class DestinoConsole:
+    """Imprime as notificações no log da API"""
+
+    def enviar(self, notificacao: dict):
+        simbolo = "🚨" if notificacao["evento"] == "disparado" else "✅"
+        print(f"{simbolo} Alerta {notificacao['evento']}: {notificacao['regra']} "
+              f"(device: {notificacao['device_id']}, valor: {notificacao['valor']})")
+
+
+class DestinoArquivo:
+    """Acrescenta as notificações em um arquivo JSON Lines (útil para testes)"""
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self._lock = threading.Lock()
+
+    def enviar(self, notificacao: dict):
+        with self._lock, open(self.caminho, "a", encoding="utf-8") as arquivo:
+            arquivo.write(json.dumps(notificacao, ensure_ascii=False) + "\n")
+
+
+class DestinoWebhook:
+    """Envia as notificações via HTTP POST (JSON) para uma URL"""
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        self.url = url
+        self.timeout = timeout
+
+    def enviar(self, notificacao: dict):
+        import requests
+        try:
+            requests.post(self.url, json=notificacao, timeout=self.timeout).raise_for_status()
+        except requests.exceptions.RequestException as e:
+            print(f"❌ Erro ao enviar alerta para {self.url}: {str(e)}")
+
+
+def criar_destino(configuracao: str):
+    """
+    Cria o destino das notificações a partir de ALERTA_DESTINO
+
+    Formatos: "console", "arquivo:<caminho>", "webhook:<url>"
+    """
+    tipo, _, valor = configuracao.partition(":")
+    if tipo == "console":
+        return DestinoConsole()
+    if tipo == "arquivo" and valor:
+        return DestinoArquivo(valor)
+    if tipo == "webhook" and valor:
+        return DestinoWebhook(valor)
+    raise ValueError(f"ALERTA_DESTINO inválido: {configuracao!r}")
+
+
+# ========================================
+# MOTOR DE REGRAS
+# ========================================
+
+class MotorAlertas:
+    """
+    Avalia as regras contra as leituras, mantendo o estado por dispositivo
+
+    Args:
+        regras (list): Regras compiladas por `compilar_regras`
+        destino: Objeto com método `enviar(notificacao: dict)`
+        intervalo_minimo (float): Segundos entre resolver e disparar de novo
+            a mesma regra no mesmo dispositivo
+    """
+
+    def __init__(self, regras: List[Regra], destino, intervalo_minimo: float = 600.0):
+        self.regras = regras
+        self.destino = destino
+        self.intervalo_minimo = intervalo_minimo
+
+        # Índice por campo: limites ordenados e regras na mesma ordem
+        self._limites = {}
+        self._regras_por_campo = {}
+        for regra in sorted(regras, key=lambda r: r.limite):
+            self._limites.setdefault(regra.campo, []).append(regra.limite)
+            self._regras_por_campo.setdefault(regra.campo, []).append(regra)
+
+        self._ultimos = {}     # (device_id, campo) -> último valor
+        self._verdadeiras = {}  # device_id -> {indice: desde (s)} regras com condição verdadeira
+        self._pendentes = {}   # device_id -> heap [(prazo, indice, desde)] verdadeiras ainda não notificadas
+        self._disparadas = {}  # device_id -> set(indice) regras já notificadas
+        self._resolvidas = {}  # (device_id, indice) -> instante da última resolução
+        self._lock = threading.Lock()
+
+        self.notificacoes_enviadas = 0
+        self.regras_avaliadas = 0  # Regras candidatas reavaliadas (k acumulado)
+
+    def avaliar_lote(self, leituras: List[dict]):
+        """Avalia leituras em ordem e envia as notificações (tarefa de segundo plano)"""
+        for leitura in leituras:
+            for notificacao in self.avaliar(leitura):
+                self.destino.enviar(notificacao)
+                self.notificacoes_enviadas += 1
+
+    def avaliar(self, leitura: dict) -> List[dict]:
+        """
+        Atualiza o estado das regras com uma leitura
+
+        Returns:
+            list: Notificações geradas ("disparado" ou "resolvido")
+        """
+        device_id = leitura["device_id"]
+        instante = _instante(leitura.get("timestamp"))
+        sensors = leitura["sensors"]
+        # Sensor com falha: o firmware envia valores de preenchimento (0, -1)
+        valores = {
+            campo: valor for campo, valor in extrair_valores(sensors).items()
+            if (sensors.get(_SENSOR_DO_CAMPO[campo]) or {}).get("status", "ok") == "ok"
+        }
+        notificacoes = []
+
+        with self._lock:
+            verdadeiras = self._verdadeiras.setdefault(device_id, {})
+            pendentes = self._pendentes.setdefault(device_id, [])
+            disparadas = self._disparadas.setdefault(device_id, set())
+
+            for campo, valor in valores.items():
+                regras = self._regras_por_campo.get(campo)
+                if not regras:
+                    continue
+                anterior = self._ultimos.get((device_id, campo))
+                self._ultimos[(device_id, campo)] = valor
+
+                # Só as regras com limite entre o valor anterior e o atual podem mudar
+                if anterior is None:
+                    candidatas = regras
+                else:
+                    limites = self._limites[campo]
+                    inicio = bisect.bisect_left(limites, min(anterior, valor))
+                    fim = bisect.bisect_right(limites, max(anterior, valor))
+                    candidatas = regras[inicio:fim]
+                self.regras_avaliadas += len(candidatas)
+
+                for regra in candidatas:
+                    agora_verdadeira = regra.comparar(valor, regra.limite)
+                    if agora_verdadeira and regra.indice not in verdadeiras:
+                        verdadeiras[regra.indice] = instante
+                        heapq.heappush(pendentes, (instante + regra.duracao, regra.indice, instante))
+                    elif not agora_verdadeira and regra.indice in verdadeiras:
+                        del verdadeiras[regra.indice]  # Entrada no heap é descartada ao vencer
+                        if regra.indice in disparadas:
+                            disparadas.discard(regra.indice)
+                            self._resolvidas[(device_id, regra.indice)] = instante
+                            notificacoes.append(_notificacao("resolvido", regra, device_id, valor, leitura))
+
+            # Regras verdadeiras que ainda não notificaram, em ordem de prazo (heap)
+            while pendentes and pendentes[0][0] <= instante:
+                _, indice, desde = heapq.heappop(pendentes)
+                if verdadeiras.get(indice) != desde:
+                    continue  # Condição voltou ao normal (ou reiniciou) antes do prazo
+                resolvida_em = self._resolvidas.get((device_id, indice))
+                if resolvida_em is not None and instante - resolvida_em < self.intervalo_minimo:
+                    heapq.heappush(pendentes, (resolvida_em + self.intervalo_minimo, indice, desde))
+                    continue
+                regra = self.regras[indice]
+                disparadas.add(indice)
+                valor = valores.get(regra.campo, self._ultimos.get((device_id, regra.campo)))
+                notificacoes.append(_notificacao("disparado", regra, device_id, valor, leitura))
+
+        return notificacoes
+
+    def estatisticas(self) -> dict:
+        return {
+            "regras": len(self.regras),
+            "alertas_ativos": sum(len(d) for d in self._disparadas.values()),
+            "notificacoes_enviadas": self.notificacoes_enviadas,
+            "regras_avaliadas": self.regras_avaliadas,
+        }
+
+
+def _instante(timestamp) -> float:
+    """Timestamp da leitura em segundos (sem fuso: FUSO_FIRMWARE; relógio do servidor se inválido)"""
+    instante = instante_da_coleta(timestamp)
+    return time.time() if math.isnan(instante) else instante
+
+
+def _notificacao(evento: str, regra: Regra, device_id: str, valor, leitura: dict) -> dict:
+    return {
+        "evento": evento,
+        "regra": regra.texto,
+        "device_id": device_id,
+        "valor": valor,
+        "timestamp": leitura.get("timestamp"),
+        "notificado_em": datetime.now().isoformat(),
+    }
@@ -0,0 +1,421 @@
+"""
+Retenção em níveis: downsampling e limpeza de leituras antigas
+Sistema de Monitoramento do Telhado Verde - UFSM
+
+Cada dispositivo grava uma leitura a cada 30 s em `sensor_readings`, que
+crescia sem limite. Este módulo mantém níveis de retenção configuráveis,
+por exemplo:
+
+- sensor_readings        leituras brutas, mantidas por 30 dias
+- sensor_readings_5min   agregados de 5 minutos, mantidos por 1 ano
+- sensor_readings_1h     agregados de 1 hora, mantidos para sempre
+
+Cada nível agregado é calculado a partir do nível anterior, somente para
+intervalos já fechados, e uma leitura só é apagada depois de ter sido
+agregada no nível seguinte. As exclusões são feitas em lotes, com pausa
+entre lotes para não disputar cota com a ingestão.
+
+A origem é lida por ordem de chegada (timestamp_recebido das leituras
+brutas, atualizado_em dos agregados), mas cada documento entra no intervalo
+do seu próprio timestamp (horário da coleta, ver
+reamostragem.instante_da_coleta). Um lote enviado pelo ESP32 depois de
+horas sem Wi-Fi completa, então, os intervalos das horas em que as leituras
+foram feitas. Cada agregado guarda em `parciais` a contribuição de cada
+trecho da origem; reprocessar um trecho substitui a sua parcela, sem
+contá-la duas vezes.
+
+Autor: Equipe Projeto Integrador 4 - UFSM
+Data: 2025
+"""
+
+import math
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from armazenamento import agora_utc, para_datetime
+from campos_sensores import CAMPOS_NUMERICOS, NOMES_CAMPOS, extrair_valores
+from deduplicacao import gerar_id_leitura
+from reamostragem import instante_da_coleta
+
+# Coleção com a marca d'água de cada nível agregado
+COLECAO_ESTADO = "retencao_estado"
+
+# Limite de operações por batch do Firestore
+TAMANHO_MAXIMO_BATCH = 500
+
+_REFERENCIA = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+_UNIDADES = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days"}
+
+
+class NivelRetencao:
+    """
+    Um nível de retenção
+
+    Args:
+        colecao (str): Coleção do Firestore onde o nível é armazenado
+        resolucao (timedelta, optional): Tamanho do intervalo de agregação
+            (None para o nível bruto)
+        reter_por (timedelta, optional): Idade máxima dos documentos
+            (None para manter para sempre)
+        fontes (callable, optional): fontes(db, desde, ate) -> coleções onde o nível
+            está gravado, quando ele é particionado (ver particionamento.py);
+            por padrão, apenas db.collection(colecao)
+    """
+
+    def __init__(self, colecao: str, resolucao: Optional[timedelta] = None,
+                 reter_por: Optional[timedelta] = None, fontes=None):
+        self.colecao = colecao
+        self.resolucao = resolucao
+        self.reter_por = reter_por
+        self.fontes = fontes
+
+    def referencias(self, db, desde: Optional[datetime] = None, ate: Optional[datetime] = None) -> list:
+        """Coleções a consultar (`desde`/`ate` permitem descartar partições fora do período)"""
+        if self.fontes is not None:
+            return self.fontes(db, desde, ate)
+        return [db.collection(self.colecao)]
+
+    def __repr__(self):
+        return f"NivelRetencao({self.colecao!r}, resolucao={self.resolucao}, reter_por={self.reter_por})"
+
+
+def interpretar_duracao(texto: str) -> Optional[timedelta]:
+    """
+    Converte "30d", "5m", "1h", "90s" em timedelta
+
+    "inf", "forever" e "sempre" retornam None (sem limite).
+    """
+    texto = texto.strip().lower()
+    if texto in ("inf", "forever", "sempre"):
+        return None
+    valor, unidade = texto[:-1], texto[-1]
+    if unidade not in _UNIDADES:
+        raise ValueError(f"Unidade de duração inválida: {texto!r} (use s, m, h ou d)")
+    return timedelta(**{_UNIDADES[unidade]: float(valor)})
+
+
+def interpretar_niveis(texto: str, colecao_bruta: str = "sensor_readings") -> List[NivelRetencao]:
+    """
+    Interpreta a configuração RETENCAO_NIVEIS
+
+    Formato: "raw=30d,5m=365d,1h=inf" — o primeiro item é sempre o nível
+    bruto; os seguintes são "resolução=retenção". As coleções agregadas
+    são nomeadas a partir da bruta (ex.: sensor_readings_5min).
+
+    Raises:
+        ValueError: Se o formato for inválido ou as resoluções não crescerem
+    """
+    niveis = []
+    for i, item in enumerate(p for p in texto.split(",") if p.strip()):
+        nome, _, retencao = item.partition("=")
+        nome = nome.strip().lower()
+        reter_por = interpretar_duracao(retencao or "inf")
+        if i == 0:
+            if nome != "raw":
+                raise ValueError("O primeiro nível de RETENCAO_NIVEIS deve ser 'raw'")
+            niveis.append(NivelRetencao(colecao_bruta, None, reter_por))
+            continue
+        resolucao = interpretar_duracao(nome)
+        if resolucao is None or (niveis[-1].resolucao and resolucao <= niveis[-1].resolucao):
+            raise ValueError(f"Resoluções de RETENCAO_NIVEIS devem ser crescentes: {nome!r}")
+        sufixo = nome.replace("m", "min") if nome.endswith("m") else nome
+        niveis.append(NivelRetencao(f"{colecao_bruta}_{sufixo}", resolucao, reter_por))
+    if not niveis:
+        raise ValueError("RETENCAO_NIVEIS vazio")
+    return niveis
+
+
+def inicio_intervalo(momento: datetime, resolucao: timedelta) -> datetime:
+    """Início do intervalo de agregação que contém `momento`"""
+    return momento - (momento - _REFERENCIA) % resolucao
+
+
+def momento_da_leitura(dados: dict) -> datetime:
+    """Horário da coleta (timestamp do ESP32, em UTC) ou, se inválido, o de recebimento"""
+    instante = instante_da_coleta(dados.get("timestamp"))
+    if math.isnan(instante):
+        return para_datetime(dados["timestamp_recebido"])
+    return datetime.fromtimestamp(instante, tz=timezone.utc)
+
+
+def campo_de_chegada(nivel: "NivelRetencao") -> str:
+    """Campo que ordena os documentos do nível pela chegada (lido pelo nível seguinte)"""
+    return "timestamp_recebido" if nivel.resolucao is None else "atualizado_em"
+
+
+def estatisticas_do_documento(dados: dict) -> dict:
+    """
+    min/max/soma/n de cada campo de um documento
+
+    Documentos agregados trazem as próprias estatísticas; uma leitura bruta
+    contribui com cada valor (n = 1).
+    """
+    if "estatisticas" in dados:
+        return dados["estatisticas"]
+    return {
+        nome: {"min": v, "max": v, "soma": v, "n": 1}
+        for nome, v in extrair_valores(dados.get("sensors", {})).items()
+    }
+
+
+def acumular_estatisticas(campos: dict, parciais: dict):
+    """Combina as estatísticas `parciais` com as acumuladas em `campos` (por nome)"""
+    for nome, p in parciais.items():
+        atual = campos.get(nome)
+        if atual is None:
+            campos[nome] = dict(p)
+        else:
+            atual["min"] = min(atual["min"], p["min"])
+            atual["max"] = max(atual["max"], p["max"])
+            atual["soma"] += p["soma"]
+            atual["n"] += p["n"]
+
+
+def _parciais_gravadas(documento: Optional[dict]) -> dict:
+    """Parcelas de um agregado já gravado (agregados antigos, sem parcelas, viram uma só)"""
+    if documento is None:
+        return {}
+    if "parciais" in documento:
+        return dict(documento["parciais"])
+    return {"anterior": {"n": documento.get("n_leituras", 0), "campos": documento.get("estatisticas", {})}}
+
+
+def _documento_agregado(device_id: str, inicio: datetime, destino: NivelRetencao, parciais: dict,
+                        chegada: datetime) -> dict:
+    """Documento de um intervalo agregado, a partir de todas as suas parcelas"""
+    n, campos = 0, {}
+    for parcela in parciais.values():
+        n += parcela["n"]
+        acumular_estatisticas(campos, parcela["campos"])
+    sensors = {}
+    for sensor, campo in CAMPOS_NUMERICOS:
+        estat = campos.get(f"{sensor}_{campo}")
+        if estat and estat["n"]:
+            sensors.setdefault(sensor, {})[campo] = estat["soma"] / estat["n"]
+    return {
+        "device_id": device_id,
+        "timestamp": inicio.isoformat(),  # Início do intervalo (horário da coleta), em texto
+        "timestamp_recebido": inicio,
+        "atualizado_em": chegada,  # Chegada ao nível (ordena a leitura pelo nível seguinte)
+        "resolucao_segundos": int(destino.resolucao.total_seconds()),
+        "n_leituras": n,
+        "sensors": sensors,  # Médias, no mesmo formato das leituras brutas
+        "estatisticas": {nome: campos[nome] for nome in NOMES_CAMPOS if nome in campos},
+        "parciais": parciais,
+    }
+
+
+class MotorRetencao:
+    """
+    Executa o downsampling e a limpeza dos níveis de retenção
+
+    Args:
+        db: Cliente Firestore (síncrono)
+        niveis (list): Níveis em ordem crescente de resolução
+        tamanho_lote (int): Documentos por batch de escrita/exclusão
+        pausa_entre_lotes (float): Espera entre lotes, em segundos
+        max_exclusoes (int): Limite de exclusões por execução
+        atraso (timedelta): Margem para leituras atrasadas antes de
+            considerar um intervalo fechado
+        janela (timedelta): Período de dados brutos lido por vez
+    """
+
+    def __init__(self, db, niveis: List[NivelRetencao], tamanho_lote: int = 400,
+                 pausa_entre_lotes: float = 1.0, max_exclusoes: int = 20000,
+                 atraso: timedelta = timedelta(minutes=2),
+                 janela: timedelta = timedelta(days=1)):
+        self.db = db
+        self.niveis = niveis
+        self.tamanho_lote = min(tamanho_lote, TAMANHO_MAXIMO_BATCH)
+        self.pausa_entre_lotes = pausa_entre_lotes
+        self.max_exclusoes = max_exclusoes
+        self.atraso = atraso
+        self.janela = janela
+
+    def executar(self, agora: Optional[datetime] = None) -> dict:
+        """
+        Executa uma rodada completa (agregação de todos os níveis e limpeza)
+
+        Returns:
+            dict: Quantidade de agregados gravados e documentos removidos por coleção
+        """
+        agora = para_datetime(agora) if agora else agora_utc()
+        resultado = {"agregados": {}, "removidos": {}}
+
+        for origem, destino in zip(self.niveis, self.niveis[1:]):
+            resultado["agregados"][destino.colecao] = self._agregar(origem, destino, agora)
+
+        restantes = self.max_exclusoes
+        for i, nivel in enumerate(self.niveis):
+            if nivel.reter_por is None or restantes <= 0:
+                continue
+            corte = agora - nivel.reter_por
+            if i + 1 < len(self.niveis):
+                # Nunca apaga o que ainda não foi agregado no nível seguinte
+                agregado_ate = self._ler_marca(self.niveis[i + 1])
+                corte = min(corte, agregado_ate) if agregado_ate else None
+            if corte is None:
+                continue
+            removidos = self._remover_anteriores(nivel, corte, restantes)
+            resultado["removidos"][nivel.colecao] = removidos
+            restantes -= removidos
+
+        return resultado
+
+    # ----------------------------------------
+    # Agregação
+    # ----------------------------------------
+
+    def _agregar(self, origem: NivelRetencao, destino: NivelRetencao, agora: datetime) -> int:
+        """Agrega os intervalos fechados de `origem` em `destino`"""
+        limite = inicio_intervalo(agora - self.atraso, destino.resolucao)
+        marca = self._ler_marca(destino) or self._primeiro_intervalo(origem, destino)
+        if marca is None:
+            return 0
+
+        gravados = 0
+        while marca < limite:
+            fim = min(limite, inicio_intervalo(marca + self.janela, destino.resolucao))
+            if fim <= marca:
+                fim = marca + destino.resolucao
+            intervalos = self._acumular(origem, marca, fim, destino.resolucao)
+            gravados += self._gravar_agregados(destino, intervalos)
+            marca = fim
+            self._salvar_marca(destino, marca)
+        return gravados
+
+    def _primeiro_intervalo(self, origem: NivelRetencao, destino: NivelRetencao) -> Optional[datetime]:
+        """Início do intervalo do documento que chegou primeiro à origem"""
+        campo = campo_de_chegada(origem)
+        primeiros = [
+            para_datetime(doc.to_dict()[campo])
+            for referencia in origem.referencias(self.db)
+            for doc in referencia.order_by(campo).limit(1).stream()
+        ]
+        if not primeiros:
+            return None
+        return inicio_intervalo(min(primeiros), destino.resolucao)
+
+    def _acumular(self, origem: NivelRetencao, inicio: datetime, fim: datetime, resolucao: timedelta) -> dict:
+        """
+        Lê os documentos que chegaram à origem em [inicio, fim) e acumula min/max/soma/n
+
+        Cada documento vai para o intervalo do seu horário de coleta.
+        Documentos brutos contribuem com cada valor, como uma parcela do
+        trecho lido; documentos já agregados contribuem com suas próprias
+        estatísticas, como uma parcela por documento (substituída quando ele
+        for atualizado).
+
+        Returns:
+            dict: {(device_id, início do intervalo): {"parciais": {parcela: {"n", "campos"}},
+                "chegada": chegada mais recente à origem entre os documentos lidos}}
+        """
+        campo = campo_de_chegada(origem)
+        intervalos = {}
+        for doc in self._documentos_no_intervalo(origem, inicio, fim):
+            dados = doc.to_dict()
+            chave = (dados.get("device_id", "Unknown"), inicio_intervalo(momento_da_leitura(dados), resolucao))
+            parcela = f"recebidas:{inicio.isoformat()}" if origem.resolucao is None else doc.id
+            intervalo = intervalos.setdefault(chave, {"parciais": {}, "chegada": None})
+            chegada = para_datetime(dados[campo])
+            if intervalo["chegada"] is None or chegada > intervalo["chegada"]:
+                intervalo["chegada"] = chegada
+            acumulado = intervalo["parciais"].setdefault(parcela, {"n": 0, "campos": {}})
+
+            acumulado["n"] += dados.get("n_leituras", 0) if "estatisticas" in dados else 1
+            acumular_estatisticas(acumulado["campos"], estatisticas_do_documento(dados))
+        return intervalos
+
+    def _documentos_no_intervalo(self, origem: NivelRetencao, inicio: datetime, fim: datetime):
+        campo = campo_de_chegada(origem)
+        for referencia in origem.referencias(self.db, inicio, fim):
+            query = (
+                referencia
+                .where(campo, ">=", inicio)
+                .where(campo, "<", fim)
+                .order_by(campo)
+            )
+            yield from query.stream()
+
+    def _gravar_agregados(self, destino: NivelRetencao, intervalos: dict) -> int:
+        """
+        Combina as parcelas novas com as já gravadas e grava os agregados
+
+        O ID é determinístico e as parcelas de trechos reprocessados
+        substituem as anteriores: reexecuções não contam nada duas vezes.
+        O atualizado_em de cada agregado é a chegada mais recente dos
+        documentos que o compõem, de modo que o nível seguinte o lê na mesma
+        rodada em que ele mudou (ou na seguinte, se ainda estiver aberto).
+        """
+        colecao = self.db.collection(destino.colecao)
+        chaves = list(intervalos)
+
+        gravados = 0
+        for inicio_lote in range(0, len(chaves), self.tamanho_lote):
+            parte = chaves[inicio_lote:inicio_lote + self.tamanho_lote]
+            referencias = {chave: colecao.document(gerar_id_leitura(chave[0], chave[1].isoformat())) for chave in parte}
+            existentes = {doc.id: doc.to_dict() for doc in self.db.get_all(list(referencias.values())) if doc.exists}
+
+            batch = self.db.batch()
+            for chave in parte:
+                referencia = referencias[chave]
+                gravado = existentes.get(referencia.id)
+                parciais = _parciais_gravadas(gravado)
+                parciais.update(intervalos[chave]["parciais"])
+                chegada = intervalos[chave]["chegada"]
+                if gravado and gravado.get("atualizado_em") and para_datetime(gravado["atualizado_em"]) > chegada:
+                    chegada = para_datetime(gravado["atualizado_em"])
+                batch.set(referencia, _documento_agregado(chave[0], chave[1], destino, parciais, chegada))
+            batch.commit()
+            gravados += len(parte)
+            if inicio_lote + self.tamanho_lote < len(chaves):
+                time.sleep(self.pausa_entre_lotes)
+        return gravados
+
+    # ----------------------------------------
+    # Limpeza
+    # ----------------------------------------
+
+    def _remover_anteriores(self, nivel: NivelRetencao, corte: datetime, limite: int) -> int:
+        """Apaga em lotes os documentos com timestamp_recebido < corte"""
+        removidos = 0
+        for referencia in nivel.referencias(self.db, ate=corte):
+            while removidos < limite:
+                docs = list(
+                    referencia
+                    .where("timestamp_recebido", "<", corte)
+                    .order_by("timestamp_recebido")
+                    .limit(min(self.tamanho_lote, limite - removidos))
+                    .stream()
+                )
+                if not docs:
+                    break
+                batch = self.db.batch()
+                for doc in docs:
+                    batch.delete(doc.reference)
+                batch.commit()
+                removidos += len(docs)
+                print(f"🧹 Retenção: {removidos} documentos removidos de {nivel.colecao}")
+                time.sleep(self.pausa_entre_lotes)
+        return removidos
+
+    # ----------------------------------------
+    # Marca d'água dos níveis agregados
+    # ----------------------------------------
+
+    def agregado_ate(self, nivel: NivelRetencao) -> Optional[datetime]:
+        """Até quando o nível agregado já foi calculado (None se nunca rodou)"""
+        return self._ler_marca(nivel)
+
+    def _ler_marca(self, nivel: NivelRetencao) -> Optional[datetime]:
+        doc = self.db.collection(COLECAO_ESTADO).document(nivel.colecao).get()
+        if not doc.exists:
+            return None
+        return para_datetime(doc.to_dict()["agregado_ate"])
+
+    def _salvar_marca(self, nivel: NivelRetencao, marca: datetime):
+        self.db.collection(COLECAO_ESTADO).document(nivel.colecao).set(
+            {"agregado_ate": marca, "atualizado_em": agora_utc()}
+        )
@@ -0,0 +1,98 @@
+"""
+BENCHMARK DO MOTOR DE REGRAS DE ALERTA
+Sistema de Monitoramento de Telhado Verde
+
+Mede o custo por leitura de `MotorAlertas.avaliar()` variando a quantidade
+de regras e de dispositivos. A busca binária torna a seleção das regras
+logarítmica no total, mas as regras cujo limite foi cruzado pela variação
+do valor são reavaliadas; por isso a tabela mostra também as regras
+avaliadas por leitura, que explicam o crescimento do custo com as regras.
+
+Autor: Equipe Projeto Integrador 4 - UFSM
+Uso: python scripts/benchmark_alertas.py --regras 4 400 4000 --dispositivos 1 100 --leituras 50000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+# Permite importar os módulos da API a partir de scripts/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from regras_alerta import MotorAlertas, compilar_regras  # noqa: E402
+
+
+class DestinoNulo:
+    def enviar(self, notificacao):
+        pass
+
+
+def gerar_regras(quantidade):
+    """Regras com limites espalhados pela faixa de cada campo"""
+    modelos = [
+        ("hl69.soil_moisture", "<", 0, 100),
+        ("hcsr04.distance", ">", 2, 40),
+        ("dht11.temperature", ">", 10, 45),
+        ("ds18b20.temperature", "<", 0, 35),
+    ]
+    regras = []
+    for i in range(quantidade):
+        campo, op, minimo, maximo = modelos[i % len(modelos)]
+        regras.append(f"{campo} {op} {random.uniform(minimo, maximo):.2f} for {random.choice([0, 5, 15])}m")
+    return regras
+
+
+def medir(n_regras, n_dispositivos, n_leituras=50000):
+    motor = MotorAlertas(compilar_regras(gerar_regras(n_regras)), DestinoNulo())
+    inicio = datetime(2025, 1, 1)
+    leituras = [
+        {
+            "device_id": f"ESP32_{i % n_dispositivos:04d}",
+            "timestamp": (inicio + timedelta(seconds=30 * (i // n_dispositivos))).isoformat(),
+            "sensors": {
+                "ds18b20": {"temperature": 20 + random.gauss(0, 0.5)},
+                "dht11": {"temperature": 25 + random.gauss(0, 1), "humidity": 60.0},
+                "hcsr04": {"distance": 15 + random.gauss(0, 0.3)},
+                "hl69": {"soil_moisture": 45 + random.gauss(0, 1), "raw_value": 2300},
+            },
+        }
+        for i in range(n_leituras)
+    ]
+    # Primeira leitura de cada dispositivo avalia todas as regras (uma única vez)
+    for leitura in leituras[:n_dispositivos]:
+        motor.avaliar(leitura)
+    leituras = leituras[n_dispositivos:]
+    avaliadas = motor.regras_avaliadas
+    t = time.perf_counter()
+    for leitura in leituras:
+        motor.avaliar(leitura)
+    custo = (time.perf_counter() - t) / len(leituras) * 1e6
+    return custo, (motor.regras_avaliadas - avaliadas) / len(leituras)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do motor de regras de alerta")
+    parser.add_argument("--regras", type=int, nargs="+", default=[4, 40, 400, 4000],
+                        help="Quantidades de regras medidas")
+    parser.add_argument("--dispositivos", type=int, nargs="+", default=[1, 100, 1000],
+                        help="Quantidades de dispositivos medidas")
+    parser.add_argument("--leituras", type=int, default=50000,
+                        help="Leituras avaliadas em cada medição")
+    args = parser.parse_args()
+
+    if any(n_dispositivos >= args.leituras for n_dispositivos in args.dispositivos):
+        parser.error("--leituras deve ser maior que cada valor de --dispositivos")
+
+    random.seed(42)
+    print(f"{'regras':>8} {'dispositivos':>13} {'µs/leitura':>12} {'avaliadas/leitura':>18}")
+    for n_regras in args.regras:
+        for n_dispositivos in args.dispositivos:
+            custo, avaliadas = medir(n_regras, n_dispositivos, args.leituras)
+            print(f"{n_regras:>8} {n_dispositivos:>13} {custo:>12.1f} {avaliadas:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
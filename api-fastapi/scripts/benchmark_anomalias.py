@@ -0,0 +1,78 @@
+"""
+BENCHMARK DO DETECTOR DE ANOMALIAS
+Sistema de Monitoramento de Telhado Verde
+
+Mede o custo por leitura de `DetectorAnomalias.avaliar()` (preparar +
+confirmar), o estágio executado em POST /sensor-data em volta da gravação
+no Firestore. O detector não acessa o banco, então o tempo medido é todo
+o overhead adicionado. Cada tamanho de janela em --janelas é medido
+separadamente, para mostrar o peso da lista ordenada da janela (inserção
+e remoção O(janela)).
+
+Autor: Equipe Projeto Integrador 4 - UFSM
+Uso: python scripts/benchmark_anomalias.py --leituras 200000 --dispositivos 50 --janelas 15 60 240 1000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+# Permite importar os módulos da API a partir de scripts/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from anomalias import DetectorAnomalias  # noqa: E402
+
+
+def gerar_leituras(quantidade, dispositivos):
+    """Gera leituras sintéticas com ruído, picos ocasionais e um sensor travado"""
+    inicio = datetime(2025, 1, 1)
+    leituras = []
+    for i in range(quantidade):
+        device = f"ESP32_{i % dispositivos:03d}"
+        pico = 15.0 if random.random() < 0.001 else 0.0
+        leituras.append({
+            "device_id": device,
+            "timestamp": (inicio + timedelta(seconds=30 * (i // dispositivos))).isoformat(),
+            "sensors": {
+                "ds18b20": {"temperature": 22 + random.gauss(0, 0.3) + pico, "status": "ok"},
+                "dht11": {"temperature": 25.0 if device == "ESP32_000" else round(25 + random.gauss(0, 1)),
+                          "humidity": round(60 + random.gauss(0, 2)), "status": "ok"},
+                "hcsr04": {"distance": 15 + random.gauss(0, 0.2), "status": "ok"},
+                "hl69": {"soil_moisture": 50 + random.gauss(0, 0.5),
+                         "raw_value": 4095 if pico else 2300 + random.randint(-15, 15), "status": "ok"},
+            },
+        })
+    return leituras
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do detector de anomalias")
+    parser.add_argument("--leituras", type=int, default=200000)
+    parser.add_argument("--dispositivos", type=int, default=50)
+    parser.add_argument("--janelas", type=int, nargs="+", default=[60],
+                        help="Tamanhos de janela medidos (leituras na mediana móvel)")
+    args = parser.parse_args()
+
+    random.seed(42)
+    print(f"Gerando {args.leituras} leituras para {args.dispositivos} dispositivos...")
+    leituras = gerar_leituras(args.leituras, args.dispositivos)
+
+    print("\n" + "=" * 60)
+    print(f" {'janela':>8} {'tempo total':>12} {'µs/leitura':>11} {'leituras/s':>12}")
+    for tamanho_janela in args.janelas:
+        detector = DetectorAnomalias(tamanho_janela=tamanho_janela)
+        inicio = time.perf_counter()
+        for leitura in leituras:
+            detector.avaliar(leitura)
+        total = time.perf_counter() - inicio
+        print(f" {tamanho_janela:>8} {total:>10.2f} s {total / args.leituras * 1e6:>11.1f} "
+              f"{args.leituras / total:>12,.0f}")
+    print(f" Estatísticas (última janela): {detector.estatisticas()}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
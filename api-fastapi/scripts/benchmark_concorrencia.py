@@ -0,0 +1,170 @@
+"""
+BENCHMARK DE CONCORRÊNCIA DA INGESTÃO
+Sistema de Monitoramento de Telhado Verde
+
+Compara a vazão de POST /sensor-data com um Firestore lento (latência
+simulada por operação) em dois modelos:
+
+- síncrono: endpoint `def` com o cliente bloqueante, executado pelo
+  threadpool do Starlette (40 threads), como a API fazia antes do AsyncClient
+- assíncrono: a API atual (`async def` + AsyncClient + limitador)
+
+As requisições passam pela pilha ASGI completa (httpx + ASGITransport),
+sem rede e sem credenciais do Firebase.
+
+Autor: Equipe Projeto Integrador 4 - UFSM
+Uso: python scripts/benchmark_concorrencia.py --latencia 0.2 --concorrencias 10,40,400
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import time
+
+# Permite importar os módulos da API a partir de scripts/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import httpx  # noqa: E402
+from fastapi import Depends, FastAPI  # noqa: E402
+
+import api_firebase  # noqa: E402
+from armazenamento import COLECAO_LEITURAS, id_da_leitura, montar_documento  # noqa: E402
+from concorrencia import LimitadorConcorrencia  # noqa: E402
+
+
+# ========================================
+# FIRESTORE SIMULADO (apenas create, com latência)
+# ========================================
+
+class DocumentoLento:
+    def __init__(self, cliente, doc_id):
+        self.cliente = cliente
+        self.id = doc_id
+
+    def create(self, dados):
+        time.sleep(self.cliente.latencia)
+        self.cliente.gravados += 1
+
+
+class DocumentoLentoAsync(DocumentoLento):
+    async def create(self, dados):
+        await asyncio.sleep(self.cliente.latencia)
+        self.cliente.gravados += 1
+
+
+class ClienteLento:
+    """Imita db.collection(...).document(id).create(...) com latência fixa"""
+
+    documento = DocumentoLento
+
+    def __init__(self, latencia):
+        self.latencia = latencia
+        self.gravados = 0
+
+    def collection(self, nome):
+        return self
+
+    def document(self, doc_id):
+        return self.documento(self, doc_id)
+
+
+class ClienteLentoAsync(ClienteLento):
+    documento = DocumentoLentoAsync
+
+
+# ========================================
+# ENDPOINT SÍNCRONO DE REFERÊNCIA
+# ========================================
+
+def criar_app_sincrono(db):
+    """POST /sensor-data no modelo anterior: `def` + cliente bloqueante"""
+    app = FastAPI()
+
+    @app.post("/sensor-data")
+    def receber_dados(leitura: dict = Depends(api_firebase.ler_leitura)):
+        doc_id = id_da_leitura(leitura)
+        documento = montar_documento(leitura)
+        db.collection(COLECAO_LEITURAS).document(doc_id).create(documento)
+        return {"firestore_id": doc_id, "status": "success"}
+
+    return app
+
+
+# ========================================
+# MEDIÇÃO
+# ========================================
+
+def corpo(i):
+    return {
+        "device_id": f"ESP32_{i % 50:03d}",
+        "timestamp": f"2025-01-01T00:00:00.{i:06d}",
+        "seq": i,
+        "sensors": {
+            "ds18b20": {"temperature": 21.0},
+            "dht11": {"temperature": 25.0, "humidity": 60.0},
+            "hcsr04": {"distance": 15.0},
+            "hl69": {"soil_moisture": 45.0, "raw_value": 2300},
+        },
+    }
+
+
+async def medir(app, requisicoes, concorrencia, deslocamento):
+    """Envia `requisicoes` POSTs com até `concorrencia` em voo; retorna (req/s, p95 ms, erros)"""
+    semaforo = asyncio.Semaphore(concorrencia)
+    latencias, erros = [], 0
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as cliente:
+        async def enviar(i):
+            nonlocal erros
+            async with semaforo:
+                inicio = time.perf_counter()
+                resposta = await cliente.post("/sensor-data", json=corpo(deslocamento + i))
+                latencias.append(time.perf_counter() - inicio)
+                if resposta.status_code != 200:
+                    erros += 1
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(enviar(i) for i in range(requisicoes)))
+        duracao = time.perf_counter() - inicio
+
+    latencias.sort()
+    return requisicoes / duracao, latencias[int(len(latencias) * 0.95) - 1] * 1000, erros
+
+
+async def executar(args):
+    sincrono = criar_app_sincrono(ClienteLento(args.latencia))
+    api_firebase.firebase._db = ClienteLento(args.latencia)
+    api_firebase.firebase._db_async = ClienteLentoAsync(args.latencia)
+    api_firebase.limitador = LimitadorConcorrencia(args.max_concorrencia, espera_maxima=60)
+    api_firebase.limite_dispositivo.taxa = api_firebase.limite_ip.taxa = 0  # Sem limite de envios
+
+    print(f"Latência simulada do Firestore: {args.latencia * 1000:.0f} ms por operação")
+    print(f"{'concorrência':>13} {'modelo':>11} {'req/s':>9} {'p95 (ms)':>10} {'erros':>6}")
+    deslocamento = 0
+    for concorrencia in args.concorrencias:
+        for nome, app in (("síncrono", sincrono), ("assíncrono", api_firebase.app)):
+            api_firebase.leituras_recentes = type(api_firebase.leituras_recentes)(capacidade=10000)
+            with contextlib.redirect_stdout(io.StringIO()):  # Logs por requisição da API
+                vazao, p95, erros = await medir(app, args.requisicoes, concorrencia, deslocamento)
+            deslocamento += args.requisicoes
+            print(f"{concorrencia:>13} {nome:>11} {vazao:>9.0f} {p95:>10.1f} {erros:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vazão de POST /sensor-data com Firestore lento")
+    parser.add_argument("--latencia", type=float, default=0.2, help="Latência por operação, em segundos")
+    parser.add_argument("--requisicoes", type=int, default=1000, help="Requisições por medição")
+    parser.add_argument("--concorrencias", default="10,40,100,400",
+                        help="Requisições simultâneas, separadas por vírgula")
+    parser.add_argument("--max-concorrencia", type=int, default=1000,
+                        help="FIRESTORE_MAX_CONCORRENCIA usado na API assíncrona")
+    args = parser.parse_args()
+    args.concorrencias = [int(c) for c in args.concorrencias.split(",")]
+    asyncio.run(executar(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+BENCHMARK DA VALIDAÇÃO DE LEITURAS
+Sistema de Monitoramento de Telhado Verde
+
+Mede o custo por leitura dos caminhos de validação da ingestão (modelos.py
+e formato_compacto.py), sem Firestore:
+
+- JSON, leitura única (POST /sensor-data): LEITURA.validate_json
+- JSON, lote (POST /sensor-data/batch): json.loads + LEITURA item a item
+- JSON, lote em uma chamada (TypeAdapter de lista), como comparação;
+  com inválidas, o lote é decodificado e o restante validado de novo
+- msgpack compacto, lote (validador enxuto)
+
+Os cenários de lote são medidos sem e com uma fração de leituras
+inválidas (--invalidas).
+
+Autor: Equipe Projeto Integrador 4 - UFSM
+Uso: python scripts/benchmark_validacao.py --leituras 100000 --lote 100 --invalidas 0.05
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+# Permite importar os módulos da API a partir de scripts/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from formato_compacto import decodificar_corpo, leitura_de_mapa_compacto  # noqa: E402
+from pydantic import TypeAdapter, ValidationError  # noqa: E402
+
+from modelos import LEITURA, DadosSensor, leitura_de_modelo, validar_lista_json  # noqa: E402
+
+LISTA_LEITURAS = TypeAdapter(List[DadosSensor])
+
+
+def gerar_leituras(quantidade, invalidas=0.0):
+    """Leituras sintéticas no formato de POST /sensor-data; uma fração fora das faixas"""
+    inicio = datetime(2025, 1, 1)
+    leituras = []
+    for i in range(quantidade):
+        leituras.append({
+            "device_id": f"ESP32_{i % 10:03d}",
+            "timestamp": (inicio + timedelta(seconds=30 * i)).isoformat(),
+            "seq": i,
+            "sensors": {
+                "ds18b20": {"temperature": round(22 + random.gauss(0, 0.3), 2), "unit": "celsius", "status": "ok"},
+                "dht11": {"temperature": round(25 + random.gauss(0, 1), 1), "humidity": round(60 + random.gauss(0, 2), 1),
+                          "unit_temp": "celsius", "unit_humidity": "percent", "status": "ok"},
+                "hcsr04": {"distance": round(15 + random.gauss(0, 0.2), 2), "unit": "cm", "status": "ok"},
+                "hl69": {"soil_moisture": round(50 + random.gauss(0, 0.5), 1), "raw_value": 2300 + random.randint(-15, 15),
+                         "unit": "percent", "status": "ok"},
+            },
+        })
+        if random.random() < invalidas:
+            leituras[-1]["sensors"]["dht11"]["humidity"] = 250.0  # Fisicamente impossível
+    return leituras
+
+
+def compacta(leitura):
+    """Mesma leitura no mapa compacto do firmware"""
+    sensors = leitura["sensors"]
+    return {
+        "d": leitura["device_id"], "t": leitura["timestamp"], "q": leitura["seq"], "e": 0,
+        "st": sensors["ds18b20"]["temperature"], "at": sensors["dht11"]["temperature"],
+        "ah": sensors["dht11"]["humidity"], "dist": sensors["hcsr04"]["distance"],
+        "sm": sensors["hl69"]["soil_moisture"], "raw": sensors["hl69"]["raw_value"],
+    }
+
+
+def em_lotes(itens, tamanho):
+    return [itens[i:i + tamanho] for i in range(0, len(itens), tamanho)]
+
+
+def medir(nome, corpos, validar, leituras):
+    """Executa `validar` em cada corpo e imprime o custo por leitura"""
+    inicio = time.perf_counter()
+    aceitas = 0
+    for corpo in corpos:
+        aceitas += validar(corpo)
+    total = time.perf_counter() - inicio
+    print(f" {nome:<44} {total / leituras * 1e6:7.2f} µs/leitura  {leituras / total:>11,.0f} leituras/s  "
+          f"({aceitas} aceitas)")
+
+
+# ========================================
+# CAMINHOS MEDIDOS
+# ========================================
+
+def json_unica(corpo):
+    leitura_de_modelo(LEITURA.validate_json(corpo))
+    return 1
+
+
+def json_lote(corpo):
+    validas, _ = validar_lista_json(corpo)
+    return len(validas)
+
+
+def json_lista_uma_chamada(corpo):
+    try:
+        return len([leitura_de_modelo(modelo) for modelo in LISTA_LEITURAS.validate_json(corpo)])
+    except ValidationError as e:
+        # Separa os itens apontados nos erros e valida o restante de novo
+        erros = {erro["loc"][0] for erro in e.errors(include_url=False)}
+        itens = [item for indice, item in enumerate(json.loads(corpo)) if indice not in erros]
+        return len([leitura_de_modelo(modelo) for modelo in LISTA_LEITURAS.validate_python(itens)])
+
+
+def msgpack_lote(corpo):
+    aceitas = 0
+    for item in decodificar_corpo(corpo, "application/msgpack"):
+        try:
+            leitura_de_mapa_compacto(item)
+            aceitas += 1
+        except ValueError:
+            pass
+    return aceitas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da validação de leituras")
+    parser.add_argument("--leituras", type=int, default=100000)
+    parser.add_argument("--lote", type=int, default=100, help="Leituras por lote")
+    parser.add_argument("--invalidas", type=float, default=0.05,
+                        help="Fração de leituras fora da faixa no cenário com rejeições")
+    args = parser.parse_args()
+
+    random.seed(42)
+    print(f"Gerando {args.leituras} leituras (lotes de {args.lote})...")
+    leituras = gerar_leituras(args.leituras)
+    com_invalidas = gerar_leituras(args.leituras, args.invalidas)
+
+    unicas = [json.dumps(leitura).encode("utf-8") for leitura in leituras]
+    lotes = [json.dumps(lote).encode("utf-8") for lote in em_lotes(leituras, args.lote)]
+    lotes_invalidos = [json.dumps(lote).encode("utf-8") for lote in em_lotes(com_invalidas, args.lote)]
+
+    print("\n" + "=" * 100)
+    medir("JSON, leitura única", unicas, json_unica, args.leituras)
+    medir("JSON, lote (item a item)", lotes, json_lote, args.leituras)
+    medir(f"JSON, lote (item a item), {args.invalidas:.0%} inválidas", lotes_invalidos, json_lote, args.leituras)
+    medir("JSON, lote em uma chamada", lotes, json_lista_uma_chamada, args.leituras)
+    medir(f"JSON, lote em uma chamada, {args.invalidas:.0%} inválidas", lotes_invalidos,
+          json_lista_uma_chamada, args.leituras)
+    try:
+        import msgpack
+    except ImportError:
+        print(" msgpack não instalado: caminho compacto não medido")
+    else:
+        compactos = [msgpack.packb([compacta(leitura) for leitura in lote]) for lote in em_lotes(leituras, args.lote)]
+        medir("msgpack compacto, lote", compactos, msgpack_lote, args.leituras)
+    print("=" * 100)
+
+
+if __name__ == "__main__":
+    main()
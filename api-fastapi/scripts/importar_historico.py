@@ -0,0 +1,403 @@
+"""
+IMPORTAÇÃO DE HISTÓRICOS (BACKFILL)
+Sistema de Monitoramento de Telhado Verde
+
+Carrega no Firestore leituras coletadas fora da API, sem enviá-las uma a
+uma como o script_demostracao.py:
+
+- CSV exportado pelo dashboard ("Download CSV": colunas timestamp,
+  device_id, dht11_temp, dht11_humidity, ..., *_status)
+- NDJSON (uma leitura por linha): formato de POST /sensor-data
+  (DadosSensor), mapas compactos do firmware (chaves d, t, q, ...) ou
+  documentos exportados de GET /sensor-data
+
+Arquivos .gz são descomprimidos durante a leitura.
+
+O arquivo é lido em fluxo (o CSV em blocos, com pyarrow, convertendo as
+colunas numéricas de uma vez) e dividido em lotes de --lote linhas. Cada
+lote é validado com DadosSensor (modelos.validar_itens, o mesmo caminho
+de POST /sensor-data/batch, com as faixas dos sensores: as linhas
+inválidas são separadas sem descartar o lote) e gravado
+por um conjunto limitado de threads (--workers), com no máximo 2x workers
+lotes em memória.
+
+timestamp_recebido: o do documento exportado, se houver; senão o horário
+da coleta no fuso do firmware (--fuso, padrão FUSO_FIRMWARE ou -03:00). Assim as consultas
+por período e a retenção tratam as leituras importadas como antigas.
+
+Checkpoint: os lotes concluídos ficam registrados em --checkpoint (JSON
+gravado de forma atômica). Repetir o comando com o mesmo checkpoint pula
+os lotes já gravados; como os IDs são determinísticos e a gravação usa
+set(), regravar um lote interrompido não duplica leituras.
+
+A importação não passa pela API: não há detecção de anomalias, regras de
+alerta nem métricas derivadas, e leituras anteriores à marca d'água de um
+nível de retenção já agregado não entram nos agregados.
+
+Autor: Equipe Projeto Integrador 4 - UFSM
+Uso: python scripts/importar_historico.py sensor_data.csv --workers 8 --checkpoint importacao.json
+"""
+
+import argparse
+import csv
+import gzip
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional, Tuple
+
+# Permite importar os módulos da API a partir de scripts/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from armazenamento import gravar_documentos, id_da_leitura, montar_documento, para_datetime  # noqa: E402
+from formato_compacto import leitura_de_mapa_compacto  # noqa: E402
+from modelos import validar_itens  # noqa: E402
+from reamostragem import FUSO_FIRMWARE, interpretar_fuso  # noqa: E402
+
+# Colunas numéricas do CSV do dashboard -> (sensor, campo)
+COLUNAS_CSV = {
+    "dht11_temp": ("dht11", "temperature"),
+    "dht11_humidity": ("dht11", "humidity"),
+    "ds18b20_temp": ("ds18b20", "temperature"),
+    "hl69_moisture": ("hl69", "soil_moisture"),
+    "hl69_raw": ("hl69", "raw_value"),
+    "hcsr04_distance": ("hcsr04", "distance"),
+}
+STATUS_CSV = {
+    "dht11_status": "dht11",
+    "ds18b20_status": "ds18b20",
+    "hl69_status": "hl69",
+    "hcsr04_status": "hcsr04",
+}
+# Colunas inteiras (a validação é estrita: 2300.0 não vale como inteiro)
+COLUNAS_INTEIRAS_CSV = {"hl69_raw", "seq"}
+
+
+# ========================================
+# LEITURA DOS ARQUIVOS (EM FLUXO)
+# ========================================
+
+def ler_csv(caminho: str) -> Iterator[Tuple[int, object]]:
+    """(número da linha, leitura no formato DadosSensor) para cada linha do CSV"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    from pyarrow import csv as pa_csv
+
+    with (gzip.open if caminho.endswith(".gz") else open)(caminho, "rt", newline="", encoding="utf-8") as arquivo:
+        cabecalho = next(csv.reader(arquivo))
+
+    # Tudo como texto: a inferência por bloco do pyarrow mudaria de tipo no meio do arquivo
+    leitor = pa_csv.open_csv(caminho, convert_options=pa_csv.ConvertOptions(
+        column_types={coluna: pa.string() for coluna in cabecalho}, strings_can_be_null=True,
+    ))
+    numero = 1
+    for bloco in leitor:
+        colunas = {}
+        for nome in bloco.schema.names:
+            coluna = bloco.column(nome)
+            if nome in COLUNAS_CSV or nome in COLUNAS_INTEIRAS_CSV:
+                try:
+                    coluna = pc.cast(coluna, pa.float64())  # Conversão da coluna inteira de uma vez
+                    if nome in COLUNAS_INTEIRAS_CSV:
+                        coluna = pc.cast(coluna, pa.int64())  # "2300.0" -> 2300; falha com frações
+                except pa.ArrowInvalid:
+                    # Algum valor não numérico: converte um a um e a validação aponta só essas linhas
+                    colunas[nome] = _numeros(coluna.to_pylist(), nome in COLUNAS_INTEIRAS_CSV)
+                    continue
+            colunas[nome] = coluna.to_pylist()
+        for i in range(bloco.num_rows):
+            numero += 1
+            yield numero, leitura_do_csv({nome: valores[i] for nome, valores in colunas.items()})
+
+
+def _numeros(valores: list, inteiro: bool) -> list:
+    """Texto -> número valor a valor; o que não converte fica como está"""
+    convertidos = []
+    for valor in valores:
+        try:
+            numero = float(valor)
+        except (TypeError, ValueError):
+            convertidos.append(valor)
+            continue
+        convertidos.append(int(numero) if inteiro and numero.is_integer() else numero)
+    return convertidos
+
+
+def leitura_do_csv(linha: dict) -> dict:
+    """Linha do CSV do dashboard -> leitura no formato de POST /sensor-data"""
+    sensors = {sensor: {} for sensor in STATUS_CSV.values()}
+    for coluna, (sensor, campo) in COLUNAS_CSV.items():
+        sensors[sensor][campo] = linha.get(coluna)
+    for coluna, sensor in STATUS_CSV.items():
+        if linha.get(coluna):
+            sensors[sensor]["status"] = linha[coluna]
+
+    # O pandas grava "2025-11-12 14:30:00"; a validação converte para o formato do firmware
+    return {"device_id": linha.get("device_id"), "timestamp": linha.get("timestamp"), "seq": linha.get("seq"),
+            "sensors": sensors}
+
+
+def ler_ndjson(caminho: str) -> Iterator[Tuple[int, object]]:
+    """(número da linha, leitura ou mensagem de erro) para cada linha não vazia"""
+    with (gzip.open if caminho.endswith(".gz") else open)(caminho, "rt", encoding="utf-8") as arquivo:
+        for numero, linha in enumerate(arquivo, start=1):
+            if not linha.strip():
+                continue
+            try:
+                item = json.loads(linha)
+                if isinstance(item, dict) and "sensors" not in item and "d" in item:
+                    item = leitura_de_mapa_compacto(item)
+            except ValueError as e:
+                item = f"Linha inválida: {str(e)}"
+            yield numero, item
+
+
+def em_lotes(linhas: Iterator[Tuple[int, object]], tamanho: int) -> Iterator[Tuple[int, list]]:
+    """(índice do lote, linhas) com `tamanho` linhas cada, em ordem"""
+    lote, indice = [], 0
+    for linha in linhas:
+        lote.append(linha)
+        if len(lote) == tamanho:
+            yield indice, lote
+            lote, indice = [], indice + 1
+    if lote:
+        yield indice, lote
+
+
+# ========================================
+# VALIDAÇÃO E GRAVAÇÃO DE UM LOTE
+# ========================================
+
+def validar_lote(linhas: list, fuso: timezone) -> Tuple[List[Tuple[str, dict]], List[dict]]:
+    """
+    Valida um lote de uma vez e monta os documentos do Firestore
+
+    Returns:
+        tuple: ([(doc_id, documento)], [{"linha", "erro"}])
+    """
+    candidatos, rejeitadas = [], []
+    for numero, item in linhas:
+        if isinstance(item, str):
+            rejeitadas.append({"linha": numero, "erro": item})
+        else:
+            candidatos.append((numero, item))
+
+    validas, invalidas = validar_itens([item for _, item in candidatos])
+    for invalida in invalidas:
+        erro = invalida["erro"][0]  # Primeiro erro da linha
+        caminho = ".".join(str(parte) for parte in erro["loc"])
+        rejeitadas.append({"linha": candidatos[invalida["indice"]][0],
+                           "erro": f"{caminho}: {erro['msg']}" if caminho else erro["msg"]})
+
+    documentos = []
+    for indice, leitura in validas:
+        numero, item = candidatos[indice]
+        try:
+            recebido = instante_recebido(leitura, item.get("timestamp_recebido"), fuso)
+        except (TypeError, ValueError) as e:
+            rejeitadas.append({"linha": numero, "erro": f"timestamp: {str(e)}"})
+            continue
+        documentos.append((id_da_leitura(leitura), montar_documento(leitura, recebido)))
+    return documentos, rejeitadas
+
+
+def instante_recebido(leitura: dict, recebido, fuso: timezone) -> datetime:
+    """timestamp_recebido exportado ou, sem ele, o horário da coleta no fuso do firmware"""
+    if recebido:
+        return para_datetime(recebido)
+    momento = datetime.fromisoformat(leitura["timestamp"])
+    if momento.tzinfo is None:
+        momento = momento.replace(tzinfo=fuso)
+    return momento.astimezone(timezone.utc)
+
+
+def processar_lote(db, layout, indice: int, linhas: list, fuso: timezone, simular: bool) -> Tuple[int, int, list]:
+    """Valida e grava um lote (executado nas threads do pool)"""
+    documentos, rejeitadas = validar_lote(linhas, fuso)
+    if documentos and not simular:
+        if layout is not None:
+            layout.gravar_documentos(db, documentos)
+        else:
+            gravar_documentos(db, documentos)
+    return indice, len(documentos), rejeitadas
+
+
+# ========================================
+# CHECKPOINT
+# ========================================
+
+class Checkpoint:
+    """
+    Lotes concluídos de uma importação, gravados em JSON de forma atômica
+
+    Guarda uma marca (todos os lotes anteriores concluídos) e os lotes
+    concluídos depois dela, fora de ordem pelas threads.
+    """
+
+    def __init__(self, caminho: Optional[str], arquivo: str, tamanho_lote: int):
+        self.caminho = caminho
+        self.identificacao = {"arquivo": os.path.abspath(arquivo), "bytes": os.path.getsize(arquivo), "lote": tamanho_lote}
+        self.ate = 0
+        self.concluidos = set()
+        self.gravadas = 0
+        self.rejeitadas = 0
+        if caminho and os.path.exists(caminho):
+            with open(caminho, encoding="utf-8") as f:
+                estado = json.load(f)
+            if estado["identificacao"] != self.identificacao:
+                raise SystemExit(f"❌ {caminho} pertence a outra importação (arquivo, tamanho ou --lote diferentes)")
+            self.ate = estado["ate"]
+            self.concluidos = set(estado["concluidos"])
+            self.gravadas = estado["gravadas"]
+            self.rejeitadas = estado["rejeitadas"]
+
+    def concluido(self, indice: int) -> bool:
+        return indice < self.ate or indice in self.concluidos
+
+    def marcar(self, indice: int, gravadas: int, rejeitadas: int):
+        self.concluidos.add(indice)
+        while self.ate in self.concluidos:
+            self.concluidos.remove(self.ate)
+            self.ate += 1
+        self.gravadas += gravadas
+        self.rejeitadas += rejeitadas
+        self.salvar()
+
+    def salvar(self):
+        if not self.caminho:
+            return
+        temporario = f"{self.caminho}.tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump({
+                "identificacao": self.identificacao, "ate": self.ate, "concluidos": sorted(self.concluidos),
+                "gravadas": self.gravadas, "rejeitadas": self.rejeitadas,
+            }, f)
+        os.replace(temporario, self.caminho)
+
+
+# ========================================
+# IMPORTAÇÃO
+# ========================================
+
+def importar(db, caminho: str, formato: str, layout=None, tamanho_lote: int = 500, workers: int = 8,
+             checkpoint: Optional[str] = None, fuso: timezone = FUSO_FIRMWARE,
+             rejeitadas_em: Optional[str] = None, simular: bool = False, intervalo_relatorio: float = 5.0) -> dict:
+    """
+    Importa um arquivo inteiro, com até `workers` lotes sendo gravados ao mesmo tempo
+
+    Returns:
+        dict: {"lidas", "puladas", "gravadas", "rejeitadas", "segundos", "leituras_por_segundo"}
+    """
+    estado = Checkpoint(checkpoint, caminho, tamanho_lote)
+    linhas = ler_csv(caminho) if formato == "csv" else ler_ndjson(caminho)
+    saida_rejeitadas = open(rejeitadas_em, "a", encoding="utf-8") if rejeitadas_em else None
+    totais = {"lidas": 0, "puladas": 0, "gravadas": 0, "rejeitadas": 0}
+    inicio = ultimo_relatorio = time.monotonic()
+
+    def concluir(futuro):
+        indice, gravadas, rejeitadas = futuro.result()
+        if saida_rejeitadas:
+            for rejeitada in rejeitadas:
+                saida_rejeitadas.write(json.dumps(rejeitada, ensure_ascii=False) + "\n")
+        estado.marcar(indice, gravadas, len(rejeitadas))
+        totais["gravadas"] += gravadas
+        totais["rejeitadas"] += len(rejeitadas)
+
+    def relatar():
+        decorrido = time.monotonic() - inicio
+        print(f"📦 {totais['lidas']} lidas | {totais['gravadas']} gravadas | {totais['rejeitadas']} rejeitadas"
+              f" | {totais['puladas']} puladas | {totais['gravadas'] / decorrido if decorrido else 0:.0f} leituras/s")
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pendentes = set()
+            try:
+                for indice, lote in em_lotes(linhas, tamanho_lote):
+                    totais["lidas"] += len(lote)
+                    if estado.concluido(indice):
+                        totais["puladas"] += len(lote)
+                        continue
+                    # No máximo 2x workers lotes em memória
+                    while len(pendentes) >= 2 * workers:
+                        feitos, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+                        for futuro in feitos:
+                            concluir(futuro)
+                    pendentes.add(executor.submit(processar_lote, db, layout, indice, lote, fuso, simular))
+
+                    if time.monotonic() - ultimo_relatorio >= intervalo_relatorio:
+                        relatar()
+                        ultimo_relatorio = time.monotonic()
+                for futuro in wait(pendentes).done:
+                    concluir(futuro)
+            except BaseException:
+                for futuro in pendentes:
+                    futuro.cancel()
+                raise
+    finally:
+        if saida_rejeitadas:
+            saida_rejeitadas.close()
+
+    relatar()
+    segundos = time.monotonic() - inicio
+    return {
+        **totais,
+        "segundos": round(segundos, 2),
+        "leituras_por_segundo": round(totais["gravadas"] / segundos) if segundos else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa leituras históricas (CSV do dashboard ou NDJSON) no Firestore")
+    parser.add_argument("arquivo", help="Arquivo .csv, .ndjson/.jsonl (ou .gz)")
+    parser.add_argument("--formato", choices=["csv", "ndjson"], default=None,
+                        help="Formato do arquivo (padrão: pela extensão)")
+    parser.add_argument("--credenciais",
+                        default=os.getenv("FIREBASE_CREDENTIALS_PATH", "config/firebase-credentials.json"))
+    parser.add_argument("--lote", type=int, default=500, help="Leituras por lote (validação e gravação)")
+    parser.add_argument("--workers", type=int, default=8, help="Lotes gravados ao mesmo tempo")
+    parser.add_argument("--checkpoint", default=None, help="Arquivo JSON para retomar uma importação interrompida")
+    parser.add_argument("--fuso", default=os.getenv("FUSO_FIRMWARE", "-03:00"),
+                        help="Fuso dos timestamps sem fuso (padrão: FUSO_FIRMWARE ou -03:00, o do firmware)")
+    parser.add_argument("--rejeitadas", default=None, help="Grava as linhas rejeitadas (NDJSON) neste arquivo")
+    parser.add_argument("--particionado", action="store_true",
+                        default=os.getenv("LAYOUT_PARTICIONADO", "0") in ["1", "true", "True", "TRUE"],
+                        help="Grava no layout particionado (padrão: LAYOUT_PARTICIONADO)")
+    parser.add_argument("--simular", action="store_true", help="Apenas lê e valida, sem gravar")
+    args = parser.parse_args()
+
+    formato = args.formato or ("csv" if args.arquivo.removesuffix(".gz").endswith(".csv") else "ndjson")
+
+    db, layout = None, None
+    if not args.simular:
+        import firebase_admin
+        from firebase_admin import credentials, firestore
+
+        firebase_admin.initialize_app(credentials.Certificate(args.credenciais))
+        db = firestore.client()
+        if args.particionado:
+            from particionamento import LayoutParticionado
+            layout = LayoutParticionado()
+
+    resultado = importar(
+        db,
+        args.arquivo,
+        formato,
+        layout=layout,
+        tamanho_lote=args.lote,
+        workers=args.workers,
+        checkpoint=args.checkpoint,
+        fuso=interpretar_fuso(args.fuso),
+        rejeitadas_em=args.rejeitadas,
+        simular=args.simular,
+    )
+    verbo = "validadas" if args.simular else "gravadas"
+    print(f"✅ Importação concluída: {resultado['gravadas']} leituras {verbo}, {resultado['rejeitadas']} rejeitadas,"
+          f" {resultado['puladas']} já importadas, em {resultado['segundos']}s"
+          f" ({resultado['leituras_por_segundo']} leituras/s)")
+
+
+if __name__ == "__main__":
+    main()
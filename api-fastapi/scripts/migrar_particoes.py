@@ -0,0 +1,100 @@
+"""
+MIGRAÇÃO PARA O LAYOUT PARTICIONADO
+Sistema de Monitoramento de Telhado Verde
+
+Copia as leituras da coleção única `sensor_readings` para as partições
+devices/{device_id}/readings/{aaaa-mm}/leituras (ver particionamento.py),
+mantendo o mesmo ID e o mesmo conteúdo de cada documento.
+
+A coleção de origem é percorrida em ordem de ID, em lotes. A cópia usa
+set(), então repetir a migração não duplica nada; o último ID copiado é
+mostrado a cada lote e pode ser passado em --a-partir-de para retomar.
+Com --remover-origem, cada lote é apagado de `sensor_readings` depois de
+copiado.
+
+Depois da migração, ative LAYOUT_PARTICIONADO=1 na API.
+
+Autor: Equipe Projeto Integrador 4 - UFSM
+Uso: python scripts/migrar_particoes.py --lote 300 --remover-origem
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# Permite importar os módulos da API a partir de scripts/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from armazenamento import COLECAO_LEITURAS, TAMANHO_MAXIMO_BATCH  # noqa: E402
+from particionamento import LayoutParticionado  # noqa: E402
+
+
+def migrar(db, layout, tamanho_lote=300, pausa=0.5, a_partir_de=None, remover_origem=False, simular=False):
+    """
+    Copia todas as leituras de sensor_readings para as partições
+
+    Returns:
+        int: Documentos copiados (ou encontrados, com simular=True)
+    """
+    origem = db.collection(COLECAO_LEITURAS)
+    ultimo = origem.document(a_partir_de).get() if a_partir_de else None
+    total = 0
+
+    while True:
+        query = origem.order_by("__name__")
+        if ultimo is not None and not remover_origem:
+            query = query.start_after(ultimo)
+        docs = list(query.limit(tamanho_lote).stream())
+        if not docs:
+            return total
+        total += len(docs)
+        ultimo = docs[-1]
+        if simular:
+            continue
+
+        layout.gravar_documentos(db, [(doc.id, doc.to_dict()) for doc in docs])
+        if remover_origem:
+            batch = db.batch()
+            for doc in docs:
+                batch.delete(doc.reference)
+            batch.commit()
+        print(f"📦 {total} leituras migradas (último ID: {ultimo.id})")
+        time.sleep(pausa)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migra sensor_readings para o layout particionado")
+    parser.add_argument("--credenciais",
+                        default=os.getenv("FIREBASE_CREDENTIALS_PATH", "config/firebase-credentials.json"))
+    parser.add_argument("--lote", type=int, default=300, help="Leituras por lote")
+    parser.add_argument("--pausa", type=float, default=0.5, help="Pausa entre lotes, em segundos")
+    parser.add_argument("--a-partir-de", default=None, help="Retoma após este ID de documento")
+    parser.add_argument("--remover-origem", action="store_true",
+                        help="Apaga cada lote de sensor_readings após copiá-lo")
+    parser.add_argument("--simular", action="store_true", help="Apenas conta as leituras a migrar")
+    args = parser.parse_args()
+
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    firebase_admin.initialize_app(credentials.Certificate(args.credenciais))
+    db = firestore.client()
+
+    total = migrar(
+        db,
+        LayoutParticionado(),
+        tamanho_lote=min(args.lote, TAMANHO_MAXIMO_BATCH),
+        pausa=args.pausa,
+        a_partir_de=args.a_partir_de,
+        remover_origem=args.remover_origem,
+        simular=args.simular,
+    )
+    if args.simular:
+        print(f"📋 {total} leituras a migrar")
+    else:
+        print(f"✅ Migração concluída: {total} leituras")
+
+
+if __name__ == "__main__":
+    main()
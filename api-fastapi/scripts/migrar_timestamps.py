@@ -0,0 +1,99 @@
+"""
+MIGRAÇÃO DE timestamp_recebido PARA TIMESTAMP NATIVO
+Sistema de Monitoramento de Telhado Verde
+
+Documentos gravados antes desta versão têm `timestamp_recebido` em texto
+ISO (horário local do servidor, sem fuso). O Firestore ordena e filtra
+valores de tipos diferentes separadamente, então consultas por intervalo
+de tempo e a ordenação de GET /sensor-data só enxergam corretamente os
+documentos com timestamp nativo.
+
+O script converte, em lotes, os documentos que ainda têm o valor em texto.
+A consulta `timestamp_recebido >= ""` retorna apenas valores do tipo texto,
+então cada lote convertido sai do resultado e a migração pode ser
+interrompida e retomada a qualquer momento.
+
+Autor: Equipe Projeto Integrador 4 - UFSM
+Uso: python scripts/migrar_timestamps.py --colecoes sensor_readings,sensor_readings_5min --simular
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# Permite importar os módulos da API a partir de scripts/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from armazenamento import TAMANHO_MAXIMO_BATCH, para_datetime  # noqa: E402
+
+CAMPO = "timestamp_recebido"
+
+
+def consulta_pendentes(db, colecao):
+    """Documentos cujo timestamp_recebido ainda é texto"""
+    return db.collection(colecao).where(CAMPO, ">=", "").order_by(CAMPO)
+
+
+def contar_pendentes(db, colecao, tamanho_lote):
+    """Conta os documentos pendentes sem alterar nada (modo --simular)"""
+    total, ultimo = 0, None
+    while True:
+        query = consulta_pendentes(db, colecao)
+        if ultimo is not None:
+            query = query.start_after(ultimo)
+        docs = list(query.limit(tamanho_lote).stream())
+        if not docs:
+            return total
+        total += len(docs)
+        ultimo = docs[-1]
+
+
+def migrar_colecao(db, colecao, tamanho_lote=400, pausa=0.5):
+    """
+    Converte timestamp_recebido de texto para datetime em uma coleção
+
+    Returns:
+        int: Documentos convertidos
+    """
+    convertidos = 0
+    while True:
+        docs = list(consulta_pendentes(db, colecao).limit(tamanho_lote).stream())
+        if not docs:
+            return convertidos
+        batch = db.batch()
+        for doc in docs:
+            batch.update(doc.reference, {CAMPO: para_datetime(doc.to_dict()[CAMPO])})
+        batch.commit()
+        convertidos += len(docs)
+        print(f"🔄 {colecao}: {convertidos} documentos convertidos")
+        time.sleep(pausa)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Converte timestamp_recebido em timestamp nativo do Firestore")
+    parser.add_argument("--credenciais",
+                        default=os.getenv("FIREBASE_CREDENTIALS_PATH", "config/firebase-credentials.json"))
+    parser.add_argument("--colecoes", default="sensor_readings,sensor_readings_5min,sensor_readings_1h",
+                        help="Coleções separadas por vírgula")
+    parser.add_argument("--lote", type=int, default=400, help="Documentos por batch (máx. 500)")
+    parser.add_argument("--pausa", type=float, default=0.5, help="Pausa entre batches, em segundos")
+    parser.add_argument("--simular", action="store_true", help="Apenas conta os documentos pendentes")
+    args = parser.parse_args()
+
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    firebase_admin.initialize_app(credentials.Certificate(args.credenciais))
+    db = firestore.client()
+    tamanho_lote = min(args.lote, TAMANHO_MAXIMO_BATCH)
+
+    for colecao in (c.strip() for c in args.colecoes.split(",") if c.strip()):
+        if args.simular:
+            print(f"📋 {colecao}: {contar_pendentes(db, colecao, tamanho_lote)} documentos a converter")
+        else:
+            print(f"✅ {colecao}: {migrar_colecao(db, colecao, tamanho_lote, args.pausa)} documentos convertidos")
+
+
+if __name__ == "__main__":
+    main()
@@ -63,6 +63,11 @@ def enviar_leitura(leitura, numero):
             resultado = response.json()
             print("\n✅ SUCESSO!")
             print(f"Firebase ID: {resultado['firestore_id']}")
+        elif response.status_code == 429:
+            # Limite de envios por dispositivo/IP da API: respeita o Retry-After
+            espera = int(response.headers.get("Retry-After", "1"))
+            print(f"\n⏳ Limite de envios atingido, aguardando {espera}s")
+            time.sleep(espera)
         else:
             print(f"\nErro: {response.status_code}")
             print(response.text)
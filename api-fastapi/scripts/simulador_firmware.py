@@ -0,0 +1,263 @@
+"""
+SIMULADOR DO FIRMWARE ESP32 (BUFFER + ENVIO EM LOTES)
+Sistema de Monitoramento de Telhado Verde
+
+Reproduz em Python a lógica de hardware/main.ino para testar a API sem a
+placa física:
+- Uma leitura a cada intervalo de leitura (relógio simulado, sem esperar):
+  começa em READ_INTERVAL e segue o intervalo_recomendado_ms das respostas
+  da API (amostragem adaptativa, ver intervalo_adaptativo.py)
+- Buffer circular com capacidade fixa (descarta a mais antiga quando cheio)
+- Envio em lotes para POST /sensor-data/batch por uma conexão persistente,
+  quando o lote enche ou a leitura mais antiga espera BATCH_MAX_WAIT
+  ou, com --transporte mqtt, publicação em telhado/<device_id>/readings
+  (QoS 1) em um broker MQTT (ver gateway_mqtt.py)
+- Quedas de Wi-Fi simuladas: o lote fica no buffer e é reenviado depois
+
+Autor: Equipe Projeto Integrador 4 - UFSM
+Uso: python simulador_firmware.py --leituras 120 --queda-wifi 0.2
+"""
+
+import argparse
+import json
+import random
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+import requests
+
+from dados_simulados import LEITURAS_SIMULADAS
+
+# ========================================
+# CONFIGURAÇÕES (mesmos valores padrão do firmware)
+# ========================================
+
+API_URL = "http://localhost:8000"
+REQUEST_TIMEOUT = 10  # Timeout para requisições HTTP em segundos
+
+READ_INTERVAL = timedelta(seconds=30)  # READ_INTERVAL_DEFAULT_MS
+READ_INTERVAL_MIN = timedelta(seconds=10)    # READ_INTERVAL_MIN_MS
+READ_INTERVAL_MAX = timedelta(minutes=15)    # READ_INTERVAL_MAX_MS
+BUFFER_CAPACITY = 120                  # BUFFER_CAPACITY (~1 h de leituras)
+BATCH_SIZE = 10                        # BATCH_SIZE
+BATCH_MAX_WAIT = timedelta(minutes=5)  # BATCH_MAX_WAIT_MS
+HCSR04_MIN_CM, HCSR04_MAX_CM = 2.0, 400.0  # HCSR04_MIN_CM / HCSR04_MAX_CM
+BIT_ERRO_HCSR04 = 4                    # Bit do HC-SR04 no campo "e"
+
+
+# ========================================
+# FIRMWARE SIMULADO
+# ========================================
+
+class FirmwareSimulado:
+    """
+    Estado do firmware: buffer circular, número de sequência e relógio
+
+    Args:
+        device_id (str): DEVICE_ID do dispositivo simulado
+        enviar (callable): Função que recebe a lista de leituras compactas e
+            retorna o corpo da resposta (dict) se o servidor aceitou o lote
+            (2xx) ou None em caso de falha
+        capacidade (int): Tamanho do buffer circular
+        tamanho_lote (int): Leituras por envio
+        inicio (datetime, optional): Horário da primeira leitura
+    """
+
+    def __init__(self, device_id, enviar, capacidade=BUFFER_CAPACITY,
+                 tamanho_lote=BATCH_SIZE, inicio=None):
+        self.device_id = device_id
+        self.enviar = enviar
+        self.tamanho_lote = tamanho_lote
+        self.buffer = deque(maxlen=capacidade)
+        self.relogio = inicio or datetime.now().replace(microsecond=0)
+        self.intervalo = READ_INTERVAL
+        self.seq = 0
+
+        # Estatísticas
+        self.coletadas = 0
+        self.descartadas = 0
+        self.enviadas = 0
+        self.lotes_enviados = 0
+        self.falhas_envio = 0
+
+    def coletar(self, base):
+        """Gera uma leitura compacta a partir de uma leitura simulada"""
+        sensors = base["sensors"]
+        distancia = sensors["hcsr04"]["distance"]
+        erros = 0
+        # Como o firmware: sem eco ou fora do alcance, envia -1 com o bit de erro
+        if not HCSR04_MIN_CM <= distancia <= HCSR04_MAX_CM:
+            distancia = -1
+            erros |= BIT_ERRO_HCSR04
+        leitura = {
+            "d": self.device_id,
+            "t": self.relogio.isoformat(),
+            "q": self.seq,
+            "st": sensors["ds18b20"]["temperature"],
+            "at": sensors["dht11"]["temperature"],
+            "ah": sensors["dht11"]["humidity"],
+            "dist": distancia,
+            "sm": sensors["hl69"]["soil_moisture"],
+            "raw": sensors["hl69"]["raw_value"],
+            "e": erros,
+        }
+        if len(self.buffer) == self.buffer.maxlen:
+            self.descartadas += 1  # Buffer cheio: a mais antiga é sobrescrita
+        self.buffer.append(leitura)
+        self.seq += 1
+        self.coletadas += 1
+        self.relogio += self.intervalo
+
+    def descarregar(self, wifi_conectado=True, forcar=False):
+        """Envia lotes enquanto o lote estiver cheio ou a leitura mais antiga esperar demais (ou tudo, se forcar)"""
+        while self.buffer and (forcar or len(self.buffer) >= self.tamanho_lote or self._espera_excedida()):
+            if not wifi_conectado:
+                return
+            lote = [self.buffer[i] for i in range(min(self.tamanho_lote, len(self.buffer)))]
+            resposta = self.enviar(lote)
+            if resposta is None:
+                self.falhas_envio += 1
+                return  # Mantém no buffer para a próxima tentativa
+            for _ in lote:
+                self.buffer.popleft()
+            self.enviadas += len(lote)
+            self.lotes_enviados += 1
+            self.seguir_intervalo(resposta.get("intervalo_recomendado_ms"))
+
+    def _espera_excedida(self):
+        """A leitura mais antiga do buffer já espera BATCH_MAX_WAIT (intervalos longos)"""
+        return self.relogio - datetime.fromisoformat(self.buffer[0]["t"]) > BATCH_MAX_WAIT
+
+    def seguir_intervalo(self, intervalo_ms):
+        """Adota o intervalo recomendado pela API, limitado como no firmware"""
+        if not intervalo_ms:
+            return
+        intervalo = min(max(timedelta(milliseconds=intervalo_ms), READ_INTERVAL_MIN), READ_INTERVAL_MAX)
+        if intervalo != self.intervalo:
+            print(f"  ⏱️ Intervalo de leitura: {self.intervalo.total_seconds():.0f} s -> "
+                  f"{intervalo.total_seconds():.0f} s")
+        self.intervalo = intervalo
+
+
+def criar_envio_http(url, formato="msgpack"):
+    """Cria a função de envio usando uma sessão HTTP persistente (keep-alive)"""
+    sessao = requests.Session()
+    endpoint = f"{url.rstrip('/')}/sensor-data/batch"
+
+    def enviar(lote):
+        if formato == "msgpack":
+            import msgpack
+            corpo, tipo = msgpack.packb(lote), "application/msgpack"
+        else:
+            corpo, tipo = json.dumps(lote).encode("utf-8"), "application/json"
+        try:
+            resposta = sessao.post(endpoint, data=corpo, headers={"Content-Type": tipo},
+                                   timeout=REQUEST_TIMEOUT)
+        except requests.exceptions.RequestException as e:
+            print(f"  ❌ Falha de conexão: {str(e)}")
+            return None
+        if 200 <= resposta.status_code < 300:
+            resultado = resposta.json()
+            print(f"  ✅ Lote: {resultado['salvas']} salvas, {resultado['duplicadas']} duplicadas, "
+                  f"{len(resultado['rejeitadas'])} rejeitadas ({len(corpo)} bytes)")
+            return resultado
+        print(f"  ❌ Erro {resposta.status_code}: {resposta.text}")
+        return None
+
+    return enviar
+
+
+def criar_envio_mqtt(host, porta, device_id, formato="msgpack"):
+    """
+    Cria a função de envio publicando cada lote com QoS 1 (conexão MQTT persistente)
+
+    O MQTT não tem resposta por mensagem: o intervalo de leitura fica fixo.
+    """
+    import paho.mqtt.client as mqtt
+
+    cliente = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=device_id)
+    cliente.connect(host, porta, keepalive=60)
+    cliente.loop_start()
+    topico = f"telhado/{device_id}/readings"
+
+    def enviar(lote):
+        if formato == "msgpack":
+            import msgpack
+            corpo = msgpack.packb(lote)
+        else:
+            corpo = json.dumps(lote).encode("utf-8")
+        info = cliente.publish(topico, corpo, qos=1)
+        try:
+            info.wait_for_publish(timeout=REQUEST_TIMEOUT)  # PUBACK do broker: o lote fica com ele até a API gravar
+        except RuntimeError as e:
+            print(f"  ❌ Falha de conexão: {str(e)}")
+            return None
+        if not info.is_published():
+            print("  ❌ Sem PUBACK do broker")
+            return None
+        print(f"  ✅ Lote publicado: {len(lote)} leituras ({len(corpo)} bytes)")
+        return {}
+
+    return enviar
+
+
+# ========================================
+# FUNÇÃO PRINCIPAL
+# ========================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulador do firmware ESP32 com envio em lotes")
+    parser.add_argument("--url", default=API_URL, help="URL base da API")
+    parser.add_argument("--device-id", default="ESP32_SIMULADO")
+    parser.add_argument("--leituras", type=int, default=60, help="Quantidade de leituras a coletar")
+    parser.add_argument("--lote", type=int, default=BATCH_SIZE, help="Leituras por envio")
+    parser.add_argument("--capacidade", type=int, default=BUFFER_CAPACITY, help="Tamanho do buffer")
+    parser.add_argument("--queda-wifi", type=float, default=0.0,
+                        help="Probabilidade de o Wi-Fi estar fora em cada ciclo (0-1)")
+    parser.add_argument("--formato", choices=["msgpack", "json"], default="msgpack")
+    parser.add_argument("--transporte", choices=["http", "mqtt"], default="http",
+                        help="POST /sensor-data/batch ou publicação MQTT")
+    parser.add_argument("--mqtt-host", default="localhost")
+    parser.add_argument("--mqtt-porta", type=int, default=1883)
+    parser.add_argument("--pausa", type=float, default=0.0,
+                        help="Pausa real entre leituras em segundos (relógio simulado avança o intervalo de leitura)")
+    args = parser.parse_args()
+
+    if args.transporte == "mqtt":
+        enviar = criar_envio_mqtt(args.mqtt_host, args.mqtt_porta, args.device_id, args.formato)
+    else:
+        enviar = criar_envio_http(args.url, args.formato)
+    firmware = FirmwareSimulado(
+        args.device_id, enviar,
+        capacidade=args.capacidade, tamanho_lote=args.lote
+    )
+
+    print(f"🚀 Simulando {args.leituras} leituras (lote={args.lote}, buffer={args.capacidade}, "
+          f"queda de Wi-Fi={args.queda_wifi:.0%})")
+    inicio = time.time()
+
+    for i in range(args.leituras):
+        firmware.coletar(LEITURAS_SIMULADAS[i % len(LEITURAS_SIMULADAS)])
+        wifi = random.random() >= args.queda_wifi
+        if not wifi:
+            print(f"  📡 Wi-Fi fora no ciclo {i + 1} ({len(firmware.buffer)} no buffer)")
+        firmware.descarregar(wifi_conectado=wifi)
+        if args.pausa:
+            time.sleep(args.pausa)
+
+    # Ao final, envia o que restou no buffer
+    firmware.descarregar(wifi_conectado=True, forcar=True)
+
+    print("\n" + "=" * 60)
+    print(f" Tempo total: {time.time() - inicio:.1f} segundos")
+    print(f" Coletadas: {firmware.coletadas} | Enviadas: {firmware.enviadas} | "
+          f"Descartadas (buffer cheio): {firmware.descartadas}")
+    print(f" Lotes: {firmware.lotes_enviados} | Falhas de envio: {firmware.falhas_envio} | "
+          f"Restantes no buffer: {len(firmware.buffer)}")
+    print(f" Intervalo de leitura final: {firmware.intervalo.total_seconds():.0f} s")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Snapshot do dashboard em uma única resposta
+Sistema de Monitoramento do Telhado Verde - UFSM
+
+Uma renderização do dashboard precisava de várias chamadas (lista de
+dispositivos a partir de 100 leituras completas, dados, métricas derivadas)
+e ainda calculava valores atuais, estatísticas e séries no cliente.
+GET /dashboard/snapshot monta tudo isso no servidor, a partir do mesmo
+resultado compartilhado de GET /sensor-data:
+
+- dispositivos conhecidos
+- última leitura
+- resumo (min/max/mean/std/count) de cada campo numérico
+- série do gráfico em grade regular com no máximo N pontos (média por
+  célula, null nas lacunas)
+- lacunas e completude de cada dispositivo
+- métricas derivadas da janela
+
+O corpo é serializado uma vez por resultado e identificado por um ETag
+(hash do conteúdo); o cliente que envia If-None-Match com o ETag atual
+recebe 304 sem corpo.
+
+Autor: Equipe Projeto Integrador 4 - UFSM
+Data: 2025
+"""
+
+import hashlib
+import json
+import time
+from typing import Iterable, List, Optional
+
+from fastapi.encoders import jsonable_encoder
+
+from estatisticas import resumir_leituras
+from reamostragem import reamostrar_documentos, serie_regular
+
+
+# ========================================
+# MONTAGEM, SERIALIZAÇÃO E ETAG
+# ========================================
+
+def montar_snapshot(documentos: List[dict], dispositivos: List[str], pontos: int,
+                    derivadas: Optional[dict] = None, passo: float = 60.0,
+                    max_interpolar: float = 0.0) -> dict:
+    """
+    Conteúdo do snapshot para uma janela de leituras
+
+    A série do gráfico e as lacunas usam a grade regular de reamostragem.py
+    (passo mínimo `passo`, aumentado para caber em `pontos`). Não inclui o
+    instante de geração: o mesmo resultado gera o mesmo corpo (e o mesmo
+    ETag) enquanto não chegarem leituras novas.
+    """
+    grades = reamostrar_documentos(documentos, passo, max_interpolar=max_interpolar)
+    return {
+        "dispositivos": dispositivos,
+        "total": len(documentos),
+        "ultima_leitura": documentos[0] if documentos else None,
+        "resumo": resumir_leituras(documentos),
+        "serie": serie_regular(documentos, passo, pontos=pontos, max_interpolar=max_interpolar),
+        "lacunas": {
+            device_id: {"completude": grade["completude"], "lacunas": grade["lacunas"]}
+            for device_id, grade in grades.items()
+        },
+        "derivadas": derivadas or {},
+    }
+
+
+def serializar(snapshot: dict) -> tuple:
+    """
+    JSON compacto do snapshot e o ETag correspondente
+
+    Returns:
+        tuple: (corpo em bytes, ETag entre aspas)
+    """
+    corpo = json.dumps(
+        jsonable_encoder(snapshot), ensure_ascii=False, separators=(",", ":"), allow_nan=False
+    ).encode("utf-8")
+    return corpo, f'"{hashlib.blake2b(corpo, digest_size=16).hexdigest()}"'
+
+
+def etag_confere(if_none_match: Optional[str], etag: str) -> bool:
+    """True se o cabeçalho If-None-Match contém o ETag (comparação fraca)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        candidato.strip().removeprefix("W/") == etag
+        for candidato in if_none_match.split(",")
+    )
+
+
+# ========================================
+# DISPOSITIVOS CONHECIDOS
+# ========================================
+
+class DiretorioDispositivos:
+    """
+    device_ids conhecidos pela API, sem consultar o Firestore a cada snapshot
+
+    Reúne os dispositivos vistos na ingestão e nas consultas com os de uma
+    varredura completa, refeita a cada `ttl` segundos.
+
+    Args:
+        ttl (float): Segundos até a próxima varredura
+    """
+
+    def __init__(self, ttl: float = 300.0):
+        self.ttl = ttl
+        self._ids = set()
+        self._varrido_em = None
+
+    def registrar(self, device_ids: Iterable[Optional[str]]):
+        self._ids.update(device_id for device_id in device_ids if device_id)
+
+    @property
+    def expirado(self) -> bool:
+        return self._varrido_em is None or time.monotonic() - self._varrido_em >= self.ttl
+
+    def atualizar(self, device_ids: Iterable[Optional[str]]):
+        """Resultado de uma varredura completa"""
+        self.registrar(device_ids)
+        self._varrido_em = time.monotonic()
+
+    def lista(self) -> List[str]:
+        return sorted(self._ids)
@@ -1,14 +1,22 @@
 import os
+import sys
+import bisect
+import heapq
+import threading
 import streamlit as st
 import firebase_admin
 from firebase_admin import credentials, firestore
 import pandas as pd
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import plotly.express as px
 import requests
 
+# Reamostragem em grade regular compartilhada com a API (api-fastapi/reamostragem.py)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api-fastapi'))
+from reamostragem import reamostrar_documentos, serie_regular
+
 
 # Configuração da página
 st.set_page_config(
@@ -137,33 +145,194 @@ def get_db():
         st.stop()
 
 
+# Espelho local das leituras (modo Firestore direto): janela recente por
+# dispositivo, mantida por um listener on_snapshot e lida por todas as sessões
+ESPELHO_JANELA_HORAS = float(os.getenv("ESPELHO_JANELA_HORAS", "24"))
+ESPELHO_MAX_POR_DISPOSITIVO = int(os.getenv("ESPELHO_MAX_POR_DISPOSITIVO", "500"))
+ESPELHO_ESPERA_INICIAL = float(os.getenv("ESPELHO_ESPERA_INICIAL", "10"))
+
+
+class EspelhoLeituras:
+    """
+    Leituras recentes de sensor_readings em memória, atualizadas por on_snapshot
+
+    O listener entrega uma vez as leituras das últimas `janela_horas` e
+    depois apenas as alterações. Cada dispositivo guarda no máximo `maximo`
+    leituras, indexadas por timestamp_recebido; as consultas do dashboard
+    são respondidas daqui, sem ida ao Firestore.
+    """
+
+    def __init__(self, db, janela_horas: float, maximo: int):
+        self.maximo = maximo
+        self.pronto = threading.Event()  # Primeiro snapshot recebido
+        self.erro = None
+        self._parado = False
+        self._indices = {}  # device_id -> [(timestamp_recebido, id)] em ordem crescente
+        self._leituras = {}  # id -> leitura
+        self._lock = threading.Lock()
+
+        inicio = datetime.now(timezone.utc) - timedelta(hours=janela_horas)
+        query = db.collection('sensor_readings').where('timestamp_recebido', '>=', inicio)
+        self._watch = query.on_snapshot(self._ao_mudar)
+
+    @property
+    def ativo(self) -> bool:
+        return self.erro is None and not self._parado
+
+    def parar(self):
+        self._parado = True
+        self._watch.unsubscribe()
+
+    def _ao_mudar(self, documentos, alteracoes, lido_em):
+        """Callback do listener (thread do Firestore): aplica as alterações"""
+        try:
+            with self._lock:
+                for alteracao in alteracoes:
+                    documento = alteracao.document
+                    self._remover(documento.id)
+                    if alteracao.type.name != 'REMOVED':
+                        self._inserir(documento.id, documento.to_dict())
+            self.pronto.set()
+        except Exception as e:
+            self.erro = e  # get_espelho recria o espelho na próxima execução
+            print(f"❌ Espelho do Firestore interrompido: {str(e)}")
+
+    def _inserir(self, doc_id: str, dados: dict):
+        dados['id'] = doc_id
+        indice = self._indices.setdefault(dados.get('device_id', 'Unknown'), [])
+        bisect.insort(indice, (dados['timestamp_recebido'], doc_id))
+        self._leituras[doc_id] = dados
+        if len(indice) > self.maximo:
+            _, mais_antiga = indice.pop(0)
+            del self._leituras[mais_antiga]
+
+    def _remover(self, doc_id: str):
+        dados = self._leituras.pop(doc_id, None)
+        if dados is not None:
+            indice = self._indices[dados.get('device_id', 'Unknown')]
+            indice.remove((dados['timestamp_recebido'], doc_id))
+
+    def ler(self, limit: int, device_id: str = None) -> list:
+        """Últimas `limit` leituras (do dispositivo ou de todos), da mais recente para a mais antiga"""
+        with self._lock:
+            if device_id:
+                chaves = reversed(self._indices.get(device_id, [])[-limit:])
+            else:
+                recentes = [reversed(indice[-limit:]) for indice in self._indices.values()]
+                chaves = heapq.merge(*recentes, reverse=True)
+            return [dict(self._leituras[doc_id]) for _, doc_id in list(chaves)[:limit]]
+
+    def dispositivos(self) -> list:
+        with self._lock:
+            return sorted(device_id for device_id, indice in self._indices.items() if indice)
+
+
+@st.cache_resource(validate=lambda espelho: espelho.ativo, show_spinner=False)
+def get_espelho(_db):
+    """Um espelho (e um listener) por processo, compartilhado por todas as sessões"""
+    return EspelhoLeituras(_db, ESPELHO_JANELA_HORAS, ESPELHO_MAX_POR_DISPOSITIVO)
+
+
+def espelho_pronto(db):
+    """Espelho com o primeiro snapshot carregado, ou None (consulta direta)"""
+    try:
+        espelho = get_espelho(db)
+    except Exception as e:
+        st.warning(f"⚠️ Espelho do Firestore indisponível: {str(e)}")
+        return None
+    return espelho if espelho.pronto.wait(ESPELHO_ESPERA_INICIAL) and espelho.ativo else None
+
+
 # NEW: Fetch data via API client
 API_URL = os.getenv("API_URL", "http://127.0.0.1:8000")
 USE_API = os.getenv("USE_API", "0") in ["1", "true", "True", "TRUE"]
 
 
-def fetch_via_api(limit: int = 100, device_id: str = None):
-    """Busca dados chamando o endpoint FastAPI /sensor-data"""
+def fetch_payload_via_api(limit: int = 100, device_id: str = None, resumo: bool = False):
+    """Busca a resposta completa do endpoint FastAPI /sensor-data"""
     try:
         params = {"limit": limit}
         if device_id and device_id != "Todos":
             params["device_id"] = device_id
+        if resumo:
+            params["resumo"] = "true"
         url = f"{API_URL.rstrip('/')}/sensor-data"
         resp = requests.get(url, params=params, timeout=10)
         resp.raise_for_status()
-        payload = resp.json()
-        # FastAPI retorna um dicionário com chave 'dados'
-        return payload.get("dados", [])
+        return resp.json()
     except Exception as e:
         st.error(f"❌ Erro ao consultar API ({API_URL}): {str(e)}")
-        return []
+        return {}
+
+
+def fetch_snapshot_via_api(window: int = 100, device_id: str = None):
+    """
+    Busca o snapshot do dashboard (/dashboard/snapshot) em uma única chamada
+
+    Dispositivos, última leitura, resumo, série do gráfico e métricas
+    derivadas já vêm prontos. O último snapshot de cada filtro fica na
+    sessão e é revalidado com If-None-Match: sem leituras novas, a API
+    responde 304 sem corpo.
+    """
+    try:
+        params = {"window": window}
+        if device_id and device_id != "Todos":
+            params["device_id"] = device_id
+        chave = (params.get("device_id"), window)
+        guardados = st.session_state.setdefault('snapshots', {})
+        anterior = guardados.get(chave)
+        headers = {"If-None-Match": anterior['etag']} if anterior and anterior.get('etag') else {}
+        url = f"{API_URL.rstrip('/')}/dashboard/snapshot"
+        resp = requests.get(url, params=params, headers=headers, timeout=10)
+        if resp.status_code == 304 and anterior:
+            return anterior
+        resp.raise_for_status()
+        snapshot = resp.json()
+        snapshot['etag'] = resp.headers.get('ETag')
+        guardados[chave] = snapshot
+        return snapshot
+    except Exception as e:
+        st.error(f"❌ Erro ao consultar API ({API_URL}): {str(e)}")
+        return {}
+
+
+@st.cache_data(ttl=300, max_entries=64, show_spinner=False)
+def fetch_historico_via_api(desde: datetime, ate: datetime, device_id: str = None, pontos: int = 800):
+    """
+    Busca o histórico de um intervalo em /sensor-data/historico
+
+    A API escolhe a resolução pelo número de pontos e devolve min/max/média
+    por faixa. Intervalos já vistos ficam em cache: voltar a um zoom ou
+    deslocamento anterior não faz nova chamada.
+    """
+    try:
+        params = {"desde": desde.isoformat(), "ate": ate.isoformat(), "pontos": pontos}
+        if device_id and device_id != "Todos":
+            params["device_id"] = device_id
+        url = f"{API_URL.rstrip('/')}/sensor-data/historico"
+        resp = requests.get(url, params=params, timeout=30)
+        resp.raise_for_status()
+        return resp.json()
+    except Exception as e:
+        st.error(f"❌ Erro ao consultar histórico ({API_URL}): {str(e)}")
+        return {}
+
+
+def fetch_via_api(limit: int = 100, device_id: str = None):
+    """Busca dados chamando o endpoint FastAPI /sensor-data"""
+    # FastAPI retorna um dicionário com chave 'dados'
+    return fetch_payload_via_api(limit, device_id).get("dados", [])
 
 
 # keep existing ver_dados but rename to fetch_firestore_data for clarity
 
 
 def fetch_firestore_data(db, limit: int = 100, device_id: str = None):
-    """Busca dados do Firebase (fallback)"""
+    """Busca dados do Firebase (fallback): do espelho local ou, sem ele, por consulta"""
+    device_id = None if device_id == "Todos" else device_id
+    espelho = espelho_pronto(db)
+    if espelho is not None:
+        return espelho.ler(limit, device_id)
     try:
         query = db.collection('sensor_readings')
 
@@ -198,6 +367,9 @@ def get_device_ids(db):
                     device_ids.add(entry['device_id'])
             return sorted(list(device_ids))
         else:
+            espelho = espelho_pronto(db)
+            if espelho is not None:
+                return espelho.dispositivos()
             docs = db.collection('sensor_readings').limit(100).stream()
             device_ids = set()
             for doc in docs:
@@ -240,6 +412,84 @@ def parse_dados_to_dataframe(dados):
     return df
 
 
+# Colunas numéricas do DataFrame -> campo correspondente no resumo da API
+COLUNAS_NUMERICAS = {
+    'dht11_temp': 'dht11_temperature',
+    'dht11_humidity': 'dht11_humidity',
+    'ds18b20_temp': 'ds18b20_temperature',
+    'hl69_moisture': 'hl69_soil_moisture',
+    'hl69_raw': 'hl69_raw_value',
+    'hcsr04_distance': 'hcsr04_distance',
+}
+ESTATISTICAS = ['min', 'max', 'mean', 'std', 'count']
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def calcular_resumo(_df, chave_janela):
+    """
+    Calcula min/max/média/desvio/contagem de todas as colunas em uma passada
+
+    O DataFrame não é usado na chave do cache (prefixo "_"); a janela de
+    dados é identificada por `chave_janela`, então cada rerun com os mesmos
+    dados reaproveita o resumo já calculado.
+    """
+    return _df[list(COLUNAS_NUMERICAS)].apply(pd.to_numeric, errors='coerce').agg(ESTATISTICAS)
+
+
+def resumo_da_api(resumo):
+    """Converte o "resumo" de GET /sensor-data para o formato de calcular_resumo"""
+    return pd.DataFrame(
+        {coluna: resumo.get(campo, {}) for coluna, campo in COLUNAS_NUMERICAS.items()},
+        index=ESTATISTICAS,
+        dtype=float,
+    )
+
+
+def serie_para_dataframe(serie):
+    """Converte a "serie" do snapshot para as colunas de parse_dados_to_dataframe"""
+    df = pd.DataFrame({coluna: serie.get(campo, []) for coluna, campo in COLUNAS_NUMERICAS.items()}, dtype=float)
+    df.insert(0, 'timestamp', pd.to_datetime(serie.get('timestamp', []), format='ISO8601'))
+    return df
+
+
+# Modo Firestore direto: grade regular do gráfico (mesmos padrões da API)
+GRADE_PASSO = float(os.getenv("GRADE_PASSO", "60"))
+GRADE_INTERPOLAR = float(os.getenv("GRADE_INTERPOLAR", "300"))
+GRADE_PONTOS = int(os.getenv("GRADE_PONTOS", "200"))
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def grade_da_janela(_dados, chave_janela):
+    """
+    Série do gráfico e lacunas por dispositivo, como no snapshot da API
+
+    As leituras são alinhadas em uma grade regular (células sem leitura
+    ficam vazias e quebram as linhas do gráfico); a janela é identificada
+    por `chave_janela`, como em calcular_resumo.
+    """
+    grades = reamostrar_documentos(_dados, GRADE_PASSO, max_interpolar=GRADE_INTERPOLAR)
+    lacunas = {
+        device_id: {'completude': grade['completude'], 'lacunas': grade['lacunas']}
+        for device_id, grade in grades.items()
+    }
+    return serie_regular(_dados, GRADE_PASSO, pontos=GRADE_PONTOS, max_interpolar=GRADE_INTERPOLAR), lacunas
+
+
+def resumo_lacunas(lacunas):
+    """Texto do rodapé: menor completude entre os dispositivos e total de lacunas"""
+    if not lacunas:
+        return "-"
+    completude = min(grade['completude'] for grade in lacunas.values())
+    quantidade = sum(len(grade['lacunas']) for grade in lacunas.values())
+    return f"{completude:.1f}% ({quantidade} lacuna{'s' if quantidade != 1 else ''})"
+
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def dados_brutos_via_api(device_param, data_limit, chave_janela):
+    """Leituras completas da janela (o snapshot traz apenas a série reduzida)"""
+    return parse_dados_to_dataframe(fetch_via_api(limit=data_limit, device_id=device_param))
+
+
 def create_compact_overview_chart(df):
     """Cria um gráfico compacto com todos os sensores principais - theme aware"""
     fig = make_subplots(
@@ -347,6 +597,55 @@ def create_compact_overview_chart(df):
     return fig
 
 
+def create_derivadas_chart(series):
+    """Gráfico das métricas derivadas (uma linha por dispositivo), sem cálculo local"""
+    fig = make_subplots(
+        rows=1, cols=3,
+        subplot_titles=(
+            '🪣 Volume do Reservatório (L)',
+            '🌱 Variação da Umidade do Solo (%/h)',
+            '🏠 Amortecimento Térmico (°C)'
+        ),
+        horizontal_spacing=0.08
+    )
+    for device_id, serie in series.items():
+        x = pd.to_datetime(serie['timestamp'])
+        for coluna, metrica in enumerate(['volume_litros', 'taxa_umidade_solo', 'amortecimento_termico'], start=1):
+            fig.add_trace(
+                go.Scatter(x=x, y=serie[metrica], name=device_id, legendgroup=device_id,
+                           showlegend=coluna == 1, mode='lines'),
+                row=1, col=coluna
+            )
+    fig.update_layout(height=320, margin=dict(l=20, r=20, t=40, b=20), template="plotly")
+    return fig
+
+
+def create_historico_chart(serie, campo, titulo, unidade):
+    """Faixa min/max e média de um campo, como devolvidas por /sensor-data/historico"""
+    x = pd.to_datetime(serie['timestamp'], utc=True)
+    valores = serie[campo]
+    fig = go.Figure([
+        go.Scatter(x=x, y=valores['max'], mode='lines', line=dict(width=0), name='Máximo',
+                   hovertemplate=f'máx %{{y:.1f}}{unidade}<extra></extra>'),
+        go.Scatter(x=x, y=valores['min'], mode='lines', line=dict(width=0), name='Mínimo',
+                   fill='tonexty', fillcolor='rgba(46, 134, 171, 0.25)',
+                   hovertemplate=f'mín %{{y:.1f}}{unidade}<extra></extra>'),
+        go.Scatter(x=x, y=valores['media'], mode='lines', name='Média',
+                   line=dict(color='#2E86AB', width=2),
+                   hovertemplate=f'<b>%{{y:.1f}}{unidade}</b><extra></extra>'),
+    ])
+    fig.update_layout(
+        height=360,
+        title=dict(text=titulo, font=dict(size=14)),
+        showlegend=False,
+        hovermode='x unified',
+        dragmode='select',  # Arrastar seleciona o intervalo do próximo zoom
+        margin=dict(l=60, r=20, t=40, b=40),
+        template="plotly"
+    )
+    return fig
+
+
 def create_mini_gauge(value, title, min_val, max_val, color, unit):
     """Cria um mini gauge compacto - theme aware"""
     fig = go.Figure(go.Indicator(
@@ -375,77 +674,90 @@ def create_mini_gauge(value, title, min_val, max_val, color, unit):
     return fig
 
 
-def main():
-    # Header
-    col_title, col_controls = st.columns([4, 1])
-    
-    with col_title:
-        st.title("🌱 Dashboard IoT - Telhado Verde")
-    
-    with col_controls:
-        if st.button("🔄 Atualizar", type="primary"):
-            st.cache_resource.clear()
-            st.rerun()
-    
-    # Conecta ao Firebase apenas se necessário (fallback)
-    db = None
-    if not USE_API:
-        db = get_db()
+# Intervalo do auto-refresh do painel ao vivo, em segundos
+INTERVALO_AUTO_REFRESH = 10
 
-    # Filtros
-    st.markdown("---")
-    filter_col1, filter_col2, filter_col3 = st.columns([3, 2, 2])
-    
-    with filter_col1:
-        device_ids = ["Todos"] + get_device_ids(db)
-        selected_device = st.selectbox("📱 Selecione o Dispositivo", device_ids)
-    
-    with filter_col2:
-        data_limit = st.select_slider(
-            "📊 Número de Leituras", 
-            options=[10, 25, 50, 100, 200, 500], 
-            value=100
-        )
-    
-    with filter_col3:
-        auto_refresh = st.checkbox("🔄 Auto-refresh (10s)", value=False)
-    
-    st.markdown("---")
-    
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def gerar_arquivo(_df, chave_janela, formato):
+    """
+    Conteúdo do download (CSV ou Parquet) da janela exibida
+
+    Gerado apenas quando o arquivo é pedido; a janela é identificada por
+    `chave_janela`, como em calcular_resumo.
+    """
+    if formato == 'Parquet':
+        return _df.to_parquet(index=False)
+    return _df.to_csv(index=False).encode('utf-8')
+
+
+def painel_ao_vivo(db, device_param, data_limit):
+    """
+    Leituras atuais, histórico, métricas derivadas e indicadores visuais
+
+    Executado como fragmento (st.fragment): o auto-refresh reexecuta apenas
+    este painel. A janela carregada fica em st.session_state['janela'] para
+    os painéis sob demanda.
+    """
     # Busca dados
     with st.spinner("🔄 Carregando dados..."):
-        device_param = None if selected_device == "Todos" else selected_device
+        series = None
         if USE_API:
-            dados = fetch_via_api(limit=data_limit, device_id=device_param)
+            # Uma única chamada; na execução completa da página o snapshot já
+            # foi buscado junto com a lista de dispositivos
+            if 'snapshot_pronto' in st.session_state:
+                snapshot = st.session_state.pop('snapshot_pronto')
+            else:
+                snapshot = fetch_snapshot_via_api(window=data_limit, device_id=device_param)
+            ultima_leitura = snapshot.get('ultima_leitura')
+            if ultima_leitura:
+                resumo = resumo_da_api(snapshot['resumo'])
+                df = serie_para_dataframe(snapshot['serie'])
+                df_completo = None  # Buscado apenas se o painel de dados brutos for aberto
+                total = snapshot['total']
+                series = snapshot.get('derivadas')
+                lacunas = snapshot.get('lacunas', {})
+                chave_janela = (device_param, data_limit, snapshot.get('etag'))
         else:
             dados = fetch_firestore_data(db, limit=data_limit, device_id=device_param)
+            ultima_leitura = dados[0] if dados else None
+            if dados:
+                df_completo = parse_dados_to_dataframe(dados)
+                total = len(dados)
+                chave_janela = (device_param, data_limit, len(dados), dados[0].get('id'), dados[-1].get('id'))
+                resumo = calcular_resumo(df_completo, chave_janela)
+                serie, lacunas = grade_da_janela(dados, chave_janela)
+                df = serie_para_dataframe(serie)
 
-        if not dados:
+        if not ultima_leitura:
+            st.session_state.pop('janela', None)
             st.warning("⚠️ Nenhum dado encontrado para os filtros selecionados.")
-            st.stop()
+            return
+    st.session_state['janela'] = {
+        'ultima': ultima_leitura, 'df': df_completo, 'resumo': resumo, 'chave': chave_janela,
+        'filtros': (device_param, data_limit),
+    }
+    media = resumo.loc['mean']
 
-        df = parse_dados_to_dataframe(dados)
-    
     # Última leitura
-    ultima_leitura = dados[0]
     sensors = ultima_leitura.get('sensors', {})
-    
+
     # Métricas principais usando st.metric nativo
     st.subheader("📊 Leituras Atuais")
     col1, col2, col3, col4, col5 = st.columns(5)
-    
+
     dht11_temp = sensors.get('dht11', {}).get('temperature', 0)
     dht11_hum = sensors.get('dht11', {}).get('humidity', 0)
     ds18b20_temp = sensors.get('ds18b20', {}).get('temperature', 0)
     hl69_moisture = sensors.get('hl69', {}).get('soil_moisture', 0)
     hcsr04_dist = sensors.get('hcsr04', {}).get('distance', 0)
-    
+
     with col1:
         status = "🟢" if sensors.get('dht11', {}).get('status') == "ok" else "🔴"
         st.metric(
             label=f"{status} Temp Ar (DHT11)",
             value=f"{dht11_temp:.1f}°C",
-            delta=f"{dht11_temp - df['dht11_temp'].mean():.1f}°C"
+            delta=f"{dht11_temp - media['dht11_temp']:.1f}°C"
         )
     
     with col2:
@@ -453,7 +765,7 @@ def main():
         st.metric(
             label=f"{status} Umidade Ar",
             value=f"{dht11_hum:.1f}%",
-            delta=f"{dht11_hum - df['dht11_humidity'].mean():.1f}%"
+            delta=f"{dht11_hum - media['dht11_humidity']:.1f}%"
         )
     
     with col3:
@@ -461,7 +773,7 @@ def main():
         st.metric(
             label=f"{status} Temp Solo (DS18B20)",
             value=f"{ds18b20_temp:.1f}°C",
-            delta=f"{ds18b20_temp - df['ds18b20_temp'].mean():.1f}°C"
+            delta=f"{ds18b20_temp - media['ds18b20_temp']:.1f}°C"
         )
     
     with col4:
@@ -469,7 +781,7 @@ def main():
         st.metric(
             label=f"{status} Umidade Solo",
             value=f"{hl69_moisture:.1f}%",
-            delta=f"{hl69_moisture - df['hl69_moisture'].mean():.1f}%"
+            delta=f"{hl69_moisture - media['hl69_moisture']:.1f}%"
         )
     
     with col5:
@@ -477,12 +789,18 @@ def main():
         st.metric(
             label=f"{status} Distância",
             value=f"{hcsr04_dist:.1f} cm",
-            delta=f"{hcsr04_dist - df['hcsr04_distance'].mean():.1f} cm"
+            delta=f"{hcsr04_dist - media['hcsr04_distance']:.1f} cm"
         )
     
     # Gráfico principal
     st.subheader("📈 Histórico de Leituras")
     st.plotly_chart(create_compact_overview_chart(df), width='stretch')
+
+    # Métricas derivadas: calculadas pela API (volume, solo, amortecimento térmico)
+    if USE_API:
+        st.subheader("🧮 Métricas Derivadas")
+        if series:
+            st.plotly_chart(create_derivadas_chart(series), width='stretch')
     
     # Mini gauges
     st.subheader("🎯 Indicadores Visuais")
@@ -512,72 +830,6 @@ def main():
             width='stretch'
         )
     
-    # Estatísticas
-    with st.expander("📊 Estatísticas Detalhadas do Período", expanded=False):
-        stats_col1, stats_col2 = st.columns(2)
-        
-        with stats_col1:
-            st.markdown("**Sensores de Temperatura e Umidade**")
-            stats_df1 = pd.DataFrame({
-                'Sensor': ['DHT11 Temp (°C)', 'DHT11 Umid (%)', 'DS18B20 (°C)'],
-                'Atual': [
-                    f"{dht11_temp:.1f}",
-                    f"{dht11_hum:.1f}",
-                    f"{ds18b20_temp:.1f}"
-                ],
-                'Mínimo': [
-                    f"{df['dht11_temp'].min():.1f}",
-                    f"{df['dht11_humidity'].min():.1f}",
-                    f"{df['ds18b20_temp'].min():.1f}"
-                ],
-                'Máximo': [
-                    f"{df['dht11_temp'].max():.1f}",
-                    f"{df['dht11_humidity'].max():.1f}",
-                    f"{df['ds18b20_temp'].max():.1f}"
-                ],
-                'Média': [
-                    f"{df['dht11_temp'].mean():.1f}",
-                    f"{df['dht11_humidity'].mean():.1f}",
-                    f"{df['ds18b20_temp'].mean():.1f}"
-                ]
-            })
-            st.dataframe(stats_df1, width='stretch', hide_index=True)
-        
-        with stats_col2:
-            st.markdown("**Sensores de Solo e Distância**")
-            stats_df2 = pd.DataFrame({
-                'Sensor': ['HL69 Umidade Solo (%)', 'HCSR04 Distância (cm)'],
-                'Atual': [
-                    f"{hl69_moisture:.1f}",
-                    f"{hcsr04_dist:.1f}"
-                ],
-                'Mínimo': [
-                    f"{df['hl69_moisture'].min():.1f}",
-                    f"{df['hcsr04_distance'].min():.1f}"
-                ],
-                'Máximo': [
-                    f"{df['hl69_moisture'].max():.1f}",
-                    f"{df['hcsr04_distance'].max():.1f}"
-                ],
-                'Média': [
-                    f"{df['hl69_moisture'].mean():.1f}",
-                    f"{df['hcsr04_distance'].mean():.1f}"
-                ]
-            })
-            st.dataframe(stats_df2, width='stretch', hide_index=True)
-    
-    # Dados brutos
-    with st.expander("🔍 Visualizar Dados Brutos", expanded=False):
-        st.dataframe(df, width='stretch', hide_index=True)
-        
-        csv = df.to_csv(index=False).encode('utf-8')
-        st.download_button(
-            label="📥 Download CSV",
-            data=csv,
-            file_name=f'sensor_data_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv',
-            mime='text/csv',
-        )
-    
     # Footer
     st.markdown("---")
     footer_col1, footer_col2, footer_col3 = st.columns(3)
@@ -587,16 +839,275 @@ def main():
     
     with footer_col2:
         periodo = df['timestamp'].max() - df['timestamp'].min()
-        st.info(f"**Leituras:** {len(df)} | **Período:** {periodo}")
+        st.info(f"**Leituras:** {total} | **Período:** {periodo} | **Completude:** {resumo_lacunas(lacunas)}")
     
     with footer_col3:
         st.info(f"**Última Atualização:** {datetime.now().strftime('%H:%M:%S')}")
+
+
+# Histórico longo: períodos, campos e pontos pedidos à API por zoom
+# (cerca da largura do gráfico em pixels)
+HISTORICO_PONTOS = int(os.getenv("HISTORICO_PONTOS", "800"))
+PERIODOS_HISTORICO = {
+    "24 horas": timedelta(days=1),
+    "7 dias": timedelta(days=7),
+    "30 dias": timedelta(days=30),
+    "1 ano": timedelta(days=365),
+}
+CAMPOS_HISTORICO = {
+    "🌡️ Temp Ar (DHT11)": ("dht11_temperature", "°C"),
+    "💧 Umidade Ar": ("dht11_humidity", "%"),
+    "🌡️ Temp Solo (DS18B20)": ("ds18b20_temperature", "°C"),
+    "🌱 Umidade Solo": ("hl69_soil_moisture", "%"),
+    "📏 Distância": ("hcsr04_distance", " cm"),
+}
+
+
+def definir_zoom(filtros=None, desde=None, ate=None):
+    """Callback da navegação do histórico (sem argumentos: volta ao período)"""
+    if filtros is None:
+        st.session_state.pop('historico_zoom', None)
+    else:
+        st.session_state['historico_zoom'] = (filtros, (desde, ate))
+
+
+def zoom_da_selecao(chave_grafico, filtros):
+    """Callback da seleção no gráfico: o intervalo selecionado vira o novo zoom"""
+    caixas = st.session_state[chave_grafico].selection.box
+    if caixas:
+        inicio, fim = sorted(pd.to_datetime(caixas[0]['x'], utc=True))
+        if fim > inicio:
+            definir_zoom(filtros, inicio.to_pydatetime(), fim.to_pydatetime())
+
+
+@st.fragment
+def painel_historico(device_param):
+    """
+    Histórico longo com zoom (somente no modo API)
+
+    Cada zoom ou deslocamento busca apenas o intervalo visível, na resolução
+    que cabe no gráfico (min/max/média por faixa). O gráfico do Streamlit só
+    informa seleções, então o zoom é feito arrastando uma seleção sobre o
+    eixo do tempo; ◀ ▶ deslocam meia janela.
+    """
+    st.subheader("🔭 Histórico Longo")
+    col_periodo, col_campo, col_navegacao = st.columns([3, 2, 2])
+    with col_periodo:
+        periodo = st.radio("Período", list(PERIODOS_HISTORICO), horizontal=True, key="historico_periodo")
+    with col_campo:
+        rotulo = st.selectbox("Sensor", list(CAMPOS_HISTORICO), key="historico_campo")
+    campo, unidade = CAMPOS_HISTORICO[rotulo]
+
+    # Janela do período (fim arredondado ao minuto para reaproveitar o cache) ou do zoom
+    filtros = (device_param, periodo)
+    zoom = st.session_state.get('historico_zoom')
+    if zoom is None or zoom[0] != filtros:
+        ate = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+        desde = ate - PERIODOS_HISTORICO[periodo]
+        zoom = None
+    else:
+        desde, ate = zoom[1]
+
+    with col_navegacao:
+        col_voltar, col_anterior, col_proximo = st.columns(3)
+        deslocamento = (ate - desde) / 2
+        col_anterior.button("◀", key="historico_anterior", on_click=definir_zoom,
+                            args=(filtros, desde - deslocamento, ate - deslocamento))
+        col_proximo.button("▶", key="historico_proximo", on_click=definir_zoom,
+                           args=(filtros, desde + deslocamento, ate + deslocamento))
+        if zoom is not None:
+            col_voltar.button("↩️", key="historico_voltar", help="Voltar ao período", on_click=definir_zoom)
+
+    historico = fetch_historico_via_api(desde, ate, device_param, HISTORICO_PONTOS)
+    serie = historico.get('serie', {})
+    if not serie.get('timestamp'):
+        st.info("Nenhuma leitura no intervalo selecionado.")
+        return
+
+    # Uma chave por intervalo: cada zoom começa sem seleção
+    chave_grafico = f"historico_grafico_{desde.timestamp():.0f}_{ate.timestamp():.0f}"
+    st.plotly_chart(
+        create_historico_chart(serie, campo, rotulo, unidade),
+        width='stretch',
+        key=chave_grafico,
+        on_select=lambda: zoom_da_selecao(chave_grafico, filtros),
+        selection_mode="box",
+    )
+
+    niveis = ", ".join(f"{n['resolucao']} ({n['documentos']} docs)" for n in historico.get('niveis', []))
+    aviso = "" if historico.get('completo', True) else " · ⚠️ intervalo truncado, aproxime o zoom"
+    st.caption(f"{desde:%d/%m/%Y %H:%M} → {ate:%d/%m/%Y %H:%M} UTC · níveis: {niveis}{aviso}")
+
+
+@st.fragment
+def painel_estatisticas():
+    """Estatísticas do período, montadas somente com o painel aberto"""
+    if not st.toggle("📊 Estatísticas Detalhadas do Período", key="ver_estatisticas"):
+        return
+    janela = st.session_state.get('janela')
+    if janela is None:
+        return
+
+    resumo = janela['resumo']
+    media = resumo.loc['mean']
+    minimo = resumo.loc['min']
+    maximo = resumo.loc['max']
+
+    sensors = janela['ultima'].get('sensors', {})
+    dht11_temp = sensors.get('dht11', {}).get('temperature', 0)
+    dht11_hum = sensors.get('dht11', {}).get('humidity', 0)
+    ds18b20_temp = sensors.get('ds18b20', {}).get('temperature', 0)
+    hl69_moisture = sensors.get('hl69', {}).get('soil_moisture', 0)
+    hcsr04_dist = sensors.get('hcsr04', {}).get('distance', 0)
+
+    stats_col1, stats_col2 = st.columns(2)
+
+    with stats_col1:
+        st.markdown("**Sensores de Temperatura e Umidade**")
+        stats_df1 = pd.DataFrame({
+            'Sensor': ['DHT11 Temp (°C)', 'DHT11 Umid (%)', 'DS18B20 (°C)'],
+            'Atual': [
+                f"{dht11_temp:.1f}",
+                f"{dht11_hum:.1f}",
+                f"{ds18b20_temp:.1f}"
+            ],
+            'Mínimo': [
+                f"{minimo['dht11_temp']:.1f}",
+                f"{minimo['dht11_humidity']:.1f}",
+                f"{minimo['ds18b20_temp']:.1f}"
+            ],
+            'Máximo': [
+                f"{maximo['dht11_temp']:.1f}",
+                f"{maximo['dht11_humidity']:.1f}",
+                f"{maximo['ds18b20_temp']:.1f}"
+            ],
+            'Média': [
+                f"{media['dht11_temp']:.1f}",
+                f"{media['dht11_humidity']:.1f}",
+                f"{media['ds18b20_temp']:.1f}"
+            ]
+        })
+        st.dataframe(stats_df1, width='stretch', hide_index=True)
+
+    with stats_col2:
+        st.markdown("**Sensores de Solo e Distância**")
+        stats_df2 = pd.DataFrame({
+            'Sensor': ['HL69 Umidade Solo (%)', 'HCSR04 Distância (cm)'],
+            'Atual': [
+                f"{hl69_moisture:.1f}",
+                f"{hcsr04_dist:.1f}"
+            ],
+            'Mínimo': [
+                f"{minimo['hl69_moisture']:.1f}",
+                f"{minimo['hcsr04_distance']:.1f}"
+            ],
+            'Máximo': [
+                f"{maximo['hl69_moisture']:.1f}",
+                f"{maximo['hcsr04_distance']:.1f}"
+            ],
+            'Média': [
+                f"{media['hl69_moisture']:.1f}",
+                f"{media['hcsr04_distance']:.1f}"
+            ]
+        })
+        st.dataframe(stats_df2, width='stretch', hide_index=True)
+
+
+@st.fragment
+def painel_dados_brutos():
+    """Tabela da janela e download em CSV/Parquet, gerado somente quando pedido"""
+    if not st.toggle("🔍 Visualizar Dados Brutos", key="ver_dados_brutos"):
+        return
+    janela = st.session_state.get('janela')
+    if janela is None:
+        return
+
+    df = janela['df']
+    if df is None:
+        df = dados_brutos_via_api(*janela['filtros'], janela['chave'])
+    st.dataframe(df, width='stretch', hide_index=True)
+
+    col_formato, col_gerar, col_baixar = st.columns([2, 1, 1])
+    with col_formato:
+        formato = st.radio("Formato", ['CSV', 'Parquet'], horizontal=True, key="formato_download")
+    with col_gerar:
+        if st.button("⚙️ Gerar arquivo"):
+            st.session_state['arquivo_pedido'] = (janela['chave'], formato)
+
+    # O arquivo vale para a janela e o formato em que foi pedido
+    if st.session_state.get('arquivo_pedido') == (janela['chave'], formato):
+        extensao, mime = ('parquet', 'application/vnd.apache.parquet') if formato == 'Parquet' else ('csv', 'text/csv')
+        with col_baixar:
+            st.download_button(
+                label=f"📥 Download {formato}",
+                data=gerar_arquivo(df, janela['chave'], formato),
+                file_name=f'sensor_data_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{extensao}',
+                mime=mime,
+            )
+
+
+def main():
+    # Header
+    col_title, col_controls = st.columns([4, 1])
+    
+    with col_title:
+        st.title("🌱 Dashboard IoT - Telhado Verde")
     
-    # Auto-refresh
-    if auto_refresh:
-        import time
-        time.sleep(10)
-        st.rerun()
+    with col_controls:
+        if st.button("🔄 Atualizar", type="primary"):
+            if not USE_API:
+                get_espelho(get_db()).parar()  # O espelho recriado assina o listener de novo
+            st.cache_resource.clear()
+            st.rerun()
+    
+    # Conecta ao Firebase apenas se necessário (fallback)
+    db = None
+    if not USE_API:
+        db = get_db()
+
+    # Filtros
+    st.markdown("---")
+    filter_col1, filter_col2, filter_col3 = st.columns([3, 2, 2])
+    
+    with filter_col1:
+        if USE_API:
+            # O snapshot traz a lista de dispositivos: a página inteira sai de uma chamada
+            snapshot = fetch_snapshot_via_api(
+                window=st.session_state.get('data_limit', 100),
+                device_id=st.session_state.get('dispositivo', "Todos"),
+            )
+            st.session_state['snapshot_pronto'] = snapshot
+            device_ids = ["Todos"] + snapshot.get('dispositivos', [])
+        else:
+            device_ids = ["Todos"] + get_device_ids(db)
+        selected_device = st.selectbox("📱 Selecione o Dispositivo", device_ids, key='dispositivo')
+    
+    with filter_col2:
+        data_limit = st.select_slider(
+            "📊 Número de Leituras", 
+            options=[10, 25, 50, 100, 200, 500], 
+            value=100,
+            key='data_limit'
+        )
+    
+    with filter_col3:
+        auto_refresh = st.checkbox(f"🔄 Auto-refresh ({INTERVALO_AUTO_REFRESH}s)", value=False)
+    
+    st.markdown("---")
+    
+    # Auto-refresh reexecuta apenas o painel ao vivo, não a página inteira
+    device_param = None if selected_device == "Todos" else selected_device
+    painel = st.fragment(painel_ao_vivo, run_every=INTERVALO_AUTO_REFRESH if auto_refresh else None)
+    painel(db, device_param, data_limit)
+
+    if USE_API:
+        st.markdown("---")
+        painel_historico(device_param)
+
+    # Painéis sob demanda: só são calculados quando abertos
+    st.markdown("---")
+    painel_estatisticas()
+    painel_dados_brutos()
 
 
 if __name__ == "__main__":
@@ -17,6 +17,9 @@
  * - Obtém o horário atual via NTP (servidor pool.ntp.org) para gerar timestamp no formato ISO 8601.
  * - Monta um JSON com os dados dos sensores e metadados do dispositivo e envia via HTTP POST
  *   para uma API FastAPI exposta por Nginx na rota /api-fast/sensor-data.
+ * - Com USE_BATCH_UPLOAD, as leituras ficam em um buffer circular na memória RTC e são enviadas
+ *   em lotes (msgpack) para /api-fast/sensor-data/batch por uma conexão keep-alive; se o Wi-Fi
+ *   cair, as leituras permanecem no buffer com o timestamp original até o próximo envio.
  *
  * REQUISITOS:
  * - Hardware:
@@ -40,8 +43,9 @@
  *   - As credenciais de Wi-Fi (ssid e password) devem ser configuradas antes da gravação no dispositivo.
  *   - Os valores HL69_DRY_RAW e HL69_WET_RAW precisam ser ajustados por calibração prática em solo seco e úmido
  *     para que o cálculo de porcentagem de umidade represente corretamente a condição real. [web:10][web:13][web:31]
- *   - O intervalo de envio de dados é definido em READ_INTERVAL_MS (30 segundos), evitando requisições excessivas
- *     e reduzindo consumo de energia e carga no servidor.
+ *   - O intervalo entre leituras começa em READ_INTERVAL_DEFAULT_MS (30 segundos) e segue o campo
+ *     intervalo_recomendado_ms das respostas da API (amostragem adaptativa): leituras mais espaçadas quando
+ *     os valores estão estáveis e mais frequentes em chuvas, limitadas a [READ_INTERVAL_MIN_MS, READ_INTERVAL_MAX_MS].
 
  */
 
@@ -69,6 +73,16 @@ const char* SERVER_URL = "http://10.5.1.100/api-fast/sensor-data";
 //& Identificador lógico deste dispositivo (usado no JSON enviado)
 const char* DEVICE_ID = "ESP32_TELHADO_VERDE";
 
+//& Formato do corpo enviado: true = msgpack compacto (chaves curtas, unidades implícitas),
+//& false = JSON completo. O formato compacto reduz ~80% dos bytes transmitidos.
+const bool USE_MSGPACK = true;
+
+//& Envio em lotes: as leituras ficam no buffer circular e são enviadas juntas para
+//& BATCH_URL (POST /sensor-data/batch) por uma conexão HTTP mantida aberta (keep-alive).
+//& false = uma requisição por leitura em SERVER_URL (comportamento antigo).
+const bool USE_BATCH_UPLOAD = true;
+const char* BATCH_URL = "http://10.5.1.100/api-fast/sensor-data/batch";
+
 
 /////// CONFIGURAÇÃO NTP (DATA/HORA) //////
 
@@ -114,6 +128,8 @@ DHT dht(DHTPIN, DHTTYPE);
 //& HC-SR04 – sensor ultrassônico de distância
 #define TRIG_PIN 34
 #define ECHO_PIN 26
+#define HCSR04_MIN_CM 2.0f     // alcance do datasheet; fora dele a leitura é enviada como falha
+#define HCSR04_MAX_CM 400.0f   // (o timeout de 30 ms permitiria até ~514 cm)
 
 //& HL-69 – sensor resistivo de umidade do solo (saída analógica)
 #define HL69_PIN  5
@@ -131,6 +147,31 @@ float mapPercent(int raw, int dryRaw, int wetRaw) {
 }
 
 
+/////// INTERVALO DE LEITURA (AMOSTRAGEM ADAPTATIVA) //////
+
+const unsigned long READ_INTERVAL_DEFAULT_MS = 30 * 1000;     // intervalo inicial (30 s)
+const unsigned long READ_INTERVAL_MIN_MS = 10 * 1000;         // limites aceitos da recomendação da API
+const unsigned long READ_INTERVAL_MAX_MS = 15 * 60 * 1000;
+unsigned long readIntervalMs = READ_INTERVAL_DEFAULT_MS;      // intervalo atual entre leituras
+
+//& Lê intervalo_recomendado_ms da resposta JSON da API e adota o valor (limitado);
+//& respostas sem o campo (ou inválidas) mantêm o intervalo atual
+void applyRecommendedInterval(const String& resp) {
+  StaticJsonDocument<64> filter;
+  filter["intervalo_recomendado_ms"] = true;
+  StaticJsonDocument<128> doc;
+  if (deserializeJson(doc, resp, DeserializationOption::Filter(filter))) return;
+  unsigned long recomendado = doc["intervalo_recomendado_ms"] | 0UL;
+  if (recomendado == 0) return;
+  if (recomendado < READ_INTERVAL_MIN_MS) recomendado = READ_INTERVAL_MIN_MS;
+  if (recomendado > READ_INTERVAL_MAX_MS) recomendado = READ_INTERVAL_MAX_MS;
+  if (recomendado != readIntervalMs) {
+    Serial.printf("Intervalo de leitura: %lu s -> %lu s\n", readIntervalMs / 1000, recomendado / 1000);
+    readIntervalMs = recomendado;
+  }
+}
+
+
 /////// FUNÇÃO DE ENVIO DE DADOS PARA API //////
 
 //& Monta o JSON com leituras de sensores e envia via HTTP POST para a API configurada
@@ -153,6 +194,46 @@ bool sendSensorData(
 
   HTTPClient http;
   http.begin(serverUrl);
+
+  //& Formato compacto: mapa plano em msgpack (ver api-fastapi/formato_compacto.py)
+  if (USE_MSGPACK) {
+    StaticJsonDocument<256> flat;
+    flat["d"] = deviceId;
+    flat["t"] = timestamp;
+    float soilTemp = (ds_count > 0 && !isnan(ds_temps[0])) ? ds_temps[0] : 0.0;
+    flat["st"] = soilTemp;                                  // DS18B20 (°C) - primeiro sensor
+    flat["at"] = isnan(dht_temp) ? 0.0 : dht_temp;          // DHT11 temperatura (°C)
+    flat["ah"] = isnan(dht_hum) ? 0.0 : dht_hum;            // DHT11 umidade (%)
+    flat["dist"] = hcsr_dist;                               // HC-SR04 (cm)
+    flat["sm"] = hl_pct;                                    // HL-69 (%)
+    flat["raw"] = hl_raw;                                   // HL-69 valor bruto
+    int erros = 0;                                          // bits: 1=DS18B20 2=DHT11 4=HC-SR04 8=HL-69
+    if (ds_count == 0 || isnan(ds_temps[0])) erros |= 1;
+    if (isnan(dht_temp) || isnan(dht_hum)) erros |= 2;
+    if (hcsr_dist <= 0) erros |= 4;
+    flat["e"] = erros;
+
+    uint8_t buffer[128];
+    size_t len = serializeMsgPack(flat, buffer, sizeof(buffer));
+    http.addHeader("Content-Type", "application/msgpack");
+
+    Serial.print("Enviando para API (msgpack, ");
+    Serial.print(len);
+    Serial.println(" bytes)...");
+    int httpCode = http.POST(buffer, len);
+    bool ok = httpCode >= 200 && httpCode < 300;
+    if (httpCode > 0) {
+      Serial.print("HTTP POST code: ");
+      Serial.println(httpCode);
+      if (ok) applyRecommendedInterval(http.getString());   // a resposta é sempre JSON
+    } else {
+      Serial.print("Falha POST: ");
+      Serial.println(http.errorToString(httpCode));
+    }
+    http.end();
+    return ok;
+  }
+
   http.addHeader("Content-Type", "application/json"); // cabeçalho para JSON
 
   //& Documento JSON no formato esperado pela API
@@ -208,6 +289,7 @@ bool sendSensorData(
     String resp = http.getString();
     Serial.print("Resposta: ");
     Serial.println(resp);
+    if (httpCode >= 200 && httpCode < 300) applyRecommendedInterval(resp);
     http.end();
     return (httpCode >= 200 && httpCode < 300); // considera sucesso códigos 2xx
   } else {
@@ -219,10 +301,100 @@ bool sendSensorData(
 }
 
 
+/////// BUFFER CIRCULAR DE LEITURAS (ENVIO EM LOTES) //////
+
+//& Leitura compacta guardada no buffer até ser enviada
+struct BufferedReading {
+  uint32_t epoch;       // horário da coleta (timestamp original)
+  uint32_t seq;         // número de sequência (deduplicação no servidor)
+  float soilTemp;       // DS18B20 (°C)
+  float airTemp;        // DHT11 temperatura (°C)
+  float airHum;         // DHT11 umidade (%)
+  float distance;       // HC-SR04 (cm)
+  float soilPct;        // HL-69 (%)
+  int16_t raw;          // HL-69 valor bruto
+  uint8_t errors;       // bits: 1=DS18B20 2=DHT11 4=HC-SR04 8=HL-69
+};
+
+#define BUFFER_CAPACITY 120   // ~1 h de leituras a cada 30 s (~3,8 KB de memória RTC)
+#define BATCH_SIZE 10         // leituras por envio (~5 min entre envios)
+#define BATCH_MAX_WAIT_S 300  // com intervalos longos, envia antes de encher o lote (máx. 5 min de espera)
+
+//& Memória RTC: sobrevive a deep sleep e reset por software (não a falta de energia)
+RTC_DATA_ATTR BufferedReading ringBuffer[BUFFER_CAPACITY];
+RTC_DATA_ATTR uint16_t ringHead = 0;    // índice da leitura mais antiga
+RTC_DATA_ATTR uint16_t ringCount = 0;   // leituras aguardando envio
+RTC_DATA_ATTR uint32_t nextSeq = 0;     // próximo número de sequência (volta a 0 sem energia;
+                                        // o servidor identifica a leitura por seq + timestamp)
+
+HTTPClient batchHttp;                   // cliente reutilizado entre envios (keep-alive)
+
+//& Adiciona uma leitura ao buffer; se cheio, sobrescreve a mais antiga
+void bufferPush(const BufferedReading& r) {
+  if (ringCount == BUFFER_CAPACITY) {
+    ringHead = (ringHead + 1) % BUFFER_CAPACITY;
+    ringCount--;
+    Serial.println("Buffer cheio: leitura mais antiga descartada.");
+  }
+  ringBuffer[(ringHead + ringCount) % BUFFER_CAPACITY] = r;
+  ringCount++;
+}
+
+//& Envia até BATCH_SIZE leituras do início do buffer; remove-as somente após resposta 2xx
+bool uploadBatch() {
+  if (ringCount == 0) return true;
+  if (WiFi.status() != WL_CONNECTED) {
+    Serial.println("WiFi não conectado, leituras mantidas no buffer.");
+    return false;
+  }
+
+  uint16_t n = ringCount < BATCH_SIZE ? ringCount : BATCH_SIZE;
+  DynamicJsonDocument doc(256 * BATCH_SIZE);
+  JsonArray arr = doc.to<JsonArray>();
+  for (uint16_t i = 0; i < n; i++) {
+    const BufferedReading& r = ringBuffer[(ringHead + i) % BUFFER_CAPACITY];
+    JsonObject o = arr.createNestedObject();
+    o["d"] = DEVICE_ID;
+    o["t"] = formatIsoTimestamp(r.epoch);
+    o["q"] = r.seq;
+    o["st"] = r.soilTemp;
+    o["at"] = r.airTemp;
+    o["ah"] = r.airHum;
+    o["dist"] = r.distance;
+    o["sm"] = r.soilPct;
+    o["raw"] = r.raw;
+    o["e"] = r.errors;
+  }
+
+  static uint8_t payload[128 * BATCH_SIZE];
+  size_t len = serializeMsgPack(doc, payload, sizeof(payload));
+
+  batchHttp.setReuse(true);                         // mantém a conexão TCP entre envios
+  batchHttp.begin(BATCH_URL);
+  batchHttp.addHeader("Content-Type", "application/msgpack");
+  int httpCode = batchHttp.POST(payload, len);
+  if (httpCode >= 200 && httpCode < 300) applyRecommendedInterval(batchHttp.getString());
+  batchHttp.end();
+
+  if (httpCode >= 200 && httpCode < 300) {
+    ringHead = (ringHead + n) % BUFFER_CAPACITY;
+    ringCount -= n;
+    Serial.printf("Lote enviado: %u leituras (%u bytes), %u no buffer\n", n, (unsigned)len, ringCount);
+    return true;
+  }
+  if (httpCode > 0) {
+    Serial.printf("Falha no lote: HTTP %d\n", httpCode);
+  } else {
+    Serial.print("Falha no lote: ");
+    Serial.println(batchHttp.errorToString(httpCode));
+  }
+  return false;
+}
+
+
 /////// CONFIGURAÇÕES INICIAIS //////
 
 unsigned long lastRead = 0;                         // último instante de leitura
-const unsigned long READ_INTERVAL_MS = 30 * 1000;   // intervalo entre leituras (30 s)
 
 
 void setup() {
@@ -292,7 +464,7 @@ void setup() {
 
 void loop() {
   unsigned long now = millis();
-  if (now - lastRead < READ_INTERVAL_MS) return;  // respeita intervalo entre amostragens
+  if (now - lastRead < readIntervalMs) return;    // respeita intervalo entre amostragens (recomendado pela API)
   lastRead = now;
   Serial.println();
   Serial.println("===== NOVA LEITURA =====");
@@ -338,7 +510,12 @@ void loop() {
     Serial.println("HC-SR04    Falha (sem eco)");
   } else {
     distance = duration * 0.0343f / 2.0f;                         // conversão para cm
-    Serial.printf("HC-SR04    Distance: %.2f cm\n", distance);
+    if (distance < HCSR04_MIN_CM || distance > HCSR04_MAX_CM) {
+      Serial.printf("HC-SR04    Fora do alcance: %.2f cm\n", distance);
+      distance = -1;                                              // mesmo tratamento da falta de eco
+    } else {
+      Serial.printf("HC-SR04    Distance: %.2f cm\n", distance);
+    }
   }
 
   //& Leitura HL-69 (umidade do solo)
@@ -346,6 +523,32 @@ void loop() {
   float soil_pct = mapPercent(hl_raw, HL69_DRY_RAW, HL69_WET_RAW);            // umidade em %
   Serial.printf("HL-69      Raw: %d | Solo: %.2f %%\n", hl_raw, soil_pct);
 
+  //& Modo em lotes: guarda a leitura no buffer e envia quando houver BATCH_SIZE acumuladas
+  if (USE_BATCH_UPLOAD) {
+    BufferedReading r;
+    r.epoch = timeClient.getEpochTime();
+    r.seq = nextSeq++;
+    r.soilTemp = (dsCount > 0 && !isnan(ds_temps[0])) ? ds_temps[0] : 0.0;
+    r.airTemp = isnan(tDHT) ? 0.0 : tDHT;
+    r.airHum = isnan(hum) ? 0.0 : hum;
+    r.distance = distance;
+    r.soilPct = soil_pct;
+    r.raw = hl_raw;
+    r.errors = 0;
+    if (dsCount == 0 || isnan(ds_temps[0])) r.errors |= 1;
+    if (isnan(tDHT) || isnan(hum)) r.errors |= 2;
+    if (distance <= 0) r.errors |= 4;
+    bufferPush(r);
+
+    //& Após uma queda de Wi-Fi, esvazia o buffer acumulado em lotes sucessivos; com intervalos
+    //& longos, envia o lote incompleto quando a leitura mais antiga espera BATCH_MAX_WAIT_S
+    while (ringCount >= BATCH_SIZE ||
+           (ringCount > 0 && r.epoch - ringBuffer[ringHead].epoch >= BATCH_MAX_WAIT_S)) {
+      if (!uploadBatch()) break;
+    }
+    return;
+  }
+
   //& Envia os dados coletados para a API FastAPI via HTTP POST (no formato do JSON esperado)
   bool sent = sendSensorData(
     SERVER_URL,